@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Compares the size and time of embedding the genesis in every node's helm
+arguments with sharing one genesis ConfigMap, for several network sizes.
+
+Prints a json list with one entry per quantity and mode.
+"""
+
+import json
+import os
+import sys
+import time
+import types
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import gen_node_groups as g  # noqa: E402
+import nodeports  # noqa: E402
+import tmkeys  # noqa: E402
+
+QUANTITIES = [4, 16, 64, 256]
+
+# roughly what `tendermint init` writes, minus the validators
+GENESIS_TEMPLATE = {
+    "genesis_time": "",
+    "chain_id": "",
+    "consensus_params": {
+        "block": {"max_bytes": "22020096", "max_gas": "-1", "time_iota_ms": "1000"},
+        "evidence": {"max_age": "100000"},
+        "validator": {"pub_key_types": ["ed25519"]},
+    },
+    "validators": [],
+    "app_hash": "",
+}
+
+
+def make_nodes(quantity):
+    """Returns nodes with keys, the way initNodegroup leaves them."""
+    g.ports = nodeports.Allocator(30000, set())
+    nodes = []
+    for i in range(quantity):
+        node = g.Node(f"bench-{i}")
+        node.ndau_priv = tmkeys.priv_validator_key(tmkeys.new_seed())
+        node.ndau_nodeKey = tmkeys.node_key(tmkeys.new_seed())
+        node.ndau_node_id = tmkeys.node_key_id(node.ndau_nodeKey)
+        nodes.append(node)
+    return nodes
+
+
+def node_args(node, genesis_opts):
+    """Returns the per-node helm arguments main() builds, minus the peers."""
+    return g.make_args(
+        {
+            "ndau": {
+                **genesis_opts,
+                "privValidatorKey": g.jsonB64(node.ndau_priv),
+                "nodeKey": g.jsonB64(node.ndau_nodeKey),
+                "tendermint": {"moniker": node.name},
+            }
+        }
+    )
+
+
+def embedded(nodes, genesis):
+    """The genesis is encoded for, and carried by, every node."""
+    return sum(len(node_args(n, {"genesis": g.jsonB64(genesis)})) for n in nodes)
+
+
+def shared(nodes, genesis):
+    """The genesis is encoded once into a ConfigMap each node references."""
+    cm = json.dumps(g.genesis_configmap("bench-genesis", genesis))
+    opts = {"genesisConfigMap": "bench-genesis"}
+    return len(cm) + sum(len(node_args(n, opts)) for n in nodes)
+
+
+def main():
+    g.verboseFlag = False
+    g.c = types.SimpleNamespace(GENESIS_TIME=datetime.now(timezone.utc))
+    results = []
+    for quantity in QUANTITIES:
+        nodes = make_nodes(quantity)
+        genesis = g.conf_genesis_json(dict(GENESIS_TEMPLATE), "ndau", nodes)
+        for mode, fn in [("embedded", embedded), ("shared", shared)]:
+            start = time.perf_counter()
+            size = fn(nodes, genesis)
+            results.append(
+                {
+                    "quantity": quantity,
+                    "mode": mode,
+                    "bytes": size,
+                    "seconds": round(time.perf_counter() - start, 6),
+                }
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
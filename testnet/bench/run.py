@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Benchmarks gen_node_groups.py end to end without a cluster or ECR.
+
+Fake docker, kubectl, minikube, helm, aws and git from testdata/fakebin are
+put first on PATH, each sleeping --latency seconds per call. For every
+quantity the generator is run once in a scratch directory and its wall time,
+number of commands run and output bytes are recorded as json.
+
+With --baseline, results are compared to a stored run and the exit code is
+non-zero when one regressed by more than --tolerance.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+TESTNET_DIR = os.path.join(BENCH_DIR, "..")
+FAKEBIN = os.path.join(TESTNET_DIR, "testdata", "fakebin")
+GENERATOR = os.path.join(TESTNET_DIR, "gen_node_groups.py")
+BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+# sparse enough for every quantity
+TOPOLOGY = "chords"
+
+
+def dir_bytes(path):
+    """Returns the total size of the files under path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            # the RELEASE.tgz link to the bundle isn't counted twice
+            if not os.path.islink(os.path.join(root, f)):
+                total += os.path.getsize(os.path.join(root, f))
+    return total
+
+
+def run_once(quantity, latency, extra_args=()):
+    """Runs the generator once against the fakes and returns its measurements."""
+    with tempfile.TemporaryDirectory() as scratch:
+        fake_root = os.path.join(scratch, "fake")
+        out_dir = os.path.join(scratch, "out")
+        os.makedirs(os.path.join(fake_root, "volumes"))
+        os.makedirs(out_dir)
+
+        env = {
+            "PATH": f"{FAKEBIN}{os.pathsep}{os.environ['PATH']}",
+            "HOME": scratch,
+            "XDG_CACHE_HOME": os.path.join(scratch, "cache"),
+            "FAKE_ROOT": fake_root,
+            "FAKE_LATENCY": str(latency),
+            "RELEASE": "bench",
+        }
+        cmd = [
+            sys.executable,
+            GENERATOR,
+            str(quantity),
+            "30000",
+            "--topology",
+            TOPOLOGY,
+            "--output-dir",
+            out_dir,
+            *extra_args,
+        ]
+
+        start = time.perf_counter()
+        ret = subprocess.run(
+            cmd,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        seconds = time.perf_counter() - start
+        if ret.returncode != 0:
+            raise RuntimeError(f"generator failed for {quantity}:\n{ret.stderr}")
+
+        with open(os.path.join(fake_root, "calls.log")) as f:
+            commands = len(f.read().splitlines())
+
+        return {
+            "quantity": quantity,
+            "seconds": round(seconds, 3),
+            "commands": commands,
+            "bytes": dir_bytes(out_dir),
+        }
+
+
+def compare(results, baseline, tolerance):
+    """Returns a description of every result that regressed from baseline."""
+    base = {b["quantity"]: b for b in baseline}
+    regressions = []
+    for r in results:
+        b = base.get(r["quantity"])
+        if b is None:
+            continue
+        if r["commands"] > b["commands"]:
+            regressions.append(
+                f"quantity {r['quantity']}: {r['commands']} commands, "
+                f"baseline {b['commands']}"
+            )
+        for key in ("seconds", "bytes"):
+            if r[key] > b[key] * (1 + tolerance):
+                regressions.append(
+                    f"quantity {r['quantity']}: {key} {r[key]}, baseline {b[key]}"
+                )
+    return regressions
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks gen_node_groups.py against fake tools."
+    )
+    parser.add_argument(
+        "-q",
+        "--quantity",
+        type=int,
+        action="append",
+        help="Quantity of nodegroups to generate. Repeatable. (default: 1 4 16 64)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Seconds each fake command sleeps. (default: 0.05)",
+    )
+    parser.add_argument(
+        "--baseline",
+        nargs="?",
+        const=BASELINE,
+        help="Compare against a baseline file. (default: bench/baseline.json)",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        nargs="?",
+        const=BASELINE,
+        help="Write the results as the new baseline.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed fractional increase in seconds and bytes. (default: 0.5)",
+    )
+    args, extra = parser.parse_known_args()
+
+    results = [
+        run_once(q, args.latency, extra) for q in (args.quantity or [1, 4, 16, 64])
+    ]
+    output = {"latency": args.latency, "results": results}
+    print(json.dumps(output, indent=2))
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w") as f:
+            json.dump(output, f, indent=2)
+            f.write("\n")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["latency"] != args.latency:
+            exit(f"baseline was recorded with latency {baseline['latency']}")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r}", file=sys.stderr)
+        if regressions:
+            exit(1)
+
+
+if __name__ == "__main__":
+    main()
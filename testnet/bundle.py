@@ -0,0 +1,114 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Bundles a network directory into a reproducible tar.gz.
+
+Entries are sorted and get fixed owners and timestamps but keep their
+permissions, and the gzip header has no name or time, so the same files
+always give the same bytes. Bundles are named after a hash of their
+uncompressed contents, RELEASE-HASH.tgz, with RELEASE.tgz linking to the
+latest one. The hash is computed without compressing anything, so an
+unchanged network is noticed and skipped cheaply.
+"""
+
+import gzip  # for compressing bundles
+import hashlib  # for naming bundles
+import os  # for paths
+import tarfile  # for writing bundles
+
+# hex digits of the content hash in a bundle's name
+HASH_LENGTH = 12
+
+DEFAULT_LEVEL = 6
+
+
+class _HashWriter:
+    """A file-like sink that only hashes what is written to it."""
+
+    def __init__(self):
+        self.hash = hashlib.sha256()
+
+    def write(self, data):
+        self.hash.update(data)
+        return len(data)
+
+
+def _files(network_dir):
+    """Returns the names of the files to bundle, sorted. Bundles are left out."""
+    return sorted(
+        name
+        for name in os.listdir(network_dir)
+        if not name.endswith(".tgz")
+        and os.path.isfile(os.path.join(network_dir, name))
+    )
+
+
+def _write_tar(network_dir, names, fileobj):
+    """Streams a tar of names with fixed metadata to fileobj."""
+    with tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+        for name in names:
+            path = os.path.join(network_dir, name)
+            info = tarfile.TarInfo(name)
+            info.size = os.path.getsize(path)
+            # keep the file's permissions, key files are only readable by their owner
+            info.mode = os.stat(path).st_mode & 0o777
+            info.mtime = 0
+            info.uid = info.gid = 0
+            info.uname = info.gname = ""
+            with open(path, "rb") as f:
+                tar.addfile(info, f)
+
+
+def bundle_name(release, digest):
+    """Returns the file name of a release's bundle with a content hash."""
+    return f"{release}-{digest[:HASH_LENGTH]}.tgz"
+
+
+def _is_bundle(name, release):
+    """Returns True when name is the name of one of release's bundles."""
+    prefix, suffix = f"{release}-", ".tgz"
+    if not (name.startswith(prefix) and name.endswith(suffix)):
+        return False
+    digest = name[len(prefix) : -len(suffix)]
+    return len(digest) == HASH_LENGTH and all(c in "0123456789abcdef" for c in digest)
+
+
+def write(network_dir, release, level=DEFAULT_LEVEL):
+    """
+    Bundles a network directory into itself unless an identical bundle is
+    already there. Bundles of older contents are removed.
+    Returns the bundle's path and whether it was written.
+    """
+    names = _files(network_dir)
+    sink = _HashWriter()
+    _write_tar(network_dir, names, sink)
+    name = bundle_name(release, sink.hash.hexdigest())
+    path = os.path.join(network_dir, name)
+
+    written = not os.path.exists(path)
+    if written:
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as raw:
+            with gzip.GzipFile(
+                filename="", mode="wb", compresslevel=level, fileobj=raw, mtime=0
+            ) as gz:
+                _write_tar(network_dir, names, gz)
+        os.replace(tmp, path)
+
+    for old in os.listdir(network_dir):
+        if old != name and _is_bundle(old, release):
+            os.remove(os.path.join(network_dir, old))
+
+    link = os.path.join(network_dir, f"{release}.tgz")
+    if os.path.lexists(link) and os.path.realpath(link) != os.path.realpath(path):
+        os.remove(link)
+    if not os.path.lexists(link):
+        os.symlink(name, link)
+    return path, written
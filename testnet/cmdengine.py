@@ -0,0 +1,172 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Runs shell commands with asyncio.
+
+Output is streamed line by line to a callback while it is collected, stdout
+and stderr are kept apart, and a command that runs past its deadline is
+killed along with everything it started. run_sync wraps the coroutine for
+callers that aren't async themselves.
+
+Commands run in their own process groups, so a Ctrl-C at the terminal
+doesn't reach them. A SIGINT handler calls interrupt() to pass it on and
+wait for them to stop before cleaning up what they were using.
+"""
+
+import asyncio  # for the subprocesses
+import os  # for killing process groups
+import signal  # for killing process groups
+import threading  # to track commands run from several threads
+import time  # for timing commands
+
+# exit code reported for commands killed at their deadline, the same as timeout(1)
+TIMEOUT_EXIT_CODE = 124
+
+# exit code reported for commands stopped by interrupt(), as for a shell's SIGINT
+INTERRUPTED_EXIT_CODE = 130
+
+# longest line read from a command's output
+LINE_LIMIT = 64 * 1024 * 1024
+
+# commands running now, and whether interrupt() has been called
+_running = set()
+_interrupted = False
+# reentrant, since interrupt() can run in a signal handler while it's held
+_lock = threading.RLock()
+
+
+class Result:
+    """Outcome of a command. Has the attributes call sites use from subprocess."""
+
+    def __init__(self, args, returncode, stdout, stderr, seconds, timed_out=False):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.seconds = seconds
+        self.timed_out = timed_out
+
+
+async def _pump(stream, name, lines, on_line):
+    """Reads stream to its end, keeping each line and passing it to on_line."""
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        text = line.decode(errors="replace")
+        lines.append(text)
+        if on_line is not None:
+            on_line(name, text.rstrip("\n"))
+
+
+async def run(command, timeout=None, on_line=None):
+    """
+    Runs a shell command and returns its Result.
+    on_line(stream, line) is called for every line as it arrives, where stream
+    is "stdout" or "stderr". After timeout seconds the command's whole process
+    group is killed and the result has timed_out set. Cancelling the
+    coroutine kills the process group too. After interrupt() nothing new is
+    started and the result has INTERRUPTED_EXIT_CODE.
+    """
+    start = time.monotonic()
+    if _interrupted:
+        return Result(command, INTERRUPTED_EXIT_CODE, "", "interrupted\n", 0)
+    proc = await asyncio.create_subprocess_shell(
+        command,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+        limit=LINE_LIMIT,
+    )
+    with _lock:
+        _running.add(proc)
+        interrupted = _interrupted
+    if interrupted:
+        # interrupt() ran while this was starting
+        _kill(proc)
+    try:
+        return await _collect(command, proc, start, timeout, on_line)
+    finally:
+        with _lock:
+            _running.discard(proc)
+
+
+async def _collect(command, proc, start, timeout, on_line):
+    """Streams a started command's output until it exits or times out."""
+    out, err = [], []
+    pumps = asyncio.gather(
+        _pump(proc.stdout, "stdout", out, on_line),
+        _pump(proc.stderr, "stderr", err, on_line),
+        proc.wait(),
+    )
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.shield(pumps), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        _kill(proc)
+        await pumps
+    except asyncio.CancelledError:
+        # nobody wants the result anymore, e.g. a hedged duplicate won
+        _kill(proc)
+        await pumps
+        raise
+    returncode = TIMEOUT_EXIT_CODE if timed_out else proc.returncode
+    return Result(
+        command,
+        returncode,
+        "".join(out),
+        "".join(err),
+        time.monotonic() - start,
+        timed_out,
+    )
+
+
+def _kill(proc, sig=signal.SIGKILL):
+    """Signals a command's whole process group, by default to kill it."""
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def _alive(proc):
+    """Returns whether anything in a command's process group is still running."""
+    try:
+        os.killpg(proc.pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def interrupt(grace=5):
+    """
+    Stops every running command, from any thread, and any started later.
+    Each process group gets SIGINT, so e.g. docker run stops its container,
+    and is killed if it's still running after grace seconds. Safe to call
+    from a signal handler.
+    """
+    global _interrupted
+    with _lock:
+        _interrupted = True
+        procs = list(_running)
+    for proc in procs:
+        _kill(proc, signal.SIGINT)
+    deadline = time.monotonic() + grace
+    while any(_alive(p) for p in procs) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    for proc in procs:
+        _kill(proc)
+
+
+def run_sync(command, timeout=None, on_line=None):
+    """Runs a command from synchronous code, in its own event loop."""
+    return asyncio.run(run(command, timeout, on_line))
@@ -0,0 +1,174 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""Fixtures shared by the tests that talk to tendermint's RPC."""
+
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import manifest
+
+
+class FakeNode:
+    """
+    A stand-in for one node's tendermint RPC. Tests change its attributes to
+    change what it answers. Answers GET /METHOD?ARGS like tendermint does.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.height = 0
+        self.catching_up = True
+        # header times of blocks by height, the rest have block_time
+        self.block_times = {}
+        self.block_time = "2020-01-02T03:04:05.123456789Z"
+        self.peers = 0
+        self.mempool = []
+        self.mempool_limit = 5000
+        # CheckTx's answer to every transaction
+        self.check_tx_code = 0
+        # DeliverTx's answer to every committed transaction
+        self.deliver_tx_code = 0
+        # seconds before answering anything
+        self.delay = 0
+        self.down = False
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with node.lock:
+                    node.connections += 1
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                params = dict(urllib.parse.parse_qsl(url.query))
+                with node.lock:
+                    node.requests.append(url.path)
+                if node.down:
+                    self.send_error(503)
+                    return
+                threading.Event().wait(node.delay)
+                body = json.dumps(node.answer(url.path.strip("/"), params)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def answer(self, method, params):
+        """Returns the json-rpc response to a call."""
+        with self.lock:
+            if method == "status":
+                result = {
+                    "node_info": {"moniker": self.name},
+                    "sync_info": {
+                        "latest_block_height": str(self.height),
+                        "latest_block_time": self.block_times.get(self.height, self.block_time),
+                        "catching_up": self.catching_up,
+                    },
+                }
+            elif method == "block":
+                height = int(params["height"])
+                result = {
+                    "block": {
+                        "header": {
+                            "height": str(height),
+                            "time": self.block_times.get(height, self.block_time),
+                        }
+                    }
+                }
+            elif method == "net_info":
+                result = {"n_peers": str(self.peers), "peers": []}
+            elif method == "num_unconfirmed_txs":
+                result = {"n_txs": str(len(self.mempool)), "total": str(len(self.mempool))}
+            elif method.startswith("broadcast_tx_"):
+                if len(self.mempool) >= self.mempool_limit:
+                    return {
+                        "jsonrpc": "2.0",
+                        "id": "",
+                        "error": {
+                            "code": -32603,
+                            "message": "Internal error",
+                            "data": "mempool is full",
+                        },
+                    }
+                if self.check_tx_code == 0:
+                    self.mempool.append(params.get("tx"))
+                result = {"code": self.check_tx_code, "log": "", "hash": "00"}
+                if method == "broadcast_tx_commit":
+                    result = {
+                        "check_tx": {"code": self.check_tx_code},
+                        "deliver_tx": {"code": self.deliver_tx_code},
+                        "hash": "00",
+                        "height": str(self.height),
+                    }
+            else:
+                return {
+                    "jsonrpc": "2.0",
+                    "id": "",
+                    "error": {"code": -32601, "message": "Method not found"},
+                }
+        return {"jsonrpc": "2.0", "id": "", "result": result}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_network(tmp_path):
+    """
+    Returns a function that starts n FakeNodes and writes a network
+    directory whose manifest points at them. It returns the directory and
+    the nodes.
+    """
+    started = []
+
+    def start(n, genesis_time="2020-01-02T03:04:05.000Z"):
+        nodes = [FakeNode(f"fake-{i}") for i in range(n)]
+        started.extend(nodes)
+        network_dir = tmp_path / "network-fake"
+        network_dir.mkdir(exist_ok=True)
+        (network_dir / manifest.FILE).write_text(
+            manifest.dumps(
+                {
+                    "release": "fake",
+                    "master_ip": "127.0.0.1",
+                    "genesis": {"genesis_time": genesis_time},
+                    "nodes": [
+                        {"name": node.name, "ports": {"p2p": 1, "rpc": node.port}}
+                        for node in nodes
+                    ],
+                }
+            )
+        )
+        return network_dir, nodes
+
+    yield start
+    for node in started:
+        node.close()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Fetches what a new node needs to join running releases: each release's
+persistent peer address and the genesis.
+
+The pods, services and node addresses of every release are looked up with
+one kubectl call each, run at once, and then every pod's config files are
+read with a single kubectl exec, several pods at a time.
+
+Output is either the base64 helm fragments fetch-config.sh printed, or a
+network.json style manifest without private keys.
+"""
+
+import asyncio  # for running kubectl concurrently
+import json  # for kubectl output and config files
+import shlex  # for quoting release names
+import sys  # to print to stderr
+from base64 import b64encode
+
+import manifest
+import retry
+import tmkeys
+
+APP = "nodegroup-ndau-tendermint"
+CONFIG_DIR = "/tendermint/config"
+
+
+class Release:
+    """What was fetched for one release."""
+
+    def __init__(self, name, pod=None, ports=None):
+        self.name = name
+        self.pod = pod
+        self.ports = ports or {}
+        self.node_id = None
+        self.genesis = None
+        self.error = None
+
+    def peer(self, ip):
+        """Returns the release's persistent peer address."""
+        return f"{self.node_id}@{ip}:{self.ports['p2p']}"
+
+
+def selector(releases):
+    """Returns a label selector matching any of releases."""
+    return f"release in ({','.join(releases)})"
+
+
+def pods_by_release(pods):
+    """Maps each release to its first running tendermint pod's name."""
+    found = {}
+    for pod in pods.get("items", []):
+        release = pod["metadata"].get("labels", {}).get("release")
+        if pod.get("status", {}).get("phase", "Running") != "Running":
+            continue
+        found.setdefault(release, pod["metadata"]["name"])
+    return found
+
+
+def ports_by_release(services):
+    """Maps each release to the node ports of its tendermint service."""
+    found = {}
+    for svc in services.get("items", []):
+        if svc.get("spec", {}).get("selector", {}).get("app") != APP:
+            continue
+        release = svc["metadata"].get("labels", {}).get("release")
+        found[release] = {
+            p["name"]: p["nodePort"]
+            for p in svc["spec"].get("ports", [])
+            if "nodePort" in p
+        }
+    return found
+
+
+def external_ip(nodes):
+    """Returns the first ExternalIP of any cluster node, or None."""
+    for node in nodes.get("items", []):
+        for address in node.get("status", {}).get("addresses", []):
+            if address.get("type") == "ExternalIP":
+                return address["address"]
+    return None
+
+
+def split_json(text):
+    """Parses a stream of concatenated json documents, e.g. from cat a.json b.json."""
+    decoder = json.JSONDecoder()
+    docs = []
+    i = 0
+    while True:
+        while i < len(text) and text[i].isspace():
+            i += 1
+        if i == len(text):
+            return docs
+        doc, i = decoder.raw_decode(text, i)
+        docs.append(doc)
+
+
+async def _kubectl(args, counters, timeout):
+    """Runs kubectl under its retry policy and returns its parsed json output."""
+    command = f"kubectl {args}"
+    cls = retry.classify(command)
+    ret = await retry.run(
+        command, retry.DEFAULT_POLICIES[cls], counters, cls, timeout=timeout
+    )
+    if ret.returncode != 0:
+        raise OSError(f"{command} failed: {ret.stderr.strip()}")
+    return ret.stdout
+
+
+async def fetch(names, jobs=8, timeout=60):
+    """
+    Fetches every release in names and returns the master IP and a Release
+    for each, in order. A Release that couldn't be fetched has error set.
+    """
+    counters = retry.Counters()
+    pod_selector = shlex.quote(f"app={APP},{selector(names)}")
+    svc_selector = shlex.quote(selector(names))
+    pods, services, nodes = await asyncio.gather(
+        _kubectl(f"get pods -l {pod_selector} -o json", counters, timeout),
+        _kubectl(f"get svc -l {svc_selector} -o json", counters, timeout),
+        _kubectl("get nodes -o json", counters, timeout),
+    )
+    pods = pods_by_release(json.loads(pods))
+    ports = ports_by_release(json.loads(services))
+    ip = external_ip(json.loads(nodes))
+
+    releases = [Release(n, pods.get(n), ports.get(n)) for n in names]
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def read(release):
+        if release.pod is None:
+            release.error = "no running tendermint pod"
+            return
+        if "p2p" not in release.ports:
+            release.error = "no tendermint p2p node port"
+            return
+        files = " ".join(f"{CONFIG_DIR}/{f}" for f in ["node_key.json", "genesis.json"])
+        async with semaphore:
+            try:
+                out = await _kubectl(
+                    f"exec {shlex.quote(release.pod)} -- cat {files}", counters, timeout
+                )
+                node_key, genesis = split_json(out)
+            except (OSError, ValueError) as e:
+                release.error = str(e)
+                return
+        release.node_id = tmkeys.node_key_id(node_key)
+        release.genesis = genesis
+
+    await asyncio.gather(*(read(r) for r in releases))
+    return ip, releases
+
+
+def b64(val):
+    """Returns a string encoded in base-64."""
+    return b64encode(val.encode()).decode()
+
+
+def helm_fragments(ip, releases):
+    """Returns the helm values for joining each release, base64 encoded."""
+    lines = []
+    for r in releases:
+        lines += [
+            "",
+            r.name,
+            f'persistentPeers="{b64(r.peer(ip))}"',
+            f"genesis={b64(json.dumps(r.genesis, separators=(',', ':')))}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def network_manifest(ip, releases):
+    """Returns the releases as a network.json style manifest, without private keys."""
+    return manifest.dumps(
+        {
+            "master_ip": ip,
+            "genesis": releases[0].genesis,
+            "peers": ",".join(r.peer(ip) for r in releases),
+            "nodes": [
+                {"name": r.name, "ports": r.ports, "node_id": r.node_id}
+                for r in releases
+            ],
+        }
+    )
+
+
+def steprint(*args, **kwargs):
+    """Prints to stderr."""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Fetches the peer addresses and genesis of running releases."
+    )
+    parser.add_argument("releases", nargs="+", metavar="RELEASE")
+    parser.add_argument(
+        "--format",
+        choices=["helm", "manifest"],
+        default="helm",
+        help=(
+            "helm prints base64 persistentPeers and genesis values for each "
+            "release; manifest prints one network.json style document. "
+            "(default: helm)"
+        ),
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=8, help="Pods to read at once. (default: 8)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60,
+        help="Seconds before a kubectl call is killed. (default: 60)",
+    )
+    args = parser.parse_args()
+
+    try:
+        ip, releases = asyncio.run(fetch(args.releases, args.jobs, args.timeout))
+    except (OSError, ValueError) as e:
+        exit(str(e))
+    if ip is None:
+        exit("No cluster node has an ExternalIP.")
+
+    failed = [r for r in releases if r.error is not None]
+    for r in failed:
+        steprint(f"{r.name}: {r.error}")
+    if failed:
+        exit(1)
+
+    if len({json.dumps(r.genesis, sort_keys=True) for r in releases}) > 1:
+        steprint("warning: the releases don't share a genesis")
+
+    if args.format == "helm":
+        print(helm_fragments(ip, releases), end="")
+    else:
+        print(network_manifest(ip, releases), end="")
+
+
+# kick it off
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,8 @@ Installs nodegroups using the nodegroup helm chart.
 """
 
 import json  # for encoding json for helm chart variables
+import copy  # for per-network copies of the config and genesis template
+import hashlib  # for fingerprinting inputs
 import pprint  # to print config in verbose mode
 import os  # for environment variables, path, and exits
 import subprocess  # for running commands
@@ -23,6 +25,10 @@ import functools  # for lru_cache on preflight calls
 from datetime import datetime, timezone  # to datestamp temporary docker volumes
 import re  # regex for testing validiting when minikube returns an IP.
 import textwrap # for de-indenting multiline strings
+import threading  # to guard the list of created volumes and stop init workers
+import time  # to time tag lookups
+import queue  # to hand out per-worker docker volumes
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait  # for parallel node init
 
 # for making json safe to send to helm through the command-line
 from base64 import b64encode
@@ -30,35 +36,112 @@ from base64 import b64encode
 # for dynamically running different builds of addy on different platforms.
 import platform
 
-madeVolume = False  # Flag for if volume was created or not. Used for cleanup.
+# for generating tendermint keys without docker
+import tmkeys
 
+# for choosing each node's persistent peers
+import topology
 
-class PortFactory:
-    """Handles creating new sequential ports numbers."""
+# for retrying flaky registry and cluster queries
+import retry
 
-    def __init__(self, port):
-        PortFactory.validate(port)
-        self.port = port
+# to stop the commands running when cancelled
+import cmdengine
 
-    def alloc(self):
-        """Returns a new port."""
-        self.port += 1
-        PortFactory.validate(self.port)
-        return self.port
+# for timing phases and commands
+import timings
 
-    @staticmethod
-    def validate(port):
-        if not (port > 1024 and port < 65535):
-            abortClean(
-                f"port ({port}) must be within the user or dynamic/private range. "
-                "(1024-65535)"
-            )
-        if port < 30000 or port > 32767:
-            warn_print(
-                f"Port ({port}) is outside the default kubernetes NodePort range: "
-                "30000-32767."
-            )
-        return
+# copied into each network directory to run up.sh and down.sh
+import releases as releases_runner
+
+# for reading and writing network.json
+import manifest
+
+# for drawing pre-generated node keys
+import keypool
+
+# for allocating NodePorts nothing else uses
+import nodeports
+
+# for bundling network directories
+import bundle
+
+# for finding the latest snapshot
+import snapshot_codes
+
+# Local modules whose code shapes a generated network, fingerprinted with it.
+OUTPUT_MODULES = [
+    tmkeys,
+    topology,
+    releases_runner,
+    manifest,
+    keypool,
+    nodeports,
+    bundle,
+    snapshot_codes,
+]
+
+madeVolumes = []  # Names of docker volumes that were created. Used for cleanup.
+madeVolumesLock = threading.Lock()
+
+recorder = timings.Recorder()  # Times phases and every run_command call.
+
+verboseFlag = False  # Set from the command line. Enables vprint.
+commandTimeout = None  # Default seconds before run_command kills a command.
+retryPolicies = retry.DEFAULT_POLICIES  # retry.RetryPolicy per command class.
+retryCounters = retry.Counters()  # What the retry policies have done.
+
+
+class TagCache:
+    """
+    Keeps tag lookup results in a json file between runs.
+    Entries older than ttl seconds are looked up again. With refresh every
+    entry is looked up again. With offline nothing is looked up: any cached
+    entry is used regardless of age and a missing one is an error.
+    """
+
+    def __init__(self, path, ttl, refresh=False, offline=False):
+        self.path = path
+        self.ttl = ttl
+        self.refresh = refresh
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            warn_print(f"Ignoring unreadable tag cache {path}: {e}")
+
+    def get(self, fn, repo):
+        """Returns fn(repo), from the cache when allowed."""
+        key = f"{fn.__name__} {repo}"
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and not self.refresh:
+            age = time.time() - entry["time"]
+            if self.offline or age < self.ttl:
+                vprint(f"cached {key}: {entry['tag']} ({age:.0f}s old)")
+                return entry["tag"]
+        if self.offline:
+            raise OSError(f"offline and no cached result for: {key}")
+        tag = fn(repo)
+        with self.lock:
+            self.entries[key] = {"tag": tag, "time": time.time()}
+        return tag
+
+    def save(self):
+        """Writes the cache file."""
+        if self.offline:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with self.lock:
+            with open(tmp, "w") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
 
 
 class Conf:
@@ -67,6 +150,30 @@ class Conf:
         START_PORT          Port at which to start a sequence of ports.
         QUANTITY            Number of nodegroups to install.
         GENESIS_TIME        Time before which no blocks will be issued.
+        FIXED_GENESIS_TIME  GENESIS_TIME when one was given, or None when it
+                            defaulted to now.
+        BATCH               Networks to generate with this config, or None.
+                            See load_batch and networks().
+        EXTEND              Manifest of the network being extended, or None.
+                            Its release, tags, topology and output options
+                            replace those from the command line and environment.
+        TOPOLOGY            Spec of which nodes peer with each other. See topology.py.
+        DOCKER_INIT         When True, generate node keys with tendermint in docker
+                            instead of in-process.
+        SEED                String node keys are derived from, with the release, or
+                            None for random keys. See tmkeys.derive_seed.
+        KEY_POOL            Pool file node keys are drawn from, or None.
+                            See keypool.py.
+        JOBS                Number of nodes to initialize at once with docker init.
+                            Each worker gets its own temporary docker volume.
+        TAG_CACHE           TagCache for image tag lookups.
+        BUNDLE_LEVEL        gzip compression level of the network's tar ball.
+        SNAPSHOT_SOURCE     Where SNAPSHOT_CODE "latest" is looked up: s3://BUCKET
+                            or a local directory laid out like the bucket.
+        SHARED_GENESIS      When True, the genesis is written once to a ConfigMap
+                            manifest that every node mounts.
+        VALUES_FILES        When True, node scripts pass their chart values with
+                            helm values files instead of --set arguments.
 
         Environment variables required
         RELEASE             The helm release "base name". Each nodegroup's name will
@@ -85,8 +192,10 @@ class Conf:
         Environment variables that are optional
         HONEYCOMB_KEY          API key for honeycomb.
         HONEYCOMB_DATASET      Honeycomb data bucket name.
-        SNAPSHOT_CODE          Timestamp of directory to use inside the snapshot bucket.
-                               (e.g. 2018-11-16T13-17-16Z)
+        SNAPSHOT_CODE          Directory to use inside the snapshot bucket, named for
+                               the height it was taken at (e.g. ndau-1234), or "latest"
+                               for the highest one with every file a node restores.
+                               --snapshot overrides it.
         SNAPSHOT_ENABLED       When set to "true" it will make the first node able to take snapshots.
         SNAPSHOT_CRON_ENABLED  When set to "true" it will turn on automatic snapshots on the default
                                schedule set in the helm chart's values.yaml.
@@ -95,10 +204,17 @@ class Conf:
 
         Dynamically generaed constants
         SCRIPT_DIR          The absolute path of this script.
+        OUTPUT_DIR          Directory network directories are created in.
+                            Defaults to SCRIPT_DIR.
+        CONTEXT             kubectl's current context.
         IS_MINIKUBE         True when kubectl's current context is minikube.
         ECR                 ECR repo's host. For minikube it will use local images.
         ADDY_CMD            Path to the addy utility.
         MASTER_IP           IP of either minikube or the kubernete's cluser master node.
+                            Set by probe_cluster().
+        PORTS               Set by probe_cluster(). nodeports.Allocator that knows the NodePorts in use, both
+                            by the cluster's services and by other network directories
+                            in OUTPUT_DIR. Shared by every network of a batch.
 
         Genuine constants
         TMP_VOL             Name of a docker volume used for passing things
@@ -114,85 +230,146 @@ class Conf:
         #
         # Arguments
         #
+        # a batch lists several networks to generate with one config
+        self.BATCH = None
+        if args.batch is not None:
+            if args.extend is not None:
+                abortClean("--batch and --extend can't be used together")
+            try:
+                self.BATCH = load_batch(args.batch)
+            except (OSError, ValueError) as e:
+                abortClean(f"Couldn't load batch spec: {e}")
+
         self.QUANTITY = args.quantity
-        if self.QUANTITY < 1:
+        if self.QUANTITY is None and self.BATCH is None:
+            abortClean("quantity is required without --batch")
+        if self.QUANTITY is not None and self.QUANTITY < 1:
             abortClean("quantity must be at least 1")
-        elif self.QUANTITY > 16:
-            abortClean("quantity should be lower than 16")
+
+        # an extended network keeps the settings it was generated with
+        self.EXTEND = None
+        if args.extend is not None:
+            try:
+                self.EXTEND = manifest.load(args.extend)
+            except (OSError, ValueError) as e:
+                abortClean(f"Couldn't load network to extend: {e}")
+        existing = 0 if self.EXTEND is None else len(self.EXTEND["nodes"])
+
+        self.TOPOLOGY = args.topology
+        if self.EXTEND is not None:
+            self.TOPOLOGY = self.EXTEND["topology"]
 
         self.START_PORT = args.start_port
-        global ports
-        ports = PortFactory(self.START_PORT)
 
-        self.GENESIS_TIME = args.genesis_time
+        self.FIXED_GENESIS_TIME = args.genesis_time
+        self.GENESIS_TIME = args.genesis_time or datetime.now()
+
+        if self.BATCH is not None:
+            for network in self.BATCH:
+                network.setdefault("topology", self.TOPOLOGY)
+                network.setdefault("genesis_time", self.FIXED_GENESIS_TIME)
+            try:
+                plan_ports(self.BATCH, self.START_PORT)
+            except ValueError as e:
+                abortClean(str(e))
+            checks = [(n["topology"], n["quantity"]) for n in self.BATCH]
+        else:
+            checks = [(self.TOPOLOGY, existing + self.QUANTITY)]
+        for spec, quantity in checks:
+            try:
+                check_topology(spec, quantity)
+            except ValueError as e:
+                abortClean(str(e))
+        if self.EXTEND is None:
+            for network in self.BATCH or [{"start_port": self.START_PORT}]:
+                validatePort(network["start_port"])
+
+        self.DOCKER_INIT = args.docker_init
+
+        self.SEED = args.seed
+        if self.EXTEND is not None:
+            self.SEED = self.EXTEND["options"].get("seed")
+        if self.SEED is not None and self.DOCKER_INIT:
+            abortClean("--seed can't be used with --docker-init")
+
+        self.KEY_POOL = args.key_pool
+        if self.KEY_POOL is not None and (self.DOCKER_INIT or self.SEED is not None):
+            abortClean("--key-pool can't be used with --docker-init or --seed")
+
+        self.VALUES_FILES = args.values_files
+
+        self.SHARED_GENESIS = args.shared_genesis
+
+        if self.EXTEND is not None:
+            self.VALUES_FILES = self.EXTEND["options"]["values_files"]
+            self.SHARED_GENESIS = self.EXTEND["options"]["shared_genesis"]
+
+        self.BUNDLE_LEVEL = args.bundle_level
+        if not 0 <= self.BUNDLE_LEVEL <= 9:
+            abortClean("bundle level must be from 0 to 9")
+
+        self.JOBS = args.jobs
+        if self.JOBS < 1:
+            abortClean("jobs must be at least 1")
+
+        if args.offline and args.refresh_tags:
+            abortClean("--offline and --refresh-tags can't be used together")
+        self.TAG_CACHE = TagCache(
+            args.tag_cache,
+            args.tag_cache_ttl,
+            refresh=args.refresh_tags,
+            offline=args.offline,
+        )
 
         #
         # Environment variables
         #
 
         self.RELEASE = os.environ.get("RELEASE")
-        if self.RELEASE is None:
+        if self.EXTEND is not None:
+            self.RELEASE = self.EXTEND["release"]
+        if self.RELEASE is None and self.BATCH is None:
             abortClean(f"RELEASE env var not set.")
 
         # let commands tag override the ndaunode tag
         self.COMMANDS_TAG = os.environ.get("COMMANDS_TAG")
         self.NDAUNODE_TAG = os.environ.get("NDAUNODE_TAG")
-
-        if self.COMMANDS_TAG is None:
-            try:
-                self.COMMANDS_TAG = fetch_master_sha(
-                    "https://github.com/ndau/commands"
-                )
-                if self.NDAUNODE_TAG is None:
-                    self.NDAUNODE_TAG = self.COMMANDS_TAG
-            except OSError as e:
-                abortClean(
-                    f"COMMANDS_TAG env var empty and could not fetch version: {e}"
-                )
-        else:
-            if self.NDAUNODE_TAG is None:
-                self.NDAUNODE_TAG = self.COMMANDS_TAG
-
         self.SNAPSHOT_REDIS_TAG = os.environ.get("SNAPSHOT_REDIS_TAG")
-        if self.SNAPSHOT_REDIS_TAG is None:
-            try:
-                self.SNAPSHOT_REDIS_TAG = highest_version_tag("redis")
-            except OSError as e:
-                abortClean(
-                    f"SNAPSHOT_REDIS_TAG env var empty and could not fetch version: {e}"
-                )
-
-        # ndau noms and tendermint
         self.NDAU_NOMS_TAG = os.environ.get("NDAU_NOMS_TAG")
-        if self.NDAU_NOMS_TAG is None:
-            try:
-                self.NDAU_NOMS_TAG = highest_version_tag("noms")
-            except OSError as e:
-                abortClean(
-                    f"NDAU_NOMS_TAG env var empty and could not fetch version: {e}"
-                )
-
         self.NDAU_REDIS_TAG = os.environ.get("NDAU_REDIS_TAG")
-        if self.NDAU_REDIS_TAG is None:
-            try:
-                self.NDAU_REDIS_TAG = highest_version_tag("redis")
-            except OSError as e:
-                abortClean(
-                    f"NDAU_REDIS_TAG env var empty and could not fetch version: {e}"
-                )
-
         self.NDAU_TM_TAG = os.environ.get("NDAU_TM_TAG")
-        if self.NDAU_TM_TAG is None:
-            try:
-                self.NDAU_TM_TAG = highest_version_tag("tendermint")
-            except OSError as e:
-                abortClean(
-                    f"NDAU_TM_TAG env var empty and could not fetch version: {e}"
-                )
-
-        self.SNAPSHOT_CODE = os.environ.get("SNAPSHOT_CODE")
+        if self.EXTEND is not None:
+            for k, tag in self.EXTEND["tags"].items():
+                setattr(self, k, tag)
+
+        # look up every missing tag at once
+        lookups = {
+            "COMMANDS_TAG": (fetch_master_sha, "https://github.com/ndau/commands"),
+            "SNAPSHOT_REDIS_TAG": (highest_version_tag, "redis"),
+            "NDAU_NOMS_TAG": (highest_version_tag, "noms"),
+            "NDAU_REDIS_TAG": (highest_version_tag, "redis"),
+            "NDAU_TM_TAG": (highest_version_tag, "tendermint"),
+        }
+        missing = {k: v for k, v in lookups.items() if getattr(self, k) is None}
+        for k, tag in resolve_tags(missing, self.TAG_CACHE).items():
+            setattr(self, k, tag)
+        try:
+            self.TAG_CACHE.save()
+        except OSError as e:
+            warn_print(f"Could not save tag cache: {e}")
+
+        if self.NDAUNODE_TAG is None:
+            self.NDAUNODE_TAG = self.COMMANDS_TAG
+
+        self.SNAPSHOT_CODE = args.snapshot or os.environ.get("SNAPSHOT_CODE")
         if self.SNAPSHOT_CODE is None:
             self.SNAPSHOT_CODE = ""
+        self.SNAPSHOT_SOURCE = args.snapshot_source
+        if self.BATCH is None:
+            self.SNAPSHOT_CODE = self.snapshot_code(self.RELEASE)
+        else:
+            for network in self.BATCH:
+                network["snapshot_code"] = self.snapshot_code(network["release"])
 
         self.AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
         self.AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
@@ -242,15 +419,64 @@ class Conf:
         # dynamic constants
         #
         self.SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+        self.OUTPUT_DIR = os.path.realpath(args.output_dir or self.SCRIPT_DIR)
 
         # Path to addy
         exbl = f"addy-{platform.system().lower()}-amd64"
         self.ADDY_CMD = os.path.join(self.SCRIPT_DIR, "..", "addy", "dist", exbl)
 
         # get kubectl context
-        context = run_command("kubectl config current-context").stdout.strip()
-        self.IS_MINIKUBE = context == "minikube"
+        self.CONTEXT = run_command("kubectl config current-context").stdout.strip()
+        self.IS_MINIKUBE = self.CONTEXT == "minikube"
+
+        self.IGNORE_CLUSTER_PORTS = args.ignore_cluster_ports
+
+        self.ELB_SUBDOMAIN = os.environ.get("ELB_SUBDOMAIN")
+        if self.ELB_SUBDOMAIN is None and not self.IS_MINIKUBE:
+            abortClean(f"ELB_SUBDOMAIN env var required for non-minikube deployments.")
+
+
+        #
+        # Genuine constants
+        #
+
+        # ECR string that gets added to image names
+        self.ECR = "578681496768.dkr.ecr.us-east-1.amazonaws.com/"
+
+        # Name for a temporary docker volume. New every time.
+        self.TMP_VOL = (
+            f'tmp-tm-init-{datetime.now(timezone.utc).strftime("%Y-%b-%d-%H-%M-%S")}'
+        )
 
+        # used as a prefix for the real command to be run inside the container.
+        self.DOCKER_RUN = docker_run(self.TMP_VOL)
+
+        # dump all our config variables in verbose mode
+        vpprint("Configuration", self.__dict__)
+
+    def snapshot_code(self, release):
+        """
+        Returns SNAPSHOT_CODE for release. "latest" becomes the highest usable
+        snapshot of release in SNAPSHOT_SOURCE, or "genesis" for the network's
+        genesis snapshot when there's none.
+        """
+        if self.SNAPSHOT_CODE != "latest":
+            return self.SNAPSHOT_CODE
+        try:
+            code = snapshot_codes.find_latest(self.SNAPSHOT_SOURCE, release)
+        except OSError as e:
+            abortClean(f"Couldn't list snapshots in {self.SNAPSHOT_SOURCE}: {e}")
+        if code is None:
+            warn_print(f"No usable snapshot of {release}, starting from its genesis snapshot.")
+            return "genesis"
+        steprint(f"Latest snapshot of {release}: {code}")
+        return code
+
+    def probe_cluster(self):
+        """
+        Looks up MASTER_IP and the ports in use for PORTS. Only needed when
+        a network is actually generated, so a reused one doesn't wait on it.
+        """
         # get IP address of the kubernete's cluster's master node
         self.MASTER_IP = ""
         if self.IS_MINIKUBE:
@@ -282,77 +508,296 @@ class Conf:
             except subprocess.CalledProcessError:
                 abortClean("Could not get master node's IP address: ${ret.returncode}")
 
-        self.ELB_SUBDOMAIN = os.environ.get("ELB_SUBDOMAIN")
-        if self.ELB_SUBDOMAIN is None and not self.IS_MINIKUBE:
-            abortClean(f"ELB_SUBDOMAIN env var required for non-minikube deployments.")
+        # NodePorts used by the cluster's services, and by networks generated
+        # here that may not be installed yet
+        used = nodeports.manifest_ports(self.OUTPUT_DIR)
+        if not self.IGNORE_CLUSTER_PORTS:
+            services = run_command("kubectl get svc -A -o json").stdout
+            try:
+                used += nodeports.service_ports(json.loads(services))
+            except ValueError as e:
+                abortClean(f"Couldn't read the cluster's services: {e}")
+        vprint(f"{len(set(used))} ports in use")
+        self.PORTS = nodeports.Allocator(self.START_PORT, used)
+
+    def fingerprint(self):
+        """
+        Returns a hash of everything that determines a generated network:
+        options, resolved tags, environment, cluster context, this script,
+        the modules it uses and the nodegroup chart. Keys are left out
+        unless they're seeded.
+        """
+        chart = os.path.join(self.SCRIPT_DIR, "..", "helm", "nodegroup")
+        inputs = {
+            "sources": hashFiles(sourceFiles(chart), self.SCRIPT_DIR),
+            "script_dir": self.SCRIPT_DIR,
+            "release": self.RELEASE,
+            "quantity": self.QUANTITY,
+            "start_port": self.START_PORT,
+            "genesis_time": None
+            if self.FIXED_GENESIS_TIME is None
+            else self.FIXED_GENESIS_TIME.isoformat(),
+            "topology": self.TOPOLOGY,
+            "values_files": self.VALUES_FILES,
+            "shared_genesis": self.SHARED_GENESIS,
+            "seed": self.SEED,
+            "bundle_level": self.BUNDLE_LEVEL,
+            "context": self.CONTEXT,
+            "is_minikube": self.IS_MINIKUBE,
+        }
+        for k in [
+            "COMMANDS_TAG",
+            "NDAUNODE_TAG",
+            "SNAPSHOT_REDIS_TAG",
+            "NDAU_NOMS_TAG",
+            "NDAU_REDIS_TAG",
+            "NDAU_TM_TAG",
+            "SNAPSHOT_CODE",
+            "SNAPSHOT_ENABLED",
+            "SNAPSHOT_CRON_ENABLED",
+            "SNAPSHOT_CRON_SCHEDULE",
+            "HONEYCOMB_KEY",
+            "HONEYCOMB_DATASET",
+            "ELB_SUBDOMAIN",
+        ]:
+            inputs[k] = getattr(self, k)
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def networks(self):
+        """
+        Returns a config for each network to generate. That's this one, or
+        one per network of the batch with its own release, quantity, ports,
+        genesis time and topology and everything else shared.
+        """
+        if self.BATCH is None:
+            return [self]
+        confs = []
+        for network in self.BATCH:
+            conf = copy.copy(self)
+            conf.RELEASE = network["release"]
+            conf.QUANTITY = network["quantity"]
+            conf.START_PORT = network["start_port"]
+            conf.FIXED_GENESIS_TIME = network["genesis_time"]
+            conf.GENESIS_TIME = network["genesis_time"] or self.GENESIS_TIME
+            conf.TOPOLOGY = network["topology"]
+            conf.SNAPSHOT_CODE = network["snapshot_code"]
+            conf.BATCH = None
+            confs.append(conf)
+        return confs
 
 
-        #
-        # Genuine constants
-        #
+class Node:
+    """Node manages information for a single node."""
 
-        # ECR string that gets added to image names
-        self.ECR = "578681496768.dkr.ecr.us-east-1.amazonaws.com/"
+    def __init__(self, name):
+        """Creates a node."""
+        self.name = name
+        p2p, rpc = allocPorts()
+        self.ndau = {"port": {"p2p": p2p, "rpc": rpc}}
+
+    @classmethod
+    def from_manifest(cls, entry):
+        """Recreates a node from its network manifest entry."""
+        node = cls.__new__(cls)
+        node.name = entry["name"]
+        node.ndau = {"port": dict(entry["ports"])}
+        node.ndau_priv = entry["priv_validator_key"]
+        node.ndau_nodeKey = entry["node_key"]
+        node.ndau_node_id = entry["node_id"]
+        return node
+
+
+def allocPorts():
+    """Returns a free P2P and RPC port pair from the ports allocator."""
+    try:
+        return ports.alloc_pair()
+    except ValueError as e:
+        abortClean(str(e))
 
-        # Name for a temporary docker volume. New every time.
-        self.TMP_VOL = (
-            f'tmp-tm-init-{datetime.now(timezone.utc).strftime("%Y-%b-%d-%H-%M-%S")}'
+
+def validatePort(port):
+    """Aborts for start ports outside kubernetes' NodePort range."""
+    if port < nodeports.RANGE_START or port > nodeports.RANGE_END:
+        abortClean(
+            f"Start port ({port}) is outside the kubernetes NodePort range: "
+            f"{nodeports.RANGE_START}-{nodeports.RANGE_END}."
         )
 
-        # used as a prefix for the real command to be run inside the container.
-        self.DOCKER_RUN = f"docker run --rm --mount src={self.TMP_VOL},dst=/tendermint "
 
-        # dump all our config variables in verbose mode
-        vpprint("Configuration", self.__dict__)
+def checkPorts(allocator, plans):
+    """
+    Aborts unless allocator has a port pair for every node to be generated,
+    so running out is noticed before any keys or docker work. plans lists
+    the port each network allocates after and its number of nodes.
+    """
+    dry_run = allocator.copy()
+    try:
+        for start, quantity in plans:
+            dry_run.seek(start)
+            for _ in range(quantity):
+                dry_run.alloc_pair()
+    except ValueError as e:
+        abortClean(f"Not enough free NodePorts for {sum(q for _, q in plans)} nodes: {e}")
 
 
-class Node:
-    """Node manages information for a single node."""
+def sourceFiles(chartDir):
+    """
+    Returns the local files a generated network depends on: this script,
+    OUTPUT_MODULES and every file of the helm chart at chartDir.
+    """
+    paths = [os.path.realpath(m.__file__) for m in [sys.modules[__name__]] + OUTPUT_MODULES]
+    for root, dirs, files in os.walk(chartDir):
+        dirs.sort()
+        paths += [os.path.join(root, name) for name in sorted(files)]
+    return paths
 
-    def __init__(self, name):
-        """Creates a node."""
-        self.name = name
-        self.ndau = {"port": {"p2p": ports.alloc(), "rpc": ports.alloc()}}
+
+def hashFiles(paths, base):
+    """Returns a hash of the files' contents and their paths relative to base."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.relpath(path, base).encode() + b"\0")
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
 
 
-def initNodegroup(nodes):
-    """Creates configuration for all nodes using tendermint init."""
+def initNodegroup(nodes, first=0):
+    """
+    Creates keys for all nodes, in-process unless docker init was requested.
+    first is the index of nodes[0] in the network, which seeded keys depend on.
+    """
+    if c.DOCKER_INIT and c.JOBS > 1:
+        initNodegroupParallel(nodes)
+        return
 
-    # Initialize tendermint
-    for node in nodes:
+    if c.KEY_POOL is not None:
+        try:
+            drawn = keypool.draw(c.KEY_POOL, len(nodes))
+        except (OSError, ValueError) as e:
+            abortClean(f"Couldn't draw keys from the key pool: {e}")
+        steprint(f"Drew {len(drawn)} keys from {c.KEY_POOL}")
+        for node, keys in zip(nodes, drawn):
+            initNodePooled(node, keys)
+        return
+
+    for index, node in enumerate(nodes, first):
         steprint(f"\nGenerating config for {node.name}")
+        if c.DOCKER_INIT:
+            try:
+                initNodeDocker(node, c.DOCKER_RUN)
+            except OSError as e:
+                abortClean(str(e))
+        else:
+            initNodeNative(node, index)
+
+
+def initNodegroupParallel(nodes):
+    """Runs docker init for several nodes at once, one volume per worker."""
+    jobs = min(c.JOBS, len(nodes))
+    volumes = queue.Queue()
+    for i in range(jobs):
+        vol = f"{c.TMP_VOL}-{i}"
+        try:
+            makeTempVolume(vol)
+        except subprocess.CalledProcessError:
+            abortClean(f"Couldn't create temporary docker volume: {vol}")
+        volumes.put(vol)
+
+    failed = threading.Event()
+
+    def work(node):
+        # a worker may pick up its next node before the main thread wakes
+        if failed.is_set():
+            return
+        vol = volumes.get()
+        try:
+            steprint(f"Generating config for {node.name} in {vol}")
+            initNodeDocker(node, docker_run(vol))
+        except Exception:
+            failed.set()
+            raise
+        finally:
+            volumes.put(vol)
+
+    pool = ThreadPoolExecutor(max_workers=jobs)
+    futures = [pool.submit(work, node) for node in nodes]
+    wait(futures, return_when=FIRST_EXCEPTION)
+    # Nodes not started yet are dropped, and the running ones finish, before
+    # anything is cleaned up, so no worker is using a volume as it's removed.
+    pool.shutdown(wait=True, cancel_futures=True)
+    for future in futures:
+        if not future.cancelled() and future.exception() is not None:
+            abortClean(str(future.exception()))
+
+
+def initNodeNative(node, index=0):
+    """
+    Creates a node's keys and ID without starting any containers.
+    With a SEED the keys are derived from it, the release and the node's
+    index, so the networks of a batch don't share keys.
+    """
+    if c.SEED is None:
+        validator_seed, node_seed = tmkeys.new_seed(), tmkeys.new_seed()
+    else:
+        validator_seed = tmkeys.derive_seed(c.SEED, "validator", index, c.RELEASE)
+        node_seed = tmkeys.derive_seed(c.SEED, "node", index, c.RELEASE)
 
-        steprint(f"Initializing ndaunode's tendermint")
-        ret = run_command(
-            f"{c.DOCKER_RUN} -e TMHOME=/tendermint "
-            f"{c.ECR}tendermint:{c.NDAU_TM_TAG} init"
-        )
-        vprint(f"tendermint init: {ret.stdout}")
+    node.ndau_priv = tmkeys.priv_validator_key(validator_seed)
+    vprint(f"priv_validator_key.json: {tmkeys.dumps_priv_validator_key(node.ndau_priv)}")
 
-        steprint(f"Getting priv_validator_key.json")
-        ret = run_command(
-            f"{c.DOCKER_RUN} busybox cat /tendermint/config/priv_validator_key.json"
-        )
-        vprint(f"priv_validator_key.json: {ret.stdout}")
-        node.ndau_priv = json.loads(ret.stdout)
+    node.ndau_nodeKey = tmkeys.node_key(node_seed)
+    vprint(f"node_key.json: {tmkeys.dumps_node_key(node.ndau_nodeKey)}")
 
-        steprint(f"Getting node_key.json")
-        ret = run_command(
-            f"{c.DOCKER_RUN} busybox cat /tendermint/config/node_key.json"
-        )
-        vprint(f"node_key.json: {ret.stdout}")
-        node.ndau_nodeKey = json.loads(ret.stdout)
+    node.ndau_node_id = tmkeys.node_key_id(node.ndau_nodeKey)
+    vprint(f"ndau node ID: {node.ndau_node_id}")
 
-        # JSG we need the node ID for persistent peers
-        ret = run_command(
-            f"{c.DOCKER_RUN} -e TMHOME=/tendermint "
-            f"{c.ECR}tendermint:{c.NDAU_TM_TAG} show_node_id"
-        )
-        node.ndau_node_id = ret.stdout.strip()
-        vprint(f"ndau node ID: {node.ndau_node_id}")
 
-        steprint("Removing tendermint's config directory")
-        run_command(f"{c.DOCKER_RUN} busybox rm -rf /tendermint/config")
+def initNodePooled(node, keys):
+    """Gives a node keys drawn from a key pool."""
+    node.ndau_priv = keys.priv_validator_key()
+    node.ndau_nodeKey = keys.node_key()
+    node.ndau_node_id = tmkeys.node_id(keys.node_pub)
+    vprint(f"{node.name} ndau node ID: {node.ndau_node_id}")
+
+
+def initNodeDocker(node, dockerRun):
+    """Creates a node's keys and ID using tendermint init.
+    dockerRun is the docker run prefix mounting the volume to work in.
+    Raises OSError when a container fails, so workers can leave aborting
+    to the main thread."""
+    steprint(f"Initializing ndaunode's tendermint")
+    ret = check_command(
+        f"{dockerRun} -e TMHOME=/tendermint "
+        f"{c.ECR}tendermint:{c.NDAU_TM_TAG} init"
+    )
+    vprint(f"tendermint init: {ret.stdout}")
+
+    steprint(f"Getting priv_validator_key.json")
+    ret = check_command(
+        f"{dockerRun} busybox cat /tendermint/config/priv_validator_key.json"
+    )
+    vprint(f"priv_validator_key.json: {ret.stdout}")
+    node.ndau_priv = json.loads(ret.stdout)
+
+    steprint(f"Getting node_key.json")
+    ret = check_command(
+        f"{dockerRun} busybox cat /tendermint/config/node_key.json"
+    )
+    vprint(f"node_key.json: {ret.stdout}")
+    node.ndau_nodeKey = json.loads(ret.stdout)
+
+    # JSG we need the node ID for persistent peers
+    ret = check_command(
+        f"{dockerRun} -e TMHOME=/tendermint "
+        f"{c.ECR}tendermint:{c.NDAU_TM_TAG} show_node_id"
+    )
+    node.ndau_node_id = ret.stdout.strip()
+    vprint(f"ndau node ID: {node.ndau_node_id}")
+
+    steprint("Removing tendermint's config directory")
+    check_command(f"{dockerRun} busybox rm -rf /tendermint/config")
+
 
 def main():
 
@@ -361,12 +806,21 @@ def main():
     parser = argparse.ArgumentParser(
         description="Installs multiple networked nodegroups to Kubernetes."
     )
-    parser.add_argument("quantity", type=int, help="Quantity of nodegroups to install.")
+    parser.add_argument(
+        "quantity",
+        type=int,
+        nargs="?",
+        help="Quantity of nodegroups to install. Not used with --batch.",
+    )
     parser.add_argument(
         "start_port",
         type=int,
+        nargs="?",
         default=30000,
-        help="Starting port for each node's Tendermint RPC and P2P ports (e.g. 30000).",
+        help=(
+            "Starting port for each node's Tendermint RPC and P2P ports. "
+            "Ignored with --extend. (default: 30000)"
+        ),
     )
     parser.add_argument(
         "-v", "--verbose", action="store_true", help="When set emit more."
@@ -375,10 +829,190 @@ def main():
         "-g",
         "--genesis-time",
         type=iso8601,
-        default=datetime.now(),
         help=(
             "ISO-8601 datetime for genesis. "
-            "Tendermint will wait for this datetime before processing blocks."
+            "Tendermint will wait for this datetime before processing blocks. "
+            "(default: now)"
+        ),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help=(
+            "Number of nodes to initialize at once with --docker-init. "
+            "Each worker uses its own temporary docker volume."
+        ),
+    )
+    parser.add_argument(
+        "--tag-cache",
+        default=os.path.join(
+            os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+            "ndau-automation",
+            "tags.json",
+        ),
+        help="File that caches image tag lookups between runs.",
+    )
+    parser.add_argument(
+        "--tag-cache-ttl",
+        type=int,
+        default=3600,
+        help="Seconds a cached image tag is used before looking it up again.",
+    )
+    parser.add_argument(
+        "--refresh-tags",
+        action="store_true",
+        help="Look up every image tag again, ignoring the tag cache.",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help=(
+            "Never query ECR or GitHub for image tags. "
+            "Uses cached tags regardless of age and fails on a cache miss."
+        ),
+    )
+    parser.add_argument(
+        "--topology",
+        default=topology.DEFAULT,
+        help=(
+            "Which nodes peer with each other: full, random:K, chords or "
+            "seeds:S. Networks of more than 16 nodes need a sparse topology. "
+            "(default: full)"
+        ),
+    )
+    parser.add_argument(
+        "--values-files",
+        action="store_true",
+        help=(
+            "Write each node's chart values to values-N.json and the values "
+            "shared by all nodes to values-common.json, and pass them to helm "
+            "with -f instead of --set arguments."
+        ),
+    )
+    parser.add_argument(
+        "--shared-genesis",
+        action="store_true",
+        help=(
+            "Write the genesis once to genesis-configmap.json, which up.sh "
+            "applies, and have every node mount it instead of carrying a copy."
+        ),
+    )
+    parser.add_argument(
+        "--command-timeout",
+        type=float,
+        default=600,
+        help="Seconds before a command is killed and the run aborted. (default: 600)",
+    )
+    parser.add_argument(
+        "--retry",
+        action="append",
+        default=[],
+        metavar="CLASS:ATTEMPTS[:HEDGE_SECONDS]",
+        help=(
+            "Retry policy for a command class: registry (ECR and GitHub "
+            "lookups) or cluster (kubectl and minikube queries). HEDGE_SECONDS "
+            "starts a duplicate of a slow attempt; 0 disables it. "
+            "(default: registry:4:10 cluster:3:10)"
+        ),
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        help="Directory to create the network directory in. (default: this script's)",
+    )
+    parser.add_argument(
+        "--bundle-level",
+        type=int,
+        default=bundle.DEFAULT_LEVEL,
+        help=(
+            "gzip compression level of the tar ball, from 0 (fastest) "
+            f"to 9 (smallest). (default: {bundle.DEFAULT_LEVEL})"
+        ),
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="OUT_JSON",
+        help="Write phase and command timings to OUT_JSON in Chrome trace format.",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print a table of phase and command timings to stderr.",
+    )
+    parser.add_argument(
+        "--seed",
+        help=(
+            "Derive every node's keys from this string and the node's index "
+            "instead of generating random ones, so the same seed always gives "
+            "the same keys, node IDs and validators. Not for real networks."
+        ),
+    )
+    parser.add_argument(
+        "--key-pool",
+        metavar="POOL",
+        help=(
+            "Draw node keys from a pool made by keypool.py instead of "
+            "generating them. Drawn keys are never handed out again."
+        ),
+    )
+    parser.add_argument(
+        "--ignore-cluster-ports",
+        action="store_true",
+        help=(
+            "Don't look up the NodePorts the cluster's services use. Ports of "
+            "other network directories in the output directory are still skipped."
+        ),
+    )
+    parser.add_argument(
+        "--snapshot",
+        metavar="CODE",
+        help=(
+            "Snapshot for new nodes to start from, e.g. ndau-1234, or latest "
+            "for the highest complete one in --snapshot-source. Without it each "
+            "node restores the highest height of each file. Overrides SNAPSHOT_CODE."
+        ),
+    )
+    parser.add_argument(
+        "--snapshot-source",
+        default=snapshot_codes.DEFAULT_SOURCE,
+        help=(
+            "Where --snapshot latest looks: s3://BUCKET, or a directory laid "
+            f"out like the bucket. (default: {snapshot_codes.DEFAULT_SOURCE})"
+        ),
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help=(
+            "Generate a new network even when one was already generated "
+            "from the same options, tags and environment."
+        ),
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="SPEC_JSON",
+        help=(
+            "Generate every network listed in SPEC_JSON in one run, sharing "
+            "tag lookups, cluster queries and docker setup. Each network "
+            "gets its own release, quantity, ports and genesis time."
+        ),
+    )
+    parser.add_argument(
+        "--extend",
+        metavar="NETWORK_DIR",
+        help=(
+            "Add quantity nodes to a network directory generated before, "
+            "keeping its release, tags, options and existing keys."
+        ),
+    )
+    parser.add_argument(
+        "--docker-init",
+        action="store_true",
+        help=(
+            "Generate node keys by running tendermint in docker "
+            "instead of generating them in-process."
         ),
     )
 
@@ -388,8 +1022,20 @@ def main():
     global verboseFlag
     verboseFlag = args.verbose
 
+    global commandTimeout
+    commandTimeout = args.command_timeout
+
+    global retryPolicies
+    for spec in args.retry:
+        try:
+            retryPolicies = retry.parse_policy(spec, retryPolicies)
+        except ValueError as e:
+            steprint(f"Invalid --retry: {e}")
+            exit(1)
+
     # get all configuration from the environment
     global c
+    recorder.enter("Conf")
     c = Conf(args)
 
     try:
@@ -398,15 +1044,134 @@ def main():
         steprint(f"Could not start. Missing tools: {e}")
         exit(1)
 
-    # Create a temporary docker volume
+    # networks generated from the same inputs before are reused
+    pending = []
+    if c.EXTEND is not None:
+        c.probe_cluster()
+        checkPorts(c.PORTS, [(manifest.max_port(c.EXTEND), c.QUANTITY)])
+        tarball(extend(os.path.realpath(args.extend)))
+    else:
+        for conf in c.networks():
+            reusable = None
+            if not args.force:
+                reusable = manifest.find(conf.OUTPUT_DIR, conf.RELEASE, conf.fingerprint())
+            if reusable is None:
+                pending.append(conf.RELEASE)
+            else:
+                steprint(f"Inputs unchanged, reusing network: {reusable}")
+
+    if pending:
+        recorder.enter("probe_cluster")
+        c.probe_cluster()
+        checkPorts(
+            c.PORTS,
+            [(n.START_PORT, n.QUANTITY) for n in c.networks() if n.RELEASE in pending],
+        )
+
+        # Create a temporary docker volume
+        recorder.enter("makeTempVolume")
+        try:
+            makeTempVolume()
+        except subprocess.CalledProcessError:
+            abortClean("Couldn't create temporary docker volume.")
+
+        recorder.enter("genesis")
+        template = genesis_template()
+
+        # every network of a batch shares the config, cluster probe and template
+        for conf in c.networks():
+            if conf.RELEASE in pending:
+                c = conf
+                tarball(generate(template))
+
+    recorder.finish()
+    vpprint("Retry counters", retryCounters.snapshot())
+    if args.trace is not None:
+        recorder.write_chrome_trace(args.trace)
+        steprint(f"Wrote trace: {args.trace}")
+    if args.timings:
+        steprint(f"\n{recorder.summary()}\n")
+
+    steprint("All done.")
+
+
+def check_topology(spec, quantity):
+    """Raises ValueError unless topology spec suits a network of quantity nodes."""
+    topology.parse(spec)
+    if spec == "full" and quantity > 16:
+        raise ValueError(
+            "quantity should be lower than 16 with a full mesh. "
+            "Use a sparse --topology for larger networks."
+        )
+
+
+def load_batch(path):
+    """
+    Reads a batch spec: a json object whose "networks" list has an object for
+    each network with its "release" and "quantity" and optionally its
+    "start_port", "genesis_time" (as for --genesis-time) and "topology".
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    networks = spec.get("networks") if isinstance(spec, dict) else None
+    if not networks:
+        raise ValueError(f'{path} has no "networks" list')
+
+    allowed = {"release", "quantity", "start_port", "genesis_time", "topology"}
+    releases = set()
+    for network in networks:
+        unknown = set(network) - allowed
+        if unknown:
+            raise ValueError(f"unknown network keys: {', '.join(sorted(unknown))}")
+        if not network.get("release"):
+            raise ValueError("every network needs a release")
+        if network["release"] in releases:
+            raise ValueError(f"release {network['release']} is listed twice")
+        releases.add(network["release"])
+        if not isinstance(network.get("quantity"), int) or network["quantity"] < 1:
+            raise ValueError(f"{network['release']} needs a quantity of at least 1")
+        if "genesis_time" in network:
+            network["genesis_time"] = iso8601(network["genesis_time"])
+    return networks
+
+
+def plan_ports(networks, start_port):
+    """
+    Fills in the start_port of every network that has none, continuing after
+    the previous network's last port, the first starting at start_port.
+    Raises ValueError when two networks' ports overlap.
+    """
+    taken = []  # (first, last, release)
+    for network in networks:
+        network.setdefault("start_port", taken[-1][1] if taken else start_port)
+        # the allocator hands out the ports after the start port, two per node
+        first = network["start_port"] + 1
+        last = network["start_port"] + 2 * network["quantity"]
+        for other_first, other_last, release in taken:
+            if first <= other_last and other_first <= last:
+                raise ValueError(
+                    f"ports of {network['release']} ({first}-{last}) overlap "
+                    f"{release} ({other_first}-{other_last})"
+                )
+        taken.append((first, last, network["release"]))
+
+
+def tarball(network_dir):
+    """Bundles up a network directory, unless it is unchanged since last time."""
+    recorder.enter("tarball")
     try:
-        makeTempVolume()
-    except subprocess.CalledProcessError:
-        abortClean("Couldn't create temporary docker volume.")
+        path, written = bundle.write(network_dir, c.RELEASE, c.BUNDLE_LEVEL)
+    except OSError as e:
+        steprint(f"Error creating tar ball: {e}")
+        return
+    if written:
+        steprint(f"Created tar ball: {path}")
+    else:
+        steprint(f"Tar ball unchanged: {path}")
 
-    nodes = [Node(f"{c.RELEASE}-{i}") for i in range(c.QUANTITY)]
-    initNodegroup(nodes)
 
+def genesis_template():
+    """Returns tendermint's default genesis.json, made in the temporary volume."""
     steprint("Getting ndau's genesis.json")
     run_command(
         f"{c.DOCKER_RUN} -e TMHOME=/tendermint {c.ECR}tendermint:{c.NDAU_TM_TAG} init"
@@ -416,11 +1181,29 @@ def main():
     ).stdout
 
     vprint(f"ndau's genesis.json: {ret}")
-    ndau_genesis = conf_genesis_json(json.loads(ret), "ndau", nodes)
+    return json.loads(ret)
+
+
+def generate(template):
+    """
+    Generates a new network directory from a genesis template and returns
+    its path.
+    """
+    steprint(f"\nGenerating network: {c.RELEASE}")
+    global ports
+    ports = c.PORTS
+    ports.seek(c.START_PORT)
+    nodes = [Node(f"{c.RELEASE}-{i}") for i in range(c.QUANTITY)]
+    recorder.enter("initNodegroup")
+    initNodegroup(nodes)
+
+    recorder.enter("genesis")
+    ndau_genesis = conf_genesis_json(copy.deepcopy(template), "ndau", nodes)
 
     vprint(f"ndau genesis.json: {ndau_genesis}")
 
-    network_dir = os.path.join(c.SCRIPT_DIR, f"network-{c.RELEASE}")
+    recorder.enter("scripts")
+    network_dir = os.path.join(c.OUTPUT_DIR, f"network-{c.RELEASE}")
 
     if os.path.exists(network_dir):
         for i in range(0, 32):
@@ -436,39 +1219,112 @@ def main():
     else:
         vprint(f"Created directory: {network_dir}")
 
+    write_network(network_dir, nodes, ndau_genesis)
+    return network_dir
+
+
+def extend(network_dir):
+    """
+    Adds QUANTITY nodes to an existing network directory and returns its path.
+    Only the new nodes get keys, and only files whose contents change are
+    rewritten. The genesis is kept as is, so the new nodes join as full nodes.
+    """
+    existing = [Node.from_manifest(n) for n in c.EXTEND["nodes"]]
+
+    global ports
+    ports = c.PORTS
+    ports.seek(manifest.max_port(c.EXTEND))
+
+    if c.DOCKER_INIT:
+        recorder.enter("makeTempVolume")
+        try:
+            makeTempVolume()
+        except subprocess.CalledProcessError:
+            abortClean("Couldn't create temporary docker volume.")
+
+    first = len(existing)
+    added = [Node(f"{c.RELEASE}-{i}") for i in range(first, first + c.QUANTITY)]
+    recorder.enter("initNodegroup")
+    initNodegroup(added, first)
+
+    recorder.enter("scripts")
+    nodes = existing + added
+    old_peers = [peer_list(n, existing, c.EXTEND["peers"]) for n in existing]
+    peers = write_network(network_dir, nodes, c.EXTEND["genesis"])
+
+    steprint(f"\nAdded: {', '.join(n.name for n in added)}")
+    changed = [
+        n.name
+        for n, old in zip(existing, old_peers)
+        if peer_list(n, nodes, peers) != old
+    ]
+    if changed:
+        steprint(
+            f"Persistent peers changed for: {', '.join(changed)}. "
+            "Upgrade those releases to apply them."
+        )
+    steprint(
+        f"Install the new releases with: {network_dir}/releases.py up "
+        f"{network_dir} --only {','.join(n.name for n in added)}"
+    )
+    return network_dir
+
+
+def write_network(network_dir, nodes, ndau_genesis):
+    """
+    Writes a network directory's scripts, values and manifest. Files whose
+    contents are unchanged are left alone. Returns each node's peer indexes.
+    """
+    def write(name, contents, mode):
+        write_file(os.path.join(network_dir, name), contents, mode)
+
     # write genesis jsons
-    ndau_gen_path = os.path.join(network_dir, "ndau-genesis.json")
-    f = open(ndau_gen_path, "w")
-    f.write(json.dumps(ndau_genesis))
-    f.close()
-    os.chmod(ndau_gen_path, 0o644)
-
-    up_cmd = """#!/bin/bash\n\nif [ -z "$HELM_CHART_PATH" ]; then
-        >&2 echo HELM_CHART_PATH required; exit 1; fi\n\n
+    write("ndau-genesis.json", json.dumps(ndau_genesis), 0o644)
+
+    # the genesis is encoded once, either into the chart values every node
+    # gets, or into one ConfigMap every node mounts
+    if c.SHARED_GENESIS:
+        genesis_cm = genesis_configmap(f"{c.RELEASE}-genesis", ndau_genesis)
+        write("genesis-configmap.json", json.dumps(genesis_cm), 0o644)
+        ndau_genesis_opts = {"genesisConfigMap": genesis_cm["metadata"]["name"]}
+    else:
+        ndau_genesis_opts = {"genesis": jsonB64(ndau_genesis)}
+
+    # up.sh and down.sh hand releases.json to releases.py, which installs or
+    # deletes JOBS releases at a time.
+    up_cmd = textwrap.dedent("""\
+        #!/bin/bash
+
+        if [ -z "$HELM_CHART_PATH" ]; then
+            >&2 echo HELM_CHART_PATH required; exit 1; fi
+
         DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" >/dev/null 2>&1 && pwd )"
-        """
-    down_cmd = "#!/bin/bash\n\n"
+        if [ -f "$DIR/genesis-configmap.json" ]; then
+            kubectl apply -f "$DIR/genesis-configmap.json" || exit 1; fi
+        python3 "$DIR/releases.py" up "$DIR" --jobs "${JOBS:-4}" ${WAIT_READY:+--wait}
+        """)
+    down_cmd = textwrap.dedent("""\
+        #!/bin/bash
 
-    if c.IS_MINIKUBE:
-        tlsOrNot = ""
-    else:
-        tlsOrNot = "--tls"
+        DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" >/dev/null 2>&1 && pwd )"
+        python3 "$DIR/releases.py" down "$DIR" --jobs "${JOBS:-4}"
+        if [ -f "$DIR/genesis-configmap.json" ]; then
+            kubectl delete --ignore-not-found -f "$DIR/genesis-configmap.json"; fi
+        """)
+    releases = []
+    node_values = []
+
+    peers = topology.parse(c.TOPOLOGY)(len(nodes))
+    vprint(f"{c.TOPOLOGY} topology: {topology.connections(peers)} connections")
 
     # install a node group
     for idx, node in enumerate(nodes):
         steprint(f"\nInstalling node group: {node.name}")
 
-        # excludes self
-        otherNodes = list(filter(lambda peer: peer.name != node.name, nodes))
+        otherNodes = [nodes[j] for j in peers[idx]]
 
         # create a string of ndau peers in tendermint's formats
-        def ndau_peer(peer):
-            return (
-                f'{peer.ndau_node_id}@{c.MASTER_IP}'
-                f':{peer.ndau["port"]["p2p"]}'
-            )
-
-        ndauPeers = ",".join(list(map(ndau_peer, otherNodes)))
+        ndauPeers = peer_list(node, nodes, peers)
         ndauPeerIds = ",".join(
             list(map(lambda peer: peer.ndau_priv["address"], otherNodes))
         )
@@ -476,33 +1332,44 @@ def main():
         vprint(f"ndau peers: {ndauPeers}")
         vprint(f"ndau peer ids: {ndauPeerIds}")
 
-        ndau_args = make_args(
-            {
-                "ndaunode": {"image": {"tag": "$NDAUNODE_TAG"}},
-                "ndau": {
-                    "genesis": jsonB64(ndau_genesis),
-                    "privValidatorKey": jsonB64(node.ndau_priv),
-                    "nodeKey": jsonB64(node.ndau_nodeKey),
-                    "noms": {
-                        "snapshotCode": c.SNAPSHOT_CODE,
-                        "image": {"tag": "$NDAU_NOMS_TAG"},
-                    },
-                    "redis": {
-                        "image": {"tag": "$NDAU_REDIS_TAG"},
-                    },
-                    "tendermint": {
-                        "image": {"tag": "$NDAU_TM_TAG"},
-                        "moniker": node.name,
-                        "persistentPeers": b64(ndauPeers),
-                        "nodePorts": {
-                            "enabled": "true",
-                            "p2p": node.ndau["port"]["p2p"],
-                            "rpc": node.ndau["port"]["rpc"],
-                        },
+        ndau_opts = {
+            "ndaunode": {"image": {"tag": "$NDAUNODE_TAG"}},
+            "ndau": {
+                **ndau_genesis_opts,
+                "privValidatorKey": jsonB64(node.ndau_priv),
+                "nodeKey": jsonB64(node.ndau_nodeKey),
+                "noms": {
+                    "snapshotCode": c.SNAPSHOT_CODE,
+                    "image": {"tag": "$NDAU_NOMS_TAG"},
+                },
+                "redis": {
+                    "image": {"tag": "$NDAU_REDIS_TAG"},
+                },
+                "tendermint": {
+                    "image": {"tag": "$NDAU_TM_TAG"},
+                    "moniker": node.name,
+                    "persistentPeers": b64(ndauPeers),
+                    "nodePorts": {
+                        "enabled": "true",
+                        "p2p": node.ndau["port"]["p2p"],
+                        "rpc": node.ndau["port"]["rpc"],
                     },
                 },
-            }
-        )
+            },
+        }
+
+        if c.VALUES_FILES:
+            # only the options referencing shell variables stay on the
+            # command line, the rest go in values-common.json and values-N.json
+            values, shell_opts = split_values(ndau_opts)
+            node_values.append(values)
+            ndau_args = (
+                f'{make_args(shell_opts)} -f "$DIR/values-common.json" '
+                f'-f "$DIR/values-{idx}.json"'
+            )
+        else:
+            ndau_args = make_args(ndau_opts)
+
         steprint(f'{node.name} ndau P2P port: {node.ndau["port"]["p2p"]}')
         steprint(f'{node.name} ndau RPC port: {node.ndau["port"]["rpc"]}')
 
@@ -516,7 +1383,7 @@ def main():
         snapshot_enabled = ""
         snapshot_cron_enabled = ""
         snapshot_cron_schedule = ""
-        if idx is 0 and c.SNAPSHOT_ENABLED:
+        if idx == 0 and c.SNAPSHOT_ENABLED:
             snapshot_enabled = "--set snapshot.enabled=true"
             if c.SNAPSHOT_CRON_ENABLED:
                 snapshot_cron_enabled = "--set snapshot.cron.enabled=true"
@@ -549,13 +1416,23 @@ def main():
         vprint(f"helm command: {helm_command}")
 
         f_name = f"node-{idx}.sh"
-        down_cmd += f"helm del {node.name} --purge {tlsOrNot} || echo Could not delete {node.name}. Not found.\n"
-        up_cmd += f"$DIR/{f_name}\n"
-        f_path = os.path.join(network_dir, f_name)
-        f = open(f_path, "w")
-        f.write(f"#!/bin/bash\n{helm_command}")
-        f.close()
-        os.chmod(f_path, 0o777)
+        releases.append({"name": node.name, "script": f_name})
+        if c.VALUES_FILES:
+            write(
+                f_name,
+                '#!/bin/bash\n'
+                'DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" >/dev/null 2>&1 && pwd )"\n'
+                f"{helm_command}",
+                0o777,
+            )
+        else:
+            write(f_name, f"#!/bin/bash\n{helm_command}", 0o777)
+
+    # save the helm values files
+    if c.VALUES_FILES:
+        common, node_values = common_values(node_values)
+        for name, values in [("common", common)] + list(enumerate(node_values)):
+            write(f"values-{name}.json", json.dumps(values, indent=2), 0o600)
 
     # save the preconf.sh script
     preconf_cmd = textwrap.dedent(f"""#!/bin/bash\n\n
@@ -568,34 +1445,82 @@ def main():
         HELM_CHART_PATH={c.SCRIPT_DIR}/../helm/nodegroup \\
         "{network_dir}/up.sh"
         """)
-    preconf_path = os.path.join(network_dir, "preconf.sh")
-    f = open(preconf_path, "w")
-    f.write(preconf_cmd)
-    f.close()
-    os.chmod(preconf_path, 0o777)
-
-    # save the up.sh script
-    up_path = os.path.join(network_dir, "up.sh")
-    f = open(up_path, "w")
-    f.write(up_cmd)
-    f.close()
-    os.chmod(up_path, 0o777)
-
-    # save the down.sh script
-    down_path = os.path.join(network_dir, "down.sh")
-    f = open(down_path, "w")
-    f.write(down_cmd)
-    f.close()
-    os.chmod(down_path, 0o777)
-
-    # zip it up
-    try:
-        ret = run_command(f"cd {network_dir}; tar czf {c.RELEASE}.tgz * ")
-        steprint(f"Created tar ball: {network_dir}/{c.RELEASE}.tgz")
-    except subprocess.CalledProcessError:
-        steprint(f"Error creating tar ball: {ret.returncode}")
+    write("preconf.sh", preconf_cmd, 0o777)
 
-    steprint("All done.")
+    # save the release list and the runner that reads it
+    write(
+        releases_runner.RELEASES_FILE,
+        json.dumps({"tls": not c.IS_MINIKUBE, "releases": releases}, indent=2),
+        0o644,
+    )
+    with open(releases_runner.__file__) as f:
+        write("releases.py", f.read(), 0o755)
+
+    # save the up.sh and down.sh scripts
+    write("up.sh", up_cmd, 0o777)
+    write("down.sh", down_cmd, 0o777)
+
+    # save the manifest for extending the network later
+    write(
+        manifest.FILE,
+        manifest.dumps(
+            {
+                "release": c.RELEASE,
+                "topology": c.TOPOLOGY,
+                "master_ip": c.MASTER_IP,
+                "tags": {
+                    k: getattr(c, k)
+                    for k in [
+                        "COMMANDS_TAG",
+                        "NDAUNODE_TAG",
+                        "SNAPSHOT_REDIS_TAG",
+                        "NDAU_NOMS_TAG",
+                        "NDAU_REDIS_TAG",
+                        "NDAU_TM_TAG",
+                    ]
+                },
+                "options": {
+                    "values_files": c.VALUES_FILES,
+                    "shared_genesis": c.SHARED_GENESIS,
+                    "seed": c.SEED,
+                },
+                "fingerprint": None if c.EXTEND is not None else c.fingerprint(),
+                "genesis": ndau_genesis,
+                "peers": peers,
+                "nodes": [manifest.node_entry(n) for n in nodes],
+            }
+        ),
+        0o600,
+    )
+    return peers
+
+
+def peer_list(node, nodes, peers):
+    """Returns node's persistent peers, given every node's peer indexes."""
+    idx = nodes.index(node)
+    return ",".join(
+        f'{nodes[j].ndau_node_id}@{c.MASTER_IP}:{nodes[j].ndau["port"]["p2p"]}'
+        for j in peers[idx]
+    )
+
+
+def write_file(path, contents, mode):
+    """
+    Writes contents to path unless it already holds exactly that.
+    Returns True when the file was written.
+    """
+    try:
+        with open(path) as f:
+            if f.read() == contents:
+                os.chmod(path, mode)
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, "w") as f:
+        f.write(contents)
+    os.chmod(path, mode)
+    vprint(f"Wrote {path}")
+    return True
 
 
 def preflight(*cmds):
@@ -619,25 +1544,50 @@ def cmd_exists(x):
     )
 
 
-def run_command(command, isCritical=True):
-    """Runs a command in a subprocess."""
-    ret = subprocess.run(
+def run_command(command, isCritical=True, timeout=None):
+    """
+    Runs a command in a subprocess, streaming its output to the verbose log.
+    The command is killed after timeout seconds, or commandTimeout by default.
+    Read-only registry and cluster queries are retried as retryPolicies say.
+    """
+    start = recorder.now()
+    ret = retry.run_sync(
         command,
-        stdout=subprocess.PIPE,
-        universal_newlines=True,
-        stderr=subprocess.STDOUT,
-        shell=True,
+        retryPolicies,
+        retryCounters,
+        timeout=timeout if timeout is not None else commandTimeout,
+        on_line=stream_line if verboseFlag else None,
     )
+    recorder.command(command, start, ret.returncode, len(ret.stdout))
     if isCritical and ret.returncode != 0:
-        abortClean(
-            f"Command failed: {command}\n"
-            f"exit code: {ret.returncode}\n"
-            f"stderr\n{ret.stderr}\n"
-            f"stdout\n{ret.stdout}"
-        )
+        abortClean(commandFailure(command, ret))
+    return ret
+
+
+def check_command(command):
+    """Runs a command like run_command but raises OSError if it fails."""
+    ret = run_command(command, isCritical=False)
+    if ret.returncode != 0:
+        raise OSError(commandFailure(command, ret))
     return ret
 
 
+def commandFailure(command, ret):
+    """Describes a failed command's exit code and output."""
+    timedOut = f" (timed out after {ret.seconds:.0f}s)" if ret.timed_out else ""
+    return (
+        f"Command failed: {command}\n"
+        f"exit code: {ret.returncode}{timedOut}\n"
+        f"stderr\n{ret.stderr}\n"
+        f"stdout\n{ret.stdout}"
+    )
+
+
+def stream_line(stream, line):
+    """Prints a line of a running command's output."""
+    steprint(f"  {stream}: {line}")
+
+
 def fetch_master_sha(repo):
     """Fetches the 7 character sha from a remote git repo's master branch."""
     preflight("git", "grep", "awk", "cut")
@@ -652,6 +1602,46 @@ def fetch_master_sha(repo):
     return str(sha)
 
 
+def resolve_tags(lookups, cache=None):
+    """
+    Runs tag lookups concurrently and returns their results.
+    lookups maps a config name to a (function, repo) pair. Identical pairs
+    are only looked up once, through cache when one is given. How long each
+    lookup took is reported.
+    """
+    unique = sorted(set(lookups.values()), key=lambda l: (l[0].__name__, l[1]))
+    if len(unique) == 0:
+        return {}
+
+    timings = {}
+
+    def timed(lookup):
+        fn, repo = lookup
+        start = time.monotonic()
+        try:
+            if cache is not None:
+                return cache.get(fn, repo)
+            return fn(repo)
+        finally:
+            timings[lookup] = time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=len(unique)) as pool:
+        futures = {lookup: pool.submit(timed, lookup) for lookup in unique}
+
+    for lookup in unique:
+        fn, repo = lookup
+        if lookup in timings:
+            steprint(f"{fn.__name__} {repo}: {timings[lookup]:.2f}s")
+
+    tags = {}
+    for name, lookup in lookups.items():
+        try:
+            tags[name] = futures[lookup].result()
+        except OSError as e:
+            abortClean(f"{name} env var empty and could not fetch version: {e}")
+    return tags
+
+
 def highest_version_tag(repo):
     """Fetches the latest semver'd version from an AWS ECR repo."""
     preflight("aws", "jq", "sed", "sort", "tail")  # check environment
@@ -667,17 +1657,24 @@ def highest_version_tag(repo):
     return str(tag)
 
 
-def makeTempVolume():
+def makeTempVolume(name=None):
     """Creates a volume for persistence between docker containers."""
+    if name is None:
+        name = c.TMP_VOL
     try:
-        ret = run_command(f"docker volume create {c.TMP_VOL}")
-        steprint(f"Created volume: {c.TMP_VOL}")
-        global madeVolume
-        madeVolume = True
+        ret = run_command(f"docker volume create {name}")
+        steprint(f"Created volume: {name}")
+        with madeVolumesLock:
+            madeVolumes.append(name)
     except subprocess.CalledProcessError:
         steprint(f"error creating temp volume: {ret.returncode}")
 
 
+def docker_run(volume):
+    """Returns a docker run prefix that mounts volume at /tendermint."""
+    return f"docker run --rm --mount src={volume},dst=/tendermint "
+
+
 def conf_genesis_json(gj, chain, nodes):
     "Config genesis.json"
     gj["genesis_time"] = c.GENESIS_TIME.isoformat().replace("+00:00", "") + "Z"
@@ -689,21 +1686,41 @@ def conf_genesis_json(gj, chain, nodes):
     return gj
 
 
+def genesis_configmap(name, genesis):
+    """Returns a ConfigMap manifest holding genesis.json for a whole network."""
+    return {
+        "apiVersion": "v1",
+        "kind": "ConfigMap",
+        "metadata": {"name": name},
+        "data": {"genesis.json": json.dumps(genesis)},
+    }
+
+
 def clean():
-    """Attempts to delete the temporary docker volume."""
-    global madeVolume
-    if madeVolume:
-        ret = subprocess.run(
-            ["docker", "volume", "rm", c.TMP_VOL],
+    """Attempts to delete every temporary docker volume that was created."""
+    with madeVolumesLock:
+        volumes = madeVolumes[:]
+        madeVolumes.clear()
+
+    def remove(vol):
+        return subprocess.run(
+            ["docker", "volume", "rm", vol],
             stdout=subprocess.PIPE,
             universal_newlines=True,
         )
+
+    # Plain threads rather than cmdengine, since clean() can run from the
+    # SIGINT handler while an event loop is running.
+    with ThreadPoolExecutor(max_workers=max(1, len(volumes))) as pool:
+        rets = list(pool.map(remove, volumes))
+
+    for vol, ret in zip(volumes, rets):
         if ret.returncode == 0:
-            steprint(f"Removed volume: {c.TMP_VOL}")
+            steprint(f"Removed volume: {vol}")
         else:
             steprint(
                 f"Could not delete temporary docker volume: {ret.returncode}\n"
-                f"You can try: docker volume rm {c.TMP_VOL}"
+                f"You can try: docker volume rm {vol}"
             )
 
 
@@ -723,23 +1740,75 @@ def make_args(opts):
     This function allows a dict to represent all of the options.
     """
     args = ""
+    for key, leaf in flatten(opts).items():
+        if isinstance(leaf, str):
+            args += f'--set-string {key}="{leaf}" '
+        else:
+            args += f"--set {key}={leaf} "
+    return args
+
+
+def flatten(opts):
+    """
+    Converts a nested dict to a dict of helm-style dotted keys to leaves.
+    Leaves must be strings or ints, the same as make_args requires.
+    """
+    flat = {}
 
     def recurse(candidate, accumulator=""):
-        nonlocal args
         if isinstance(candidate, dict):
-            nonlocal args
             for k, v in candidate.items():
                 dotOrNot = "" if accumulator == "" else f"{accumulator}."
                 recurse(v, f"{dotOrNot}{k}")
-        elif isinstance(candidate, str):
-            args += f'--set-string {accumulator}="{candidate}" '
-        elif isinstance(candidate, int):
-            args += f"--set {accumulator}={candidate} "
+        elif isinstance(candidate, (str, int)):
+            flat[accumulator] = candidate
         else:
             raise ValueError("Leaves must be strings or ints.")
 
     recurse(opts)
-    return args
+    return flat
+
+
+def unflatten(flat):
+    """Converts a dict of dotted keys back into a nested dict."""
+    opts = {}
+    for key, leaf in flat.items():
+        parts = key.split(".")
+        d = opts
+        for part in parts[:-1]:
+            d = d.setdefault(part, {})
+        d[parts[-1]] = leaf
+    return opts
+
+
+def split_values(opts):
+    """
+    Splits make_args options into a helm values dict and the options that
+    must stay on the command line because they reference shell variables.
+    Leaves keep their types, so strings stay strings and ints stay ints
+    just as --set-string and --set would have them.
+    """
+    values = {}
+    shell = {}
+    for key, leaf in flatten(opts).items():
+        if isinstance(leaf, str) and "$" in leaf:
+            shell[key] = leaf
+        else:
+            values[key] = leaf
+    return unflatten(values), unflatten(shell)
+
+
+def common_values(node_values):
+    """
+    Moves the leaves that are identical for every node into a shared dict.
+    Returns the shared dict and each node's remaining values.
+    """
+    flats = [flatten(v) for v in node_values]
+    common = {
+        k: v for k, v in flats[0].items() if all(k in f and f[k] == v for f in flats)
+    }
+    rest = [unflatten({k: v for k, v in f.items() if k not in common}) for f in flats]
+    return unflatten(common), rest
 
 
 def jsonB64(val):
@@ -767,7 +1836,7 @@ def vpprint(hdr, obj):
     """Pretty-prints when the verboseFlag is set to true"""
     if verboseFlag:
         pp = pprint.PrettyPrinter(indent=4, stream=sys.stderr)
-        steprint("Configuration")
+        steprint(hdr)
         pp.pprint(obj)
 
 
@@ -776,7 +1845,11 @@ def warn_print(msg):
     steprint(f"\033[93mWARNING\033[0m: {msg}")
 
 
-def handle_sigint():
+def handle_sigint(signum, frame):
+    # Commands run in their own process groups, so they didn't get the
+    # Ctrl-C. Stop them before clean() removes volumes they may be using.
+    steprint("\nStopping running commands...")
+    cmdengine.interrupt()
     abortClean("Installation cancelled.")
 
 
@@ -789,7 +1862,6 @@ def iso8601(s):
 
 # kick it off
 if __name__ == "__main__":
+    signal.signal(signal.SIGINT, handle_sigint)
     main()
     clean()
-
-signal.signal(signal.SIGINT, handle_sigint)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Generates pools of node keys ahead of time and hands them out.
+
+A pool file is a fixed size header followed by fixed size records, so any
+record can be read without reading the ones before it. Each record holds a
+node's validator key and node key as seed and public key, which is all
+tmkeys needs to write their json without any curve math.
+
+The header holds the number of records and the index of the next unused one.
+draw() advances that index under an exclusive lock, so concurrent runs never
+get the same keys and a drawn key is never handed out again.
+"""
+
+import fcntl  # for locking the pool while drawing
+import os  # for paths, permissions and random seeds
+import struct  # for the pool format
+import sys  # to print to stderr
+from concurrent.futures import ProcessPoolExecutor  # key generation is CPU bound
+
+import tmkeys
+
+MAGIC = b"NDAUKEY1"
+
+# magic, number of records, index of the next unused record
+HEADER = struct.Struct(">8sII")
+
+# validator seed and public key, node key seed and public key
+RECORD = struct.Struct(">32s32s32s32s")
+
+
+class Keys:
+    """A node's keys as drawn from a pool."""
+
+    def __init__(self, validator_seed, validator_pub, node_seed, node_pub):
+        self.validator_seed = validator_seed
+        self.validator_pub = validator_pub
+        self.node_seed = node_seed
+        self.node_pub = node_pub
+
+    def priv_validator_key(self):
+        """Returns the contents of priv_validator_key.json as a dict."""
+        return tmkeys.priv_validator_key(self.validator_seed, self.validator_pub)
+
+    def node_key(self):
+        """Returns the contents of node_key.json as a dict."""
+        return tmkeys.node_key(self.node_seed, self.node_pub)
+
+
+def _record(_):
+    """Returns a new packed record."""
+    validator_seed, node_seed = tmkeys.new_seed(), tmkeys.new_seed()
+    return RECORD.pack(
+        validator_seed,
+        tmkeys.public_key(validator_seed),
+        node_seed,
+        tmkeys.public_key(node_seed),
+    )
+
+
+def generate(path, count, jobs=None):
+    """
+    Writes a new pool of count keys to path, computing them in jobs processes.
+    The pool is written to a temporary file first, so path never holds a
+    partial pool. An existing pool at path is not overwritten.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+    tmp = f"{path}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, count, 0))
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                for record in pool.map(_record, range(count), chunksize=64):
+                    f.write(record)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _header(f):
+    """
+    Reads and checks a pool's header and that the file holds every record
+    it counts. Returns (count, next).
+    """
+    f.seek(0)
+    header = f.read(HEADER.size)
+    if len(header) != HEADER.size or header[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"{f.name} is not a key pool")
+    _, count, next_index = HEADER.unpack(header)
+    size = os.fstat(f.fileno()).st_size
+    if size != HEADER.size + count * RECORD.size or next_index > count:
+        raise ValueError(
+            f"{f.name} is damaged: {size} bytes for {count} keys of which {next_index} drawn"
+        )
+    return count, next_index
+
+
+def status(path):
+    """Returns (count, next) for a pool: its size and how many were drawn."""
+    with open(path, "rb") as f:
+        return _header(f)
+
+
+def draw(path, n):
+    """
+    Returns the next n unused Keys of a pool and marks them used.
+    Raises ValueError when the pool has fewer than n left.
+    """
+    with open(path, "r+b") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            count, next_index = _header(f)
+            if next_index + n > count:
+                raise ValueError(
+                    f"{path} has {count - next_index} unused keys, {n} needed"
+                )
+            f.seek(HEADER.size + next_index * RECORD.size)
+            data = f.read(n * RECORD.size)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, count, next_index + n))
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    return [Keys(*fields) for fields in RECORD.iter_unpack(data)]
+
+
+def steprint(*args, **kwargs):
+    """Prints to stderr."""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Generates node key pools for gen_node_groups.py --key-pool."
+    )
+    parser.add_argument("action", choices=["generate", "status"])
+    parser.add_argument("pool", help="Pool file.")
+    parser.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        default=1000,
+        help="Number of node keys to generate. (default: 1000)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Processes generating keys. (default: one per CPU)",
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.action == "generate":
+            generate(args.pool, args.count, args.jobs)
+        count, next_index = status(args.pool)
+    except (OSError, ValueError) as e:
+        exit(str(e))
+    steprint(f"{args.pool}: {count - next_index} of {count} keys unused")
+
+
+# kick it off
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Sends transactions to a generated network at a steady rate.
+
+Transactions are sent with tendermint's broadcast_tx_sync, _async or
+_commit, round robin over every node's RPC NodePort, at most concurrency at
+a time. Each send has a slot in a schedule at the rate, and its latency is
+measured from that slot rather than from when it went out, so time spent
+waiting for one of the concurrency to free up counts too. A network that
+can't keep up shows it as latency, late sends and a send rate below the one
+asked for rather than hiding it.
+
+Transactions are random bytes of the given size unless a file of hex
+encoded transactions is given. The ndau app rejects random bytes in
+CheckTx, which still exercises tendermint's RPC and mempool; replay signed
+transactions to load the app itself.
+"""
+
+import asyncio  # for sending concurrently
+import math  # for percentiles
+import os  # for random payloads
+import sys  # to print to stderr
+import time  # for pacing and latency
+
+import manifest
+import tmrpc
+
+MODES = ["sync", "async", "commit"]
+
+# errors tendermint returns when the mempool won't take a transaction
+MEMPOOL_ERRORS = ["mempool is full", "tx already exists in cache"]
+
+
+class Stats:
+    """Outcomes and latencies of the transactions sent."""
+
+    def __init__(self):
+        self.sent = 0
+        self.accepted = 0
+        self.mempool_rejected = 0
+        self.check_tx_rejected = 0
+        self.deliver_tx_failed = 0
+        self.errors = 0
+        # sends that went out after the next one was due
+        self.late = 0
+        self.latencies = []
+        self.seconds = 0
+
+    def record(self, outcome, latency):
+        """
+        Counts one transaction's outcome: accepted, mempool, check_tx,
+        deliver_tx or error.
+        """
+        if outcome == "accepted":
+            self.accepted += 1
+            self.latencies.append(latency)
+        elif outcome == "mempool":
+            self.mempool_rejected += 1
+        elif outcome == "check_tx":
+            self.check_tx_rejected += 1
+        elif outcome == "deliver_tx":
+            self.deliver_tx_failed += 1
+        else:
+            self.errors += 1
+
+    def percentile(self, p):
+        """Returns the p-th percentile latency of accepted transactions, or None."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def payloads(size, txs=None):
+    """Yields transactions forever: the hex txs in turn, or random ones of size bytes."""
+    if txs:
+        while True:
+            yield from txs
+    while True:
+        yield "0x" + os.urandom(size).hex()
+
+
+def load_txs(path):
+    """Returns the hex encoded transactions of a file, one a line, as 0x strings."""
+    with open(path) as f:
+        lines = [line.strip() for line in f if line.strip()]
+    return [line if line.startswith("0x") else f"0x{line}" for line in lines]
+
+
+def outcome(mode, result):
+    """
+    Classifies a broadcast's result as accepted, check_tx, or deliver_tx when
+    a committed transaction failed in the block.
+    """
+    check = result.get("check_tx", result) if mode == "commit" else result
+    if check.get("code", 0) != 0:
+        return "check_tx"
+    if mode == "commit" and result.get("deliver_tx", {}).get("code", 0) != 0:
+        return "deliver_tx"
+    return "accepted"
+
+
+async def send(pool, mode, tx, stats, scheduled=None):
+    """
+    Broadcasts one transaction and records how it went, with its latency
+    from scheduled, the monotonic time it was due, or else from now.
+    """
+    start = time.monotonic() if scheduled is None else scheduled
+    try:
+        result = await pool.call(f"broadcast_tx_{mode}", tx=tx)
+        kind = outcome(mode, result)
+    except tmrpc.RPCError as e:
+        kind = "mempool" if any(m in str(e) for m in MEMPOOL_ERRORS) else "error"
+    except OSError:
+        kind = "error"
+    stats.record(kind, time.monotonic() - start)
+
+
+async def run(
+    endpoints, rate, duration, concurrency=16, size=256, mode="sync", txs=None, timeout=30
+):
+    """
+    Sends rate transactions a second for duration seconds, spread round
+    robin over endpoints, with at most concurrency unanswered at once.
+    Latencies are from each send's scheduled time. Returns the Stats.
+    """
+    pools = [
+        tmrpc.Pool(host, port, concurrency, timeout) for _, host, port in endpoints
+    ]
+    stats = Stats()
+    slots = asyncio.Semaphore(concurrency)
+    source = payloads(size, txs)
+    pending = set()
+
+    async def bounded(pool, tx, scheduled):
+        try:
+            await send(pool, mode, tx, stats, scheduled)
+        finally:
+            slots.release()
+
+    start = time.monotonic()
+    count = int(rate * duration)
+    try:
+        for i in range(count):
+            scheduled = start + i / rate
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await slots.acquire()
+            # behind by more than the gap between sends, so not just jitter
+            if time.monotonic() - scheduled > 1 / rate:
+                stats.late += 1
+            stats.sent += 1
+            task = asyncio.create_task(
+                bounded(pools[i % len(pools)], next(source), scheduled)
+            )
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        await asyncio.gather(*pending)
+    finally:
+        stats.seconds = time.monotonic() - start
+        await asyncio.gather(*(p.close() for p in pools))
+    return stats
+
+
+def report(stats, mode):
+    """Prints throughput, latency percentiles and rejections."""
+    seconds = max(stats.seconds, 1e-9)
+    steprint(f"\nload summary ({mode})")
+    steprint(f"  sent              {stats.sent:>8}  {stats.sent / seconds:9.1f}/s")
+    steprint(f"  accepted          {stats.accepted:>8}  {stats.accepted / seconds:9.1f}/s")
+    steprint(f"  mempool rejected  {stats.mempool_rejected:>8}")
+    steprint(f"  CheckTx rejected  {stats.check_tx_rejected:>8}")
+    steprint(f"  DeliverTx failed  {stats.deliver_tx_failed:>8}")
+    steprint(f"  errors            {stats.errors:>8}")
+    steprint(f"  sent late         {stats.late:>8}")
+    latency = "commit" if mode == "commit" else "broadcast"
+    for p in [50, 90, 99, 100]:
+        value = stats.percentile(p)
+        shown = "-" if value is None else f"{value * 1000:.1f}ms"
+        steprint(f"  {latency} p{p:<3}     {shown:>12}")
+
+
+def steprint(*args, **kwargs):
+    """Prints to stderr."""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Sends transactions to a generated network's nodes and measures them."
+    )
+    parser.add_argument("network_dir", help="Network directory made by gen_node_groups.py.")
+    parser.add_argument(
+        "--rate", type=float, default=50, help="Transactions a second. (default: 50)"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30, help="Seconds to send for. (default: 30)"
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Most transactions awaiting an answer at once. (default: 16)",
+    )
+    parser.add_argument(
+        "--size", type=int, default=256, help="Bytes in a random transaction. (default: 256)"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=MODES,
+        default="commit",
+        help=(
+            "broadcast_tx_ method to use. commit waits for each transaction's "
+            "block, so its latency is commit latency. (default: commit)"
+        ),
+    )
+    parser.add_argument(
+        "--txs",
+        metavar="FILE",
+        help="Send these hex encoded transactions, one a line, in turn instead of random ones.",
+    )
+    parser.add_argument(
+        "--host", help="Address of the nodes' RPC NodePorts. (default: the manifest's master_ip)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=30,
+        help="Seconds before a broadcast is counted as an error. (default: 30)",
+    )
+    args = parser.parse_args()
+
+    if args.rate <= 0 or args.duration <= 0 or args.concurrency < 1 or args.size < 1:
+        exit("rate, duration, concurrency and size must be positive")
+
+    try:
+        endpoints = tmrpc.endpoints(manifest.load(args.network_dir), args.host)
+    except (OSError, ValueError, KeyError) as e:
+        exit(f"Couldn't read the network: {e}")
+
+    txs = None
+    if args.txs is not None:
+        try:
+            txs = load_txs(args.txs)
+        except OSError as e:
+            exit(f"Couldn't read transactions: {e}")
+        if not txs:
+            exit(f"{args.txs} has no transactions")
+
+    steprint(
+        f"Sending {args.rate:g} tx/s for {args.duration:g}s to {len(endpoints)} nodes "
+        f"with broadcast_tx_{args.mode}"
+    )
+    stats = asyncio.run(
+        run(
+            endpoints,
+            args.rate,
+            args.duration,
+            args.concurrency,
+            args.size,
+            args.mode,
+            txs,
+            args.timeout,
+        )
+    )
+    report(stats, args.mode)
+    if stats.accepted == 0:
+        exit(1)
+
+
+# kick it off
+if __name__ == "__main__":
+    main()
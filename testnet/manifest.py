@@ -0,0 +1,84 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Reads and writes network.json, the machine-readable description of a
+generated network directory.
+
+It holds everything needed to regenerate the directory's scripts without
+repeating any slow work: the release name, image tags, options, the genesis
+and every node's ports and keys. Since it holds private keys it is only
+readable by its owner.
+"""
+
+import json  # the manifest format
+import os  # for paths and permissions
+import re  # for matching network directory names
+
+FILE = "network.json"
+VERSION = 1
+
+
+def path(network_dir):
+    """Returns the path of a network directory's manifest."""
+    return os.path.join(network_dir, FILE)
+
+
+def load(network_dir):
+    """Returns a network directory's manifest."""
+    with open(path(network_dir)) as f:
+        m = json.load(f)
+    if m.get("version") != VERSION:
+        raise ValueError(
+            f"{path(network_dir)} is version {m.get('version')}, expected {VERSION}"
+        )
+    return m
+
+
+def find(output_dir, release, fingerprint):
+    """
+    Returns the directory in output_dir that release was generated in with
+    fingerprint, or None.
+    """
+    pattern = re.compile(rf"network-{re.escape(release)}(-\d+)?")
+    for name in sorted(os.listdir(output_dir)):
+        if not pattern.fullmatch(name):
+            continue
+        network_dir = os.path.join(output_dir, name)
+        try:
+            m = load(network_dir)
+        except (OSError, ValueError):
+            continue
+        if m.get("fingerprint") == fingerprint and m.get("release") == release:
+            return network_dir
+    return None
+
+
+def dumps(m):
+    """
+    Serializes a manifest. Keys keep their order, so the genesis loads back
+    exactly as it was written and serializes to the same bytes.
+    """
+    return json.dumps({"version": VERSION, **m}, indent=2) + "\n"
+
+
+def node_entry(node):
+    """Returns a node's manifest entry."""
+    return {
+        "name": node.name,
+        "ports": dict(node.ndau["port"]),
+        "node_id": node.ndau_node_id,
+        "priv_validator_key": node.ndau_priv,
+        "node_key": node.ndau_nodeKey,
+    }
+
+
+def max_port(m):
+    """Returns the highest port used by any node in a manifest."""
+    return max(p for n in m["nodes"] for p in n["ports"].values())
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Watches the chain health of generated networks and serves it to Prometheus.
+
+The nodes of each network directory are read from its manifest, which is
+read again whenever it changes, so an extended network is picked up. Every
+interval each node's /status, /net_info and /num_unconfirmed_txs are called
+at once over a small pool of kept-alive connections to it. Only the latest
+values are kept, so memory is fixed per node however long it runs.
+
+GET /metrics answers in Prometheus' text format with every node's height,
+lag behind the highest node of its network, peers, mempool size and RPC
+latency, labelled by release and node.
+"""
+
+import asyncio  # for polling and serving
+import os  # for manifest modification times
+import sys  # to print to stderr
+import time  # for RPC latency
+
+import manifest
+import tmrpc
+
+# connections kept open to each node, one per call made each poll
+POOL_SIZE = 3
+
+METRICS = [
+    ("ndau_node_up", "gauge", "1 when the node answered its last poll."),
+    ("ndau_node_height", "gauge", "Latest block height."),
+    ("ndau_node_lag_blocks", "gauge", "Blocks behind the highest node of its network."),
+    ("ndau_node_catching_up", "gauge", "1 while the node is catching up."),
+    ("ndau_node_peers", "gauge", "Connected peers."),
+    ("ndau_node_mempool_txs", "gauge", "Transactions in the mempool."),
+    ("ndau_node_rpc_latency_seconds", "gauge", "Seconds the last /status call took."),
+    ("ndau_node_rpc_errors_total", "counter", "Polls that failed."),
+]
+
+
+class Node:
+    """The latest state of one node."""
+
+    __slots__ = [
+        "release",
+        "name",
+        "pool",
+        "up",
+        "height",
+        "catching_up",
+        "peers",
+        "mempool",
+        "latency",
+        "errors",
+    ]
+
+    def __init__(self, release, name, host, port, timeout=5):
+        self.release = release
+        self.name = name
+        self.pool = tmrpc.Pool(host, port, POOL_SIZE, timeout)
+        self.up = False
+        self.height = 0
+        self.catching_up = False
+        self.peers = 0
+        self.mempool = 0
+        self.latency = 0.0
+        self.errors = 0
+
+    async def poll(self):
+        """Calls the node's RPC and keeps what it says."""
+
+        async def timed_status():
+            start = time.monotonic()
+            result = await self.pool.call("status")
+            return result, time.monotonic() - start
+
+        try:
+            (status, latency), net_info, unconfirmed = await asyncio.gather(
+                timed_status(),
+                self.pool.call("net_info"),
+                self.pool.call("num_unconfirmed_txs"),
+            )
+            self.height = int(status["sync_info"]["latest_block_height"])
+            self.catching_up = bool(status["sync_info"]["catching_up"])
+            self.peers = int(net_info["n_peers"])
+            self.mempool = int(unconfirmed["total"])
+            self.latency = latency
+            self.up = True
+        except (OSError, tmrpc.RPCError, ValueError, KeyError) as e:
+            if self.up:
+                steprint(f"{self.name}: {e}")
+            self.up = False
+            self.errors += 1
+
+
+class Monitor:
+    """The nodes of a set of network directories."""
+
+    def __init__(self, network_dirs, host=None, timeout=5):
+        self.network_dirs = network_dirs
+        self.host = host
+        self.timeout = timeout
+        # network directory to (manifest mtime, its Nodes)
+        self.networks = {}
+
+    async def load(self):
+        """Reads the manifests that changed since they were last read."""
+        for network_dir in self.network_dirs:
+            try:
+                mtime = os.stat(manifest.path(network_dir)).st_mtime_ns
+                if network_dir in self.networks and self.networks[network_dir][0] == mtime:
+                    continue
+                network = manifest.load(network_dir)
+                endpoints = tmrpc.endpoints(network, self.host)
+            except (OSError, ValueError, KeyError) as e:
+                steprint(f"Couldn't read {network_dir}: {e}")
+                continue
+            old = {
+                (n.name, n.pool.host, n.pool.port): n
+                for n in self.networks.get(network_dir, (0, []))[1]
+            }
+            nodes = [
+                old.pop((name, host, port), None)
+                or Node(network["release"], name, host, port, self.timeout)
+                for name, host, port in endpoints
+            ]
+            await asyncio.gather(*(n.pool.close() for n in old.values()))
+            self.networks[network_dir] = (mtime, nodes)
+            steprint(f"Monitoring {len(nodes)} nodes of {network['release']}")
+
+    def nodes(self):
+        """Returns every node being monitored."""
+        return [n for _, nodes in self.networks.values() for n in nodes]
+
+    async def poll(self):
+        """Reloads changed manifests, then polls every node at once."""
+        await self.load()
+        await asyncio.gather(*(n.poll() for n in self.nodes()))
+
+    async def run(self, interval):
+        """Polls every interval seconds until cancelled."""
+        try:
+            while True:
+                start = time.monotonic()
+                await self.poll()
+                await asyncio.sleep(max(0, interval - (time.monotonic() - start)))
+        finally:
+            await asyncio.gather(*(n.pool.close() for n in self.nodes()))
+
+    def render(self):
+        """Returns the metrics in Prometheus' text format."""
+        values = {name: [] for name, _, _ in METRICS}
+        for _, nodes in self.networks.values():
+            tip = max((n.height for n in nodes if n.up), default=0)
+            for n in nodes:
+                labels = f'release="{_escape(n.release)}",node="{_escape(n.name)}"'
+                values["ndau_node_up"].append((labels, int(n.up)))
+                values["ndau_node_rpc_errors_total"].append((labels, n.errors))
+                # a node that didn't answer has no current values
+                if not n.up:
+                    continue
+                values["ndau_node_height"].append((labels, n.height))
+                values["ndau_node_lag_blocks"].append((labels, tip - n.height))
+                values["ndau_node_catching_up"].append((labels, int(n.catching_up)))
+                values["ndau_node_peers"].append((labels, n.peers))
+                values["ndau_node_mempool_txs"].append((labels, n.mempool))
+                values["ndau_node_rpc_latency_seconds"].append((labels, round(n.latency, 6)))
+        lines = []
+        for name, kind, help_text in METRICS:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{{{labels}}} {value}" for labels, value in values[name]]
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, reader, writer):
+        """Answers one HTTP request: GET /metrics or 404."""
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            method, path = request.split(b" ", 2)[:2]
+            if method == b"GET" and path.split(b"?")[0] == b"/metrics":
+                status = "200 OK"
+                body = self.render().encode()
+            else:
+                status = "404 Not Found"
+                body = b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+
+def _escape(value):
+    """Escapes a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+async def run(monitor, listen, port, interval):
+    """Serves /metrics on listen:port and polls until cancelled."""
+    server = await asyncio.start_server(monitor.serve, listen, port)
+    steprint(f"Serving metrics on http://{listen}:{port}/metrics")
+    async with server:
+        await monitor.run(interval)
+
+
+def steprint(*args, **kwargs):
+    """Prints to stderr."""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Serves the chain health of generated networks to Prometheus."
+    )
+    parser.add_argument(
+        "network_dirs",
+        nargs="+",
+        metavar="NETWORK_DIR",
+        help="Network directories made by gen_node_groups.py.",
+    )
+    parser.add_argument(
+        "--port", type=int, default=9110, help="Port to serve /metrics on. (default: 9110)"
+    )
+    parser.add_argument(
+        "--listen", default="0.0.0.0", help="Address to serve on. (default: 0.0.0.0)"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=15, help="Seconds between polls. (default: 15)"
+    )
+    parser.add_argument(
+        "--host", help="Address of the nodes' RPC NodePorts. (default: each manifest's master_ip)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=5,
+        help="Seconds before an RPC call counts as failed. (default: 5)",
+    )
+    args = parser.parse_args()
+
+    monitor = Monitor(args.network_dirs, args.host, args.timeout)
+    try:
+        asyncio.run(run(monitor, args.listen, args.port, args.interval))
+    except OSError as e:
+        exit(f"Couldn't serve metrics: {e}")
+    except KeyboardInterrupt:
+        pass
+
+
+# kick it off
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Hands out NodePorts that nothing else is using.
+
+Ports in use are kept in a bitmap covering every port number, loaded once
+from the cluster's services (`kubectl get svc -A -o json`) and from the
+manifests of networks generated but maybe not installed yet. Allocation
+walks a cursor forward over the bitmap, so handing out a port is O(1)
+amortized and never returns a port twice. Only ports in kubernetes'
+NodePort range are handed out, since the API server rejects any other.
+"""
+
+import glob  # for finding other networks' manifests
+import os  # for paths
+
+import manifest
+
+# kubernetes' default --service-node-port-range
+RANGE_START = 30000
+RANGE_END = 32767
+
+MAX_PORT = 65535
+
+
+class Allocator:
+    """A bitmap of ports in use and a cursor to allocate after."""
+
+    def __init__(self, start=RANGE_START, used=()):
+        """
+        Creates an allocator that hands out ports after start, skipping used.
+        """
+        self.bits = bytearray((MAX_PORT + 1) // 8)
+        self.cursor = start
+        for port in used:
+            self.reserve(port)
+
+    @classmethod
+    def from_services(cls, services, start=RANGE_START):
+        """Creates an allocator from the json of `kubectl get svc -A -o json`."""
+        return cls(start, service_ports(services))
+
+    def reserve(self, port):
+        """Marks a port as used."""
+        self.bits[port >> 3] |= 1 << (port & 7)
+
+    def is_free(self, port):
+        """Returns True when nothing uses port."""
+        return not self.bits[port >> 3] & (1 << (port & 7))
+
+    def seek(self, port):
+        """Makes the next allocation start after port."""
+        self.cursor = port
+
+    def copy(self):
+        """Returns an allocator with the same ports used and cursor."""
+        other = Allocator(self.cursor)
+        other.bits[:] = self.bits
+        return other
+
+    def alloc(self):
+        """
+        Returns the first free NodePort after the cursor and marks it used.
+        Raises ValueError when there are none left in the NodePort range.
+        """
+        port = max(self.cursor + 1, RANGE_START)
+        while port <= RANGE_END and not self.is_free(port):
+            port += 1
+        if port > RANGE_END:
+            raise ValueError(
+                f"no free NodePorts after {self.cursor} "
+                f"in the range {RANGE_START}-{RANGE_END}"
+            )
+        self.reserve(port)
+        self.cursor = port
+        return port
+
+    def alloc_pair(self):
+        """Returns two free ports, for a node's P2P and RPC ports."""
+        return self.alloc(), self.alloc()
+
+
+def service_ports(services):
+    """Returns the NodePorts used by the services of `kubectl get svc -o json`."""
+    return [
+        port["nodePort"]
+        for svc in services.get("items", [])
+        for port in svc.get("spec", {}).get("ports", [])
+        if port.get("nodePort")
+    ]
+
+
+def manifest_ports(output_dir):
+    """Returns the ports reserved by every network directory in output_dir."""
+    used = []
+    for path in glob.glob(os.path.join(output_dir, "network-*", manifest.FILE)):
+        try:
+            m = manifest.load(os.path.dirname(path))
+        except (OSError, ValueError):
+            continue
+        used += [p for n in m["nodes"] for p in n["ports"].values()]
+    return used
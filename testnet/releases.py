@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Installs or deletes the helm releases of a generated network in parallel.
+
+gen_node_groups.py copies this script into every network directory next to
+releases.json, which lists each release and the script that installs it.
+"""
+
+import json  # for reading releases.json
+import os  # for paths
+import subprocess  # for running helm and kubectl
+import sys  # to print to stderr
+import time  # for timing releases
+from concurrent.futures import ThreadPoolExecutor, as_completed  # for bounded concurrency
+
+RELEASES_FILE = "releases.json"
+
+# seconds between checks for a release's deployments to exist
+WAIT_POLL = 1
+
+
+class Result:
+    """Outcome of installing or deleting a single release."""
+
+    def __init__(self, name, returncode, seconds, output=""):
+        self.name = name
+        self.returncode = returncode
+        self.seconds = seconds
+        self.output = output
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+
+def load(network_dir):
+    """Returns the contents of a network directory's releases.json."""
+    with open(os.path.join(network_dir, RELEASES_FILE)) as f:
+        return json.load(f)
+
+
+def run(command, timeout=None):
+    """Runs a command, returning its exit code and combined output."""
+    try:
+        ret = subprocess.run(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired as e:
+        return 124, f"timed out after {timeout}s\n{e.output or ''}"
+    return ret.returncode, ret.stdout
+
+
+def install(network_dir, release, wait=False, timeout=600):
+    """Runs a release's install script, then optionally waits for it to be ready."""
+    start = time.monotonic()
+    code, out = run([os.path.join(network_dir, release["script"])])
+    if code == 0 and wait:
+        code, wait_out = wait_ready(release["name"], timeout)
+        out += wait_out
+    return Result(release["name"], code, time.monotonic() - start, out)
+
+
+def wait_ready(name, timeout):
+    """
+    Blocks until every deployment of a release is Available, meaning its
+    pods are Ready, or timeout passes. Right after helm install kubectl may
+    not find them yet, so that is retried until they show up.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        left = max(1, int(deadline - time.monotonic()))
+        code, out = run(
+            [
+                "kubectl",
+                "wait",
+                "--for=condition=Available",
+                "deployment",
+                "-l",
+                f"release={name}",
+                f"--timeout={left}s",
+            ],
+            timeout=left + 30,
+        )
+        if code == 0 or "no matching resources" not in out:
+            return code, out
+        if time.monotonic() + WAIT_POLL >= deadline:
+            return code, out
+        time.sleep(WAIT_POLL)
+
+
+def delete(release, tls=False):
+    """Deletes a release with helm."""
+    start = time.monotonic()
+    cmd = ["helm", "del", release["name"], "--purge"]
+    if tls:
+        cmd.append("--tls")
+    code, out = run(cmd)
+    if code != 0 and "not found" in out:
+        # nothing to delete, which is what we wanted
+        code, out = 0, f"Could not delete {release['name']}. Not found.\n{out}"
+    return Result(release["name"], code, time.monotonic() - start, out)
+
+
+def run_all(fn, releases, jobs):
+    """
+    Applies fn to every release with at most jobs at a time.
+    Progress is printed as releases finish; results keep the releases' order.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {pool.submit(fn, r): i for i, r in enumerate(releases)}
+        for future in as_completed(futures):
+            result = future.result()
+            status = "ok" if result.ok else f"FAILED ({result.returncode})"
+            steprint(f"{result.name}: {status} in {result.seconds:.1f}s")
+            results[futures[future]] = result
+    return [results[i] for i in range(len(releases))]
+
+
+def summarize(action, results):
+    """Prints a summary table and returns the names of failed releases."""
+    steprint(f"\n{action} summary")
+    for r in results:
+        steprint(f"  {r.name:<24} exit {r.returncode:<4} {r.seconds:7.1f}s")
+    failed = [r.name for r in results if not r.ok]
+    for r in results:
+        if not r.ok:
+            steprint(f"\n{r.name} output:\n{r.output}")
+    if failed:
+        steprint(f"\nFailed releases: {', '.join(failed)}")
+    else:
+        steprint(f"\nAll {len(results)} releases succeeded.")
+    return failed
+
+
+def select(releases, only):
+    """
+    Returns the releases named in the comma separated list only, in their
+    original order. Raises ValueError for a name that isn't a release.
+    """
+    if not only:
+        return releases
+    names = only.split(",")
+    unknown = set(names) - {r["name"] for r in releases}
+    if unknown:
+        raise ValueError(f"unknown releases: {', '.join(sorted(unknown))}")
+    return [r for r in releases if r["name"] in names]
+
+
+def steprint(*args, **kwargs):
+    """Prints to stderr."""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Installs or deletes a network's helm releases in parallel."
+    )
+    parser.add_argument("action", choices=["up", "down"])
+    parser.add_argument(
+        "network_dir",
+        nargs="?",
+        default=os.path.dirname(os.path.realpath(__file__)),
+        help="Generated network directory. Defaults to this script's directory.",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=4, help="Releases to handle at once."
+    )
+    parser.add_argument(
+        "--wait",
+        action="store_true",
+        help="After installing, block until each release's deployments are Available.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=600,
+        help="Seconds to wait for a release's deployments to become Available.",
+    )
+    parser.add_argument(
+        "--only",
+        metavar="NAME,...",
+        help="Only handle these releases, e.g. the ones added by --extend.",
+    )
+    args = parser.parse_args()
+
+    network = load(args.network_dir)
+    try:
+        releases = select(network["releases"], args.only)
+    except ValueError as e:
+        exit(str(e))
+
+    if args.action == "up":
+        results = run_all(
+            lambda r: install(args.network_dir, r, args.wait, args.timeout),
+            releases,
+            args.jobs,
+        )
+    else:
+        results = run_all(
+            lambda r: delete(r, network.get("tls", False)), releases, args.jobs
+        )
+
+    if summarize(args.action, results):
+        exit(1)
+
+
+# kick it off
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Retries flaky commands with exponential backoff and jitter.
+
+Commands are sorted into classes by what they talk to. Each class has a
+RetryPolicy saying how many attempts it gets and, for read-only commands,
+after how many seconds a duplicate "hedged" attempt is started alongside a
+slow one; whichever finishes successfully first is used.
+
+Classes:
+    registry    read-only ECR and GitHub lookups (aws ecr list-*, git ls-remote)
+    cluster     read-only cluster queries (kubectl get/config, minikube ip)
+    default     everything else. Not retried, since it may not be idempotent.
+"""
+
+import asyncio  # for hedging
+import random  # for jitter
+import re  # for classifying commands
+import threading  # counters are shared between threads
+
+import cmdengine
+
+
+class RetryPolicy:
+    """How a class of commands is retried."""
+
+    def __init__(
+        self,
+        attempts=1,
+        base_delay=0.5,
+        max_delay=8.0,
+        jitter=0.5,
+        hedge_after=None,
+        require_output=False,
+    ):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.hedge_after = hedge_after  # None disables hedging
+        # pipelines exit with their last command's code, so a failed lookup at
+        # the front of one shows up as empty output instead
+        self.require_output = require_output
+
+    def accepts(self, result):
+        """Returns True when a result counts as a success."""
+        if result.returncode != 0:
+            return False
+        return not self.require_output or result.stdout.strip() != ""
+
+    def delay(self, retry, rng=random):
+        """Returns the seconds to wait before the retry-th retry (from 0)."""
+        delay = min(self.max_delay, self.base_delay * 2 ** retry)
+        return rng.uniform(delay * (1 - self.jitter), delay)
+
+
+DEFAULT_POLICIES = {
+    "registry": RetryPolicy(attempts=4, hedge_after=10.0, require_output=True),
+    "cluster": RetryPolicy(attempts=3, hedge_after=10.0, require_output=True),
+    "default": RetryPolicy(),
+}
+
+_CLASSES = [
+    ("registry", re.compile(r"^\s*(aws\s+ecr\s+(list|describe)-|git\s+ls-remote\b)")),
+    ("cluster", re.compile(r"^\s*(kubectl\s+(get|config)\b|minikube\s+ip\b)")),
+]
+
+
+def classify(command):
+    """Returns the class of a shell command."""
+    for name, pattern in _CLASSES:
+        if pattern.search(command):
+            return name
+    return "default"
+
+
+def parse_policy(spec, policies=None):
+    """
+    Applies a spec of the form CLASS:ATTEMPTS[:HEDGE_SECONDS] to a copy of
+    policies and returns it. A hedge of 0 turns hedging off.
+    """
+    policies = dict(policies or DEFAULT_POLICIES)
+    parts = spec.split(":")
+    if len(parts) not in (2, 3) or parts[0] not in policies:
+        raise ValueError(
+            f"retry spec must be CLASS:ATTEMPTS[:HEDGE_SECONDS] with CLASS one "
+            f"of {', '.join(policies)}: {spec}"
+        )
+    old = policies[parts[0]]
+    attempts = int(parts[1])
+    if attempts < 1:
+        raise ValueError(f"retry attempts must be at least 1: {spec}")
+    hedge_after = old.hedge_after
+    if len(parts) == 3:
+        hedge_after = float(parts[2]) or None
+    policies[parts[0]] = RetryPolicy(
+        attempts,
+        old.base_delay,
+        old.max_delay,
+        old.jitter,
+        hedge_after,
+        old.require_output,
+    )
+    return policies
+
+
+class Counters:
+    """Counts attempts, retries, hedges and failures per command class."""
+
+    FIELDS = ["commands", "attempts", "retries", "hedges", "hedge_wins", "failures"]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, cls, field, n=1):
+        with self.lock:
+            counts = self.counts.setdefault(cls, dict.fromkeys(self.FIELDS, 0))
+            counts[field] += n
+
+    def snapshot(self):
+        """Returns a copy of the counts."""
+        with self.lock:
+            return {cls: dict(c) for cls, c in self.counts.items()}
+
+
+async def _hedged(command, policy, timeout, on_line, counters, cls):
+    """Runs one attempt, starting a duplicate if the first is slow."""
+    first = asyncio.ensure_future(cmdengine.run(command, timeout, on_line))
+    counters.add(cls, "attempts")
+    if policy.hedge_after is None:
+        return await first
+
+    done, _ = await asyncio.wait({first}, timeout=policy.hedge_after)
+    if done:
+        return first.result()
+
+    second = asyncio.ensure_future(cmdengine.run(command, timeout, on_line))
+    counters.add(cls, "hedges")
+    counters.add(cls, "attempts")
+    pending = {first, second}
+    result = None
+    while pending:
+        done, pending = await asyncio.wait(
+            pending, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            result = task.result()
+            if policy.accepts(result):
+                for other in pending:
+                    other.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                if task is second:
+                    counters.add(cls, "hedge_wins")
+                return result
+    return result
+
+
+async def run(command, policy, counters, cls="default", timeout=None, on_line=None):
+    """Runs a command under a retry policy and returns the last result."""
+    counters.add(cls, "commands")
+    result = None
+    for attempt in range(policy.attempts):
+        if attempt > 0:
+            counters.add(cls, "retries")
+            await asyncio.sleep(policy.delay(attempt - 1))
+        result = await _hedged(command, policy, timeout, on_line, counters, cls)
+        if policy.accepts(result):
+            return result
+    counters.add(cls, "failures")
+    if result.returncode == 0:
+        # accepted exit code, rejected output
+        result.returncode = 1
+        result.stderr += "\nno output\n"
+    return result
+
+
+def run_sync(command, policies, counters, timeout=None, on_line=None):
+    """Classifies and runs a command from synchronous code."""
+    cls = classify(command)
+    return asyncio.run(run(command, policies[cls], counters, cls, timeout, on_line))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Takes snapshots of many releases at once.
+
+The snapshot-redis pods of every release are found with one kubectl call.
+Then each pod's /root/start.sh is run with kubectl exec, a bounded number
+at a time, with its output streamed line by line behind the release's name.
+A snapshot still running at its deadline is killed. The exit code and
+duration of every release are summarized at the end.
+"""
+
+import asyncio  # for running snapshots concurrently
+import json  # for kubectl output
+import shlex  # for quoting release names
+import sys  # to print to stderr
+import time  # for timing snapshots
+
+import cmdengine
+import fetch_config
+import releases as releases_runner
+
+APP = "nodegroup-snapshot-redis"
+SNAPSHOT_COMMAND = "/bin/bash /root/start.sh"
+
+
+async def find_pods(names, timeout):
+    """Maps each release in names to its running snapshot-redis pod."""
+    pod_selector = shlex.quote(f"app={APP},{fetch_config.selector(names)}")
+    ret = await cmdengine.run(f"kubectl get pods -l {pod_selector} -o json", timeout)
+    if ret.returncode != 0:
+        raise OSError(f"Couldn't list snapshot pods: {ret.stderr.strip()}")
+    return fetch_config.pods_by_release(json.loads(ret.stdout))
+
+
+async def take(name, pod, timeout, on_line):
+    """Runs a release's snapshot script and returns its releases.Result."""
+    start = time.monotonic()
+    if pod is None:
+        return releases_runner.Result(name, 1, 0, "no running snapshot-redis pod\n")
+    ret = await cmdengine.run(
+        f"kubectl exec {shlex.quote(pod)} -- {SNAPSHOT_COMMAND}",
+        timeout,
+        lambda stream, line: on_line(name, line),
+    )
+    output = f"timed out after {timeout:.0f}s\n" if ret.timed_out else ""
+    return releases_runner.Result(name, ret.returncode, time.monotonic() - start, output)
+
+
+async def take_all(names, jobs=4, timeout=1800, on_line=None):
+    """
+    Snapshots every release in names, at most jobs at a time, and returns
+    their results in order. on_line(release, line) gets the output.
+    """
+    pods = await find_pods(names, 60)
+    semaphore = asyncio.Semaphore(max(1, jobs))
+
+    async def bounded(name):
+        async with semaphore:
+            steprint(f"{name}: snapshot started")
+            result = await take(name, pods.get(name), timeout, on_line or (lambda *_: None))
+            status = "ok" if result.ok else f"FAILED ({result.returncode})"
+            steprint(f"{name}: {status} in {result.seconds:.1f}s")
+            return result
+
+    return await asyncio.gather(*(bounded(n) for n in names))
+
+
+def steprint(*args, **kwargs):
+    """Prints to stderr."""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Takes snapshots of releases in parallel."
+    )
+    parser.add_argument("releases", nargs="+", metavar="RELEASE")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=4, help="Snapshots to take at once. (default: 4)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=1800,
+        help="Seconds before a snapshot is killed. (default: 1800)",
+    )
+    args = parser.parse_args()
+
+    width = max(len(n) for n in args.releases)
+
+    def on_line(name, line):
+        print(f"{name:<{width}} | {line}", flush=True)
+
+    try:
+        results = asyncio.run(take_all(args.releases, args.jobs, args.timeout, on_line))
+    except (OSError, ValueError) as e:
+        exit(str(e))
+
+    if releases_runner.summarize("snapshot", results):
+        exit(1)
+
+
+# kick it off
+if __name__ == "__main__":
+    main()
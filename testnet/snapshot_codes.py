@@ -0,0 +1,132 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Finds the highest snapshot a new node can bootstrap from.
+
+Snapshots live in a bucket as NETWORK/CODE/FILE, where CODE is ndau-HEIGHT,
+the block height the snapshot was taken at, e.g. ndau-1234. That's the
+layout the chart's snapshot job uploads. A snapshot is usable when it has
+every file a node restores from. The bucket is listed through a source,
+either the public S3 listing the charts use or a local directory laid out
+the same way.
+"""
+
+import functools  # for listing each network once per run
+import os  # for local sources
+import re  # for snapshot codes
+import urllib.parse  # for S3 listing queries
+import urllib.request  # for listing S3 without the aws cli
+import xml.etree.ElementTree as ElementTree  # for S3 listings
+
+CODE_PATTERN = re.compile(r"ndau-(\d+)")
+
+# what the tendermint, noms and redis containers restore
+REQUIRED_FILES = ("ndau-genesis.tgz", "ndau-tm.tgz", "ndau-noms.tgz", "ndau-redis.tgz")
+
+DEFAULT_SOURCE = "s3://ndau-snapshots"
+
+_S3_NS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+
+def parse_code(code):
+    """Returns the height of a snapshot code, or None when it isn't one."""
+    match = CODE_PATTERN.fullmatch(code)
+    return int(match.group(1)) if match else None
+
+
+def latest(keys, required=REQUIRED_FILES):
+    """
+    Returns the code of the highest usable snapshot among keys, which are
+    CODE/FILE paths relative to the network. Returns None when there's none.
+    """
+    files = {}
+    for key in keys:
+        code, _, name = key.partition("/")
+        files.setdefault(code, set()).add(name)
+    usable = [
+        (parse_code(code), code)
+        for code, names in files.items()
+        if parse_code(code) is not None and names.issuperset(required)
+    ]
+    return max(usable)[1] if usable else None
+
+
+class DirSource:
+    """A local directory laid out like the snapshot bucket."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def keys(self, network):
+        """Returns the paths of every file under network's directory."""
+        root = os.path.join(self.path, network)
+        found = []
+        for dirpath, _, names in os.walk(root):
+            rel = os.path.relpath(dirpath, root)
+            found += [name if rel == "." else f"{rel}/{name}" for name in names]
+        return found
+
+
+class S3Source:
+    """A public S3 bucket, listed anonymously over HTTP like the charts do."""
+
+    def __init__(self, bucket, timeout=30):
+        self.bucket = bucket
+        self.timeout = timeout
+
+    def keys(self, network):
+        """Returns the keys under network/, following continuation tokens."""
+        prefix = f"{network}/"
+        found = []
+        token = None
+        while True:
+            query = {"list-type": "2", "prefix": prefix}
+            if token is not None:
+                query["continuation-token"] = token
+            url = f"https://{self.bucket}.s3.amazonaws.com/?{urllib.parse.urlencode(query)}"
+            with urllib.request.urlopen(url, timeout=self.timeout) as resp:
+                keys, token = parse_listing(resp.read())
+            found += [k[len(prefix) :] for k in keys if k.startswith(prefix)]
+            if token is None:
+                return found
+
+
+def parse_listing(body):
+    """
+    Parses an S3 ListObjectsV2 response. Returns its keys and the
+    continuation token of the next page, or None on the last page.
+    """
+    root = ElementTree.fromstring(body)
+    keys = [e.text for e in root.iter(f"{_S3_NS}Key")]
+    token = None
+    if root.findtext(f"{_S3_NS}IsTruncated") == "true":
+        token = root.findtext(f"{_S3_NS}NextContinuationToken")
+    return keys, token
+
+
+def source(spec):
+    """Returns the source for s3://BUCKET or a local directory."""
+    if spec.startswith("s3://"):
+        return S3Source(spec[len("s3://") :].strip("/"))
+    return DirSource(spec)
+
+
+@functools.lru_cache()
+def find_latest(spec, network):
+    """
+    Returns the highest usable snapshot code of network in the source spec,
+    or None. Each network is only listed once per run.
+    Raises OSError when the source can't be listed.
+    """
+    try:
+        keys = source(spec).keys(network)
+    except ElementTree.ParseError as e:
+        raise OSError(f"Couldn't parse the snapshot listing: {e}")
+    return latest(keys)
@@ -1,16 +1,11 @@
 #!/bin/bash
+# Takes a snapshot of each release given. It's a wrapper around snapshot.py.
 
-# get release name from arguemnts
-release=$1
-
-if [ -z "$release" ]; then
-	>&2 echo "Usage: ./take-snapshot.sh RELEASE_NAME"
+if [ -z "$1" ]; then
+	>&2 echo "Usage: ./take-snapshot.sh RELEASE_NAME..."
 	>&2 echo "Example: ./take-snapshot.sh devnet-0"
 	exit 1
 fi
 
-# get snapshot pod name from release
-snapshot_pod=$(kubectl get pod -l "release=$release,app=nodegroup-snapshot-redis" -o=jsonpath='{.items[0].metadata.name}')
-
-# execute snapshot script on snapshot pod
-kubectl exec "$snapshot_pod" -- /bin/bash /root/start.sh
+DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" >/dev/null 2>&1 && pwd )"
+exec python3 "$DIR/snapshot.py" "$@"
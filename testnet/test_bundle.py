@@ -0,0 +1,87 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import os
+import tarfile
+
+import pytest
+
+import bundle
+
+
+@pytest.fixture
+def network(tmp_path):
+    """Writes a small network directory."""
+    (tmp_path / "up.sh").write_text("#!/bin/bash\necho up\n")
+    (tmp_path / "up.sh").chmod(0o777)
+    (tmp_path / "network.json").write_text('{"nodes": []}\n' * 100)
+    (tmp_path / "network.json").chmod(0o600)
+    (tmp_path / "ndau-genesis.json").write_text('{"chain_id": "ndau"}\n')
+    (tmp_path / "ndau-genesis.json").chmod(0o644)
+    return tmp_path
+
+
+def bundles(network_dir):
+    return sorted(p for p in os.listdir(network_dir) if p.endswith(".tgz"))
+
+
+def test_reproducible(network, tmp_path_factory):
+    path, written = bundle.write(network, "test")
+    assert written
+    with open(path, "rb") as f:
+        first = f.read()
+
+    # the same files elsewhere, written at another time and in another order
+    other = tmp_path_factory.mktemp("other")
+    for name in reversed(sorted(os.listdir(network))):
+        if not name.endswith(".tgz"):
+            (other / name).write_bytes((network / name).read_bytes())
+            (other / name).chmod(os.stat(network / name).st_mode)
+    os.utime(other / "up.sh", (0, 12345))
+    other_path, _ = bundle.write(other, "test")
+    assert os.path.basename(other_path) == os.path.basename(path)
+    with open(other_path, "rb") as f:
+        assert f.read() == first
+
+
+def test_contents(network):
+    path, _ = bundle.write(network, "test")
+    with tarfile.open(network / "test.tgz") as tar:
+        members = tar.getmembers()
+        assert [m.name for m in members] == ["ndau-genesis.json", "network.json", "up.sh"]
+        assert [m.mode for m in members] == [0o644, 0o600, 0o777]
+        assert all(m.mtime == 0 and m.uname == "" for m in members)
+        assert tar.extractfile("up.sh").read() == b"#!/bin/bash\necho up\n"
+    assert os.readlink(network / "test.tgz") == os.path.basename(path)
+
+
+def test_unchanged_is_skipped(network):
+    path, _ = bundle.write(network, "test")
+    mtime = os.stat(path).st_mtime_ns
+    again, written = bundle.write(network, "test")
+    assert again == path
+    assert not written
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_changed_replaces_old_bundle(network):
+    old, _ = bundle.write(network, "test")
+    (network / "up.sh").write_text("#!/bin/bash\necho changed\n")
+    new, written = bundle.write(network, "test")
+    assert written and new != old
+    assert bundles(network) == sorted(["test.tgz", os.path.basename(new)])
+    assert os.readlink(network / "test.tgz") == os.path.basename(new)
+
+
+def test_level(network):
+    fast, _ = bundle.write(network, "fast", level=0)
+    small, _ = bundle.write(network, "small", level=9)
+    # same contents, so the same hash
+    assert os.path.basename(fast)[len("fast-") :] == os.path.basename(small)[len("small-") :]
+    assert os.path.getsize(small) < os.path.getsize(fast)
@@ -0,0 +1,79 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import threading
+import time
+
+import cmdengine
+
+
+def test_separate_streams():
+    lines = []
+    ret = cmdengine.run_sync(
+        "echo out; echo err >&2; exit 3", on_line=lambda *l: lines.append(l)
+    )
+    assert ret.returncode == 3
+    assert ret.stdout == "out\n"
+    assert ret.stderr == "err\n"
+    assert sorted(lines) == [("stderr", "err"), ("stdout", "out")]
+
+
+def test_streams_before_exit():
+    seen = []
+
+    def on_line(stream, line):
+        seen.append((line, time.monotonic()))
+
+    start = time.monotonic()
+    cmdengine.run_sync("echo first; sleep 0.5; echo second", on_line=on_line)
+    assert seen[0][0] == "first"
+    assert seen[0][1] - start < 0.4
+
+
+def test_deadline_kills_command_group():
+    start = time.monotonic()
+    ret = cmdengine.run_sync("echo started; sleep 10 | cat", timeout=0.3)
+    assert time.monotonic() - start < 3
+    assert ret.timed_out
+    assert ret.returncode == cmdengine.TIMEOUT_EXIT_CODE
+    assert ret.stdout == "started\n"
+
+
+def test_interrupt(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmdengine, "_interrupted", False)
+    rets = []
+    worker = threading.Thread(
+        target=lambda: rets.append(
+            cmdengine.run_sync(
+                "trap 'echo got INT; exit 5' INT; echo started; "
+                "while true; do sleep 0.05; done"
+            )
+        )
+    )
+    worker.start()
+    while not cmdengine._running:
+        time.sleep(0.01)
+    time.sleep(0.2)
+
+    start = time.monotonic()
+    cmdengine.interrupt(grace=3)
+    assert time.monotonic() - start < 2
+    worker.join(3)
+    assert rets[0].returncode == 5
+    assert rets[0].stdout == "started\ngot INT\n"
+
+    # nothing starts afterwards
+    ret = cmdengine.run_sync(f"touch {tmp_path / 'ran'}")
+    assert ret.returncode == cmdengine.INTERRUPTED_EXIT_CODE
+    assert not (tmp_path / "ran").exists()
+
+
+def test_long_lines():
+    ret = cmdengine.run_sync("head -c 200000 /dev/zero | tr '\\0' a")
+    assert len(ret.stdout) == 200000
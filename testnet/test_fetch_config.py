@@ -0,0 +1,125 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import json
+import os
+import subprocess
+import sys
+from base64 import b64decode
+
+import pytest
+
+import fetch_config
+import tmkeys
+
+TESTNET_DIR = os.path.dirname(os.path.realpath(__file__))
+FAKEBIN = os.path.join(TESTNET_DIR, "testdata", "fakebin")
+
+GENESIS = {"chain_id": "ndau", "validators": []}
+
+
+@pytest.fixture
+def cluster(tmp_path, monkeypatch):
+    """Fakes a cluster running releases test-0 to test-3, and one other app."""
+    monkeypatch.setenv("PATH", f"{FAKEBIN}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_ROOT", str(tmp_path))
+    pods, services, node_ids = [], [], {}
+    for i in range(4):
+        release, pod = f"test-{i}", f"test-{i}-tm-abc{i}"
+        labels = {"app": fetch_config.APP, "release": release}
+        pods.append({"metadata": {"name": pod, "labels": labels}, "status": {"phase": "Running"}})
+        services.append(
+            {
+                "metadata": {"name": f"{release}-svc", "labels": {"app": "nodegroup", "release": release}},
+                "spec": {
+                    "selector": labels,
+                    "ports": [
+                        {"name": "p2p", "nodePort": 30001 + 2 * i},
+                        {"name": "rpc", "nodePort": 30002 + 2 * i},
+                    ],
+                },
+            }
+        )
+        config = tmp_path / "pods" / pod / "tendermint" / "config"
+        os.makedirs(config)
+        nk = tmkeys.node_key(tmkeys.derive_seed("fetch", "node", i))
+        (config / "node_key.json").write_text(tmkeys.dumps_node_key(nk))
+        (config / "genesis.json").write_text(json.dumps(GENESIS, indent=2))
+        node_ids[release] = tmkeys.node_key_id(nk)
+    other = {"metadata": {"name": "redis", "labels": {"app": "redis", "release": "test-0"}}}
+    pods.append(other)
+
+    (tmp_path / "pods.json").write_text(json.dumps({"items": pods}))
+    (tmp_path / "services.json").write_text(json.dumps({"items": services}))
+    monkeypatch.setenv("FAKE_PODS", str(tmp_path / "pods.json"))
+    monkeypatch.setenv("FAKE_SERVICES", str(tmp_path / "services.json"))
+    return node_ids
+
+
+def calls(root):
+    with open(root / "calls.log") as f:
+        return f.read().splitlines()
+
+
+def run(*args):
+    return subprocess.run(
+        [sys.executable, os.path.join(TESTNET_DIR, "fetch_config.py"), *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+
+def test_one_lookup_for_many_releases(cluster, tmp_path):
+    ret = run("test-0", "test-2", "test-3")
+    assert ret.returncode == 0, ret.stderr
+
+    log = calls(tmp_path)
+    assert len([l for l in log if l.startswith("kubectl get")]) == 3
+    assert sorted(l.split()[2] for l in log if l.startswith("kubectl exec")) == [
+        "test-0-tm-abc0",
+        "test-2-tm-abc2",
+        "test-3-tm-abc3",
+    ]
+
+    lines = ret.stdout.splitlines()
+    assert lines[1] == "test-0"
+    peers = lines[2][len('persistentPeers="') : -1]
+    assert b64decode(peers).decode() == f"{cluster['test-0']}@10.0.0.1:30001"
+    assert json.loads(b64decode(lines[3][len("genesis=") :])) == GENESIS
+    assert lines[5] == "test-2"
+    assert lines[9] == "test-3"
+
+
+def test_manifest_format(cluster):
+    ret = run("test-0", "test-1", "--format", "manifest")
+    assert ret.returncode == 0, ret.stderr
+    m = json.loads(ret.stdout)
+    assert m["genesis"] == GENESIS
+    assert m["nodes"][1] == {
+        "name": "test-1",
+        "ports": {"p2p": 30003, "rpc": 30004},
+        "node_id": cluster["test-1"],
+    }
+    assert m["peers"].split(",")[1] == f"{cluster['test-1']}@10.0.0.1:30003"
+    assert "priv_validator_key" not in ret.stdout
+
+
+def test_missing_and_failing_releases(cluster, monkeypatch):
+    monkeypatch.setenv("FAKE_FAIL", "test-1-tm-abc1")
+    ret = run("test-0", "test-1", "test-9")
+    assert ret.returncode == 1
+    assert "test-1: kubectl exec" in ret.stderr
+    assert "test-9: no running tendermint pod" in ret.stderr
+    assert ret.stdout == ""
+
+
+def test_split_json():
+    assert fetch_config.split_json('{"a": 1}\n{"b": [2]}  \n') == [{"a": 1}, {"b": [2]}]
+    assert fetch_config.split_json("") == []
@@ -0,0 +1,714 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tarfile
+import time
+import types
+
+import pytest
+
+import gen_node_groups as g
+import keypool
+import nodeports
+import tmkeys
+
+FAKEBIN = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "testdata", "fakebin"
+)
+
+
+@pytest.fixture
+def fakes(tmp_path, monkeypatch):
+    """Puts the fake tools on PATH and installs a minimal global config."""
+    monkeypatch.setenv("PATH", f"{FAKEBIN}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_ROOT", str(tmp_path))
+    os.makedirs(tmp_path / "volumes")
+    monkeypatch.setattr(g, "verboseFlag", False, raising=False)
+    conf = types.SimpleNamespace(
+        ECR="",
+        NDAU_TM_TAG="test",
+        TMP_VOL="tmp-tm-init-test",
+        DOCKER_INIT=True,
+        JOBS=1,
+        RELEASE="test",
+        SEED=None,
+        KEY_POOL=None,
+    )
+    conf.DOCKER_RUN = g.docker_run(conf.TMP_VOL)
+    monkeypatch.setattr(g, "c", conf, raising=False)
+    monkeypatch.setattr(g, "ports", nodeports.Allocator(30000), raising=False)
+    return tmp_path
+
+
+def calls(root):
+    with open(root / "calls.log") as f:
+        return f.read().splitlines()
+
+
+def check_nodes(nodes):
+    for node in nodes:
+        assert node.ndau_node_id == tmkeys.node_key_id(node.ndau_nodeKey)
+    assert len({node.ndau_priv["address"] for node in nodes}) == len(nodes)
+
+
+def test_init_native(fakes):
+    g.c.DOCKER_INIT = False
+    nodes = [g.Node(f"test-{i}") for i in range(3)]
+    g.initNodegroup(nodes)
+    check_nodes(nodes)
+    assert not os.path.exists(fakes / "calls.log")
+
+
+def test_init_seeded(fakes):
+    g.c.DOCKER_INIT = False
+    g.c.SEED = "test"
+    nodes = [g.Node(f"test-{i}") for i in range(3)]
+    g.initNodegroup(nodes)
+    check_nodes(nodes)
+
+    # the same seed gives the same keys, wherever the node is initialized
+    again = [g.Node(f"test-{i}") for i in range(1, 3)]
+    g.initNodegroup(again, first=1)
+    for a, b in zip(nodes[1:], again):
+        assert a.ndau_priv == b.ndau_priv
+        assert a.ndau_nodeKey == b.ndau_nodeKey
+        assert a.ndau_node_id == b.ndau_node_id
+
+    g.c.SEED = "other"
+    other = [g.Node("test-0")]
+    g.initNodegroup(other)
+    assert other[0].ndau_priv != nodes[0].ndau_priv
+
+    # another network from the same seed gets its own keys
+    g.c.SEED = "test"
+    g.c.RELEASE = "another"
+    other = [g.Node("test-0")]
+    g.initNodegroup(other)
+    assert other[0].ndau_priv != nodes[0].ndau_priv
+    assert other[0].ndau_nodeKey != nodes[0].ndau_nodeKey
+
+
+def test_init_pooled(fakes):
+    g.c.DOCKER_INIT = False
+    g.c.KEY_POOL = str(fakes / "keys.pool")
+    keypool.generate(g.c.KEY_POOL, 4, jobs=1)
+    nodes = [g.Node(f"test-{i}") for i in range(3)]
+    g.initNodegroup(nodes)
+    check_nodes(nodes)
+    assert keypool.status(g.c.KEY_POOL) == (4, 3)
+
+    with pytest.raises(SystemExit):
+        g.initNodegroup([g.Node("test-3"), g.Node("test-4")])
+
+
+def test_init_docker(fakes):
+    g.makeTempVolume()
+    nodes = [g.Node(f"test-{i}") for i in range(2)]
+    g.initNodegroup(nodes)
+    check_nodes(nodes)
+    g.clean()
+    assert os.listdir(fakes / "volumes") == []
+
+
+def test_init_docker_parallel(fakes):
+    g.c.JOBS = 4
+    nodes = [g.Node(f"test-{i}") for i in range(8)]
+    g.initNodegroup(nodes)
+    check_nodes(nodes)
+
+    created = [line.split()[-1] for line in calls(fakes) if "volume create" in line]
+    assert created == [f"tmp-tm-init-test-{i}" for i in range(4)]
+
+    g.clean()
+    assert os.listdir(fakes / "volumes") == []
+    assert g.madeVolumes == []
+
+
+def test_init_docker_parallel_failure(fakes, monkeypatch):
+    monkeypatch.setenv("FAKE_FAIL", "init")
+    g.c.JOBS = 2
+    nodes = [g.Node(f"test-{i}") for i in range(8)]
+    with pytest.raises(SystemExit):
+        g.initNodegroup(nodes)
+
+    # the queued nodes never start, and the volumes are removed once the
+    # running ones have stopped using them
+    assert len([line for line in calls(fakes) if line.endswith(" init")]) <= 2
+    assert sorted(calls(fakes)[-2:]) == [
+        "docker volume rm tmp-tm-init-test-0",
+        "docker volume rm tmp-tm-init-test-1",
+    ]
+    assert os.listdir(fakes / "volumes") == []
+    assert g.madeVolumes == []
+
+
+def test_resolve_tags_dedupes_and_runs_concurrently(monkeypatch):
+    monkeypatch.setattr(g, "verboseFlag", False, raising=False)
+    seen = []
+
+    def slow_lookup(repo):
+        seen.append(repo)
+        time.sleep(0.2)
+        return f"{repo}-tag"
+
+    start = time.monotonic()
+    tags = g.resolve_tags(
+        {
+            "A_TAG": (slow_lookup, "redis"),
+            "B_TAG": (slow_lookup, "noms"),
+            "C_TAG": (slow_lookup, "redis"),
+        }
+    )
+    elapsed = time.monotonic() - start
+
+    assert tags == {"A_TAG": "redis-tag", "B_TAG": "noms-tag", "C_TAG": "redis-tag"}
+    assert sorted(seen) == ["noms", "redis"]
+    assert elapsed < 0.35
+
+
+def test_tag_cache(fakes):
+    path = str(fakes / "cache" / "tags.json")
+
+    cache = g.TagCache(path, ttl=60)
+    assert cache.get(g.highest_version_tag, "redis") == "v0.0.10"
+    assert cache.get(g.fetch_master_sha, "https://example.com/r") == "1234567"
+    cache.save()
+    assert len(calls(fakes)) == 2
+
+    # fresh entries are reused
+    cache = g.TagCache(path, ttl=60)
+    assert cache.get(g.highest_version_tag, "redis") == "v0.0.10"
+    assert len(calls(fakes)) == 2
+
+    # refresh and expired entries go back to the source
+    g.TagCache(path, ttl=60, refresh=True).get(g.highest_version_tag, "redis")
+    g.TagCache(path, ttl=0).get(g.highest_version_tag, "redis")
+    assert len(calls(fakes)) == 4
+
+
+def test_tag_cache_offline(fakes):
+    path = str(fakes / "tags.json")
+    cache = g.TagCache(path, ttl=0)
+    cache.get(g.highest_version_tag, "noms")
+    cache.save()
+    assert len(calls(fakes)) == 1
+
+    # stale entries are used and misses fail without shelling out
+    offline = g.TagCache(path, ttl=0, offline=True)
+    assert offline.get(g.highest_version_tag, "noms") == "v0.0.10"
+    with pytest.raises(OSError):
+        offline.get(g.highest_version_tag, "tendermint")
+    assert len(calls(fakes)) == 1
+
+
+def test_make_args_types():
+    args = g.make_args({"a": {"s": "x", "n": 3, "t": "true"}})
+    assert args == '--set-string a.s="x" --set a.n=3 --set-string a.t="true" '
+    with pytest.raises(ValueError):
+        g.make_args({"a": 1.5})
+
+
+def test_values_keep_make_args_types():
+    opts = {
+        "image": {"tag": "$TAG"},
+        "ndau": {"genesis": "Z2Vu", "enabled": "true", "port": 30001},
+    }
+    values, shell = g.split_values(opts)
+    assert shell == {"image": {"tag": "$TAG"}}
+    assert values == {"ndau": {"genesis": "Z2Vu", "enabled": "true", "port": 30001}}
+    # values and --set arguments describe the same leaves
+    assert g.flatten(values).items() | g.flatten(shell).items() == g.flatten(opts).items()
+
+
+def test_common_values():
+    common, rest = g.common_values(
+        [
+            {"ndau": {"genesis": "g", "port": 1, "name": "a"}},
+            {"ndau": {"genesis": "g", "port": 2}},
+        ]
+    )
+    assert common == {"ndau": {"genesis": "g"}}
+    assert rest == [{"ndau": {"port": 1, "name": "a"}}, {"ndau": {"port": 2}}]
+
+
+def test_genesis_configmap():
+    genesis = {"chain_id": "ndau", "validators": []}
+    cm = g.genesis_configmap("test-genesis", genesis)
+    assert cm["metadata"]["name"] == "test-genesis"
+    assert json.loads(cm["data"]["genesis.json"]) == genesis
+
+
+def generator(tmp_path):
+    """Returns the environment and command that run the generator against the fakes."""
+    fake_root = tmp_path / "fake"
+    os.makedirs(fake_root / "volumes", exist_ok=True)
+    env = dict(
+        os.environ,
+        PATH=f"{FAKEBIN}{os.pathsep}{os.environ['PATH']}",
+        XDG_CACHE_HOME=str(tmp_path / "cache"),
+        FAKE_ROOT=str(fake_root),
+        RELEASE="e2e",
+    )
+    script = os.path.join(os.path.dirname(FAKEBIN), "..", "gen_node_groups.py")
+    return env, [sys.executable, script]
+
+
+def test_end_to_end(tmp_path):
+    """Generates a network against the fakes, then runs its up.sh and down.sh."""
+    env, cmd = generator(tmp_path)
+    fake_root = tmp_path / "fake"
+    subprocess.run(
+        cmd + ["3", "30000", "-o", str(tmp_path), "--values-files"],
+        env=env,
+        check=True,
+        stderr=subprocess.PIPE,
+    )
+    network_dir = tmp_path / "network-e2e"
+    assert (network_dir / "e2e.tgz").exists()
+    # files holding private keys stay private in the tar ball
+    with tarfile.open(network_dir / "e2e.tgz") as tar:
+        modes = {m.name: m.mode for m in tar.getmembers()}
+    assert modes["network.json"] == 0o600
+    assert [modes[f"values-{i}.json"] for i in range(3)] == [0o600] * 3
+    assert os.listdir(fake_root / "volumes") == []
+
+    subprocess.run([network_dir / "preconf.sh"], env=env, check=True)
+    subprocess.run([network_dir / "down.sh"], env=env, check=True)
+    helm = [line for line in calls(fake_root) if line.startswith("helm")]
+    assert sorted(line.split()[1:4] for line in helm) == sorted(
+        [["install", "--name", f"e2e-{i}"] for i in range(3)]
+        + [["del", f"e2e-{i}", "--purge"] for i in range(3)]
+    )
+
+
+def test_generated_up_and_down_scripts(tmp_path):
+    """up.sh and down.sh pass their options to releases.py the way it parses them."""
+    env, cmd = generator(tmp_path)
+    fake_root = tmp_path / "fake"
+    subprocess.run(cmd + ["2", "-o", str(tmp_path)], env=env, check=True, stderr=subprocess.PIPE)
+    network_dir = tmp_path / "network-e2e"
+    env = dict(
+        env,
+        JOBS="2",
+        WAIT_READY="1",
+        HELM_CHART_PATH=str(tmp_path / "chart"),
+        NETWORK_NAME="e2e",
+    )
+    open(fake_root / "calls.log", "w").close()
+    for script in ["up.sh", "down.sh"]:
+        ret = subprocess.run(
+            [network_dir / script],
+            env=env,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        assert ret.returncode == 0, ret.stderr
+        assert "All 2 releases succeeded." in ret.stderr
+    log = calls(fake_root)
+    assert len([l for l in log if l.startswith("helm install")]) == 2
+    assert len([l for l in log if l.startswith("kubectl wait")]) == 4
+    assert len([l for l in log if l.startswith("helm del")]) == 2
+
+
+def test_extend(tmp_path):
+    """Extends a 3 node network by 2 without touching what didn't change."""
+    env, cmd = generator(tmp_path)
+    subprocess.run(
+        cmd + ["3", "-o", str(tmp_path), "--topology", "seeds:1", "--values-files"],
+        env=env,
+        check=True,
+        stderr=subprocess.PIPE,
+    )
+    network_dir = tmp_path / "network-e2e"
+    with open(network_dir / "network.json") as f:
+        before = json.load(f)
+    mtimes = {
+        p: os.stat(network_dir / p).st_mtime_ns
+        for p in os.listdir(network_dir)
+        if not p.endswith(".tgz")
+    }
+    time.sleep(0.01)
+
+    # a different release name and topology are ignored in favour of the manifest
+    env["RELEASE"] = "other"
+    ret = subprocess.run(
+        cmd + ["2", "--extend", str(network_dir), "--topology", "full"],
+        env=env,
+        check=True,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    with open(network_dir / "network.json") as f:
+        after = json.load(f)
+
+    assert after["nodes"][:3] == before["nodes"]
+    assert [n["name"] for n in after["nodes"]] == [f"e2e-{i}" for i in range(5)]
+    assert after["nodes"][3]["ports"] == {"p2p": 30007, "rpc": 30008}
+    assert after["genesis"] == before["genesis"]
+    assert after["topology"] == "seeds:1"
+    assert (network_dir / "node-4.sh").exists()
+    assert (network_dir / "values-4.json").exists()
+
+    # with one seed, only the seed's own peer list grows
+    changed = {p for p, m in mtimes.items() if os.stat(network_dir / p).st_mtime_ns != m}
+    assert changed == {"network.json", "releases.json", "values-0.json"}
+    assert len([p for p in os.listdir(network_dir) if p.endswith(".tgz")]) == 2
+    assert "Persistent peers changed for: e2e-0." in ret.stderr
+    assert "--only e2e-3,e2e-4" in ret.stderr
+
+    subprocess.run(
+        [sys.executable, network_dir / "releases.py", "up", network_dir, "--only", "e2e-3,e2e-4"],
+        env=dict(env, HELM_CHART_PATH="chart"),
+        check=True,
+    )
+    helm = [line for line in calls(tmp_path / "fake") if line.startswith("helm")]
+    assert sorted(line.split()[3] for line in helm) == ["e2e-3", "e2e-4"]
+
+
+def test_plan_ports():
+    networks = [
+        {"release": "a", "quantity": 2},
+        {"release": "b", "quantity": 3},
+        {"release": "c", "quantity": 1, "start_port": 31000},
+        {"release": "d", "quantity": 1},
+    ]
+    g.plan_ports(networks, 30000)
+    assert [n["start_port"] for n in networks] == [30000, 30004, 31000, 31002]
+
+    with pytest.raises(ValueError):
+        g.plan_ports(
+            [
+                {"release": "a", "quantity": 2, "start_port": 30000},
+                {"release": "b", "quantity": 2, "start_port": 30003},
+            ],
+            30000,
+        )
+
+
+def test_load_batch(tmp_path):
+    path = tmp_path / "batch.json"
+    path.write_text(
+        json.dumps(
+            {
+                "networks": [
+                    {"release": "a", "quantity": 2},
+                    {"release": "b", "quantity": 1, "genesis_time": "2020-01-02T03:04:05.000Z"},
+                ]
+            }
+        )
+    )
+    networks = g.load_batch(path)
+    assert networks[0] == {"release": "a", "quantity": 2}
+    assert networks[1]["genesis_time"].isoformat() == "2020-01-02T03:04:05+00:00"
+
+    for bad in [
+        {},
+        {"networks": [{"release": "a"}]},
+        {"networks": [{"release": "a", "quantity": 1, "port": 1}]},
+        {"networks": [{"release": "a", "quantity": 1}, {"release": "a", "quantity": 2}]},
+    ]:
+        path.write_text(json.dumps(bad))
+        with pytest.raises(ValueError):
+            g.load_batch(path)
+
+
+def test_batch(tmp_path):
+    """Generates two networks in one run, probing the cluster once."""
+    env, cmd = generator(tmp_path)
+    del env["RELEASE"]
+    spec = tmp_path / "batch.json"
+    spec.write_text(
+        json.dumps(
+            {
+                "networks": [
+                    {"release": "one", "quantity": 2},
+                    {"release": "two", "quantity": 3, "topology": "chords"},
+                ]
+            }
+        )
+    )
+    subprocess.run(
+        cmd + ["--batch", str(spec), "-o", str(tmp_path)],
+        env=env,
+        check=True,
+        stderr=subprocess.PIPE,
+    )
+
+    ports = []
+    for release, quantity in [("one", 2), ("two", 3)]:
+        network_dir = tmp_path / f"network-{release}"
+        assert (network_dir / f"{release}.tgz").exists()
+        with open(network_dir / "network.json") as f:
+            m = json.load(f)
+        assert [n["name"] for n in m["nodes"]] == [f"{release}-{i}" for i in range(quantity)]
+        ports += [p for n in m["nodes"] for p in n["ports"].values()]
+    assert ports == list(range(30001, 30011))
+
+    log = calls(tmp_path / "fake")
+    assert len([l for l in log if l.startswith("kubectl config")]) == 1
+    assert len([l for l in log if "volume create" in l]) == 1
+    assert len([l for l in log if l.endswith(" init")]) == 1
+
+
+def test_batch_seeded(tmp_path):
+    """Gives each network of a seeded batch its own keys."""
+    env, cmd = generator(tmp_path)
+    del env["RELEASE"]
+    spec = tmp_path / "batch.json"
+    spec.write_text(
+        json.dumps(
+            {
+                "networks": [
+                    {"release": "one", "quantity": 2},
+                    {"release": "two", "quantity": 2},
+                ]
+            }
+        )
+    )
+    subprocess.run(
+        cmd + ["--batch", str(spec), "-o", str(tmp_path), "--seed", "s"],
+        env=env,
+        check=True,
+        stderr=subprocess.PIPE,
+    )
+
+    addresses, node_ids = set(), set()
+    for release in ["one", "two"]:
+        with open(tmp_path / f"network-{release}" / "network.json") as f:
+            for n in json.load(f)["nodes"]:
+                addresses.add(n["priv_validator_key"]["address"])
+                node_ids.add(n["node_id"])
+    assert len(addresses) == len(node_ids) == 4
+
+
+def test_ports_in_use_are_skipped(tmp_path):
+    """Skips the cluster's NodePorts and those of networks generated before."""
+    env, cmd = generator(tmp_path)
+    env["FAKE_SERVICES"] = os.path.join(os.path.dirname(FAKEBIN), "services.json")
+
+    def node_ports(network_dir):
+        with open(tmp_path / network_dir / "network.json") as f:
+            return [p for n in json.load(f)["nodes"] for p in n["ports"].values()]
+
+    for _ in range(2):
+        subprocess.run(
+            cmd + ["2", "-o", str(tmp_path), "--force"],
+            env=env,
+            check=True,
+            stderr=subprocess.PIPE,
+        )
+    assert node_ports("network-e2e") == [30003, 30004, 30006, 30007]
+    assert node_ports("network-e2e-0") == [30008, 30009, 30010, 30011]
+
+
+def test_port_range_exhausted(tmp_path):
+    """Aborts before any docker work when the NodePort range runs out."""
+    env, cmd = generator(tmp_path)
+    ret = subprocess.run(
+        cmd + ["3", "32762", "-o", str(tmp_path)],
+        env=env,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert ret.returncode != 0
+    assert "Not enough free NodePorts for 3 nodes" in ret.stderr
+    assert not [l for l in calls(tmp_path / "fake") if l.startswith("docker")]
+    assert not (tmp_path / "network-e2e").exists()
+
+    ret = subprocess.run(
+        cmd + ["1", "32768", "-o", str(tmp_path)],
+        env=env,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert ret.returncode != 0
+    assert "outside the kubernetes NodePort range" in ret.stderr
+
+
+def test_ctrl_c_stops_init_before_cleaning(tmp_path):
+    env, cmd = generator(tmp_path)
+    env["FAKE_LATENCY"] = "0.3"
+    fake_root = tmp_path / "fake"
+    proc = subprocess.Popen(
+        cmd + ["2", "-o", str(tmp_path)],
+        env=env,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    def initializing():
+        if not (fake_root / "calls.log").exists():
+            return False
+        return any(l.endswith(" init") for l in calls(fake_root))
+
+    deadline = time.monotonic() + 20
+    while not initializing():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    proc.send_signal(signal.SIGINT)
+    _, stderr = proc.communicate(timeout=20)
+    assert proc.returncode != 0
+    assert "Installation cancelled." in stderr
+
+    # nothing ran once the volumes were being removed, and they all were
+    log = calls(fake_root)
+    first_rm = min(i for i, l in enumerate(log) if "volume rm" in l)
+    assert all("volume rm" in l for l in log[first_rm:])
+    assert os.listdir(fake_root / "volumes") == []
+
+
+def test_unchanged_inputs_reuse_the_network(tmp_path):
+    env, cmd = generator(tmp_path)
+    args = ["2", "-o", str(tmp_path), "--seed", "s", "-g", "2020-01-02T03:04:05.000Z"]
+
+    def run(*extra):
+        open(tmp_path / "fake" / "calls.log", "w").close()
+        ret = subprocess.run(
+            cmd + args + list(extra),
+            env=env,
+            check=True,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        return ret.stderr, calls(tmp_path / "fake")
+
+    run()
+    stderr, log = run()
+    assert f"reusing network: {tmp_path / 'network-e2e'}" in stderr
+    assert sorted(os.listdir(tmp_path)) == ["cache", "fake", "network-e2e"]
+    # only the cheap context lookup; no cluster probes or docker
+    assert log == ["kubectl config current-context"]
+
+    # a different input generates a new network
+    run("--topology", "chords")
+    assert (tmp_path / "network-e2e-0").exists()
+
+    # and --force always does
+    run("--force")
+    assert (tmp_path / "network-e2e-1").exists()
+
+
+def test_master_ip_lookup_is_retried(tmp_path):
+    """Retries kubectl get nodes even though jq, at the end of its pipeline, succeeds."""
+    env, cmd = generator(tmp_path)
+    env.update(ELB_SUBDOMAIN="test", FAKE_CONTEXT="cluster", FAKE_NODES_FAILURES="1")
+    subprocess.run(
+        cmd + ["1", "-o", str(tmp_path)], env=env, check=True, stderr=subprocess.PIPE
+    )
+    assert len([l for l in calls(tmp_path / "fake") if l.startswith("kubectl get nodes")]) == 2
+    with open(tmp_path / "network-e2e" / "network.json") as f:
+        assert json.load(f)["master_ip"] == "10.0.0.1"
+
+
+def test_other_context_rebuilds_the_network(tmp_path):
+    """Doesn't reuse a network generated for another cluster."""
+    env, cmd = generator(tmp_path)
+    env["ELB_SUBDOMAIN"] = "test"
+    args = ["2", "-o", str(tmp_path), "--seed", "s", "-g", "2020-01-02T03:04:05.000Z"]
+    for context in ["cluster-a", "cluster-a", "cluster-b"]:
+        env["FAKE_CONTEXT"] = context
+        subprocess.run(cmd + args, env=env, check=True, stderr=subprocess.PIPE)
+    networks = sorted(d for d in os.listdir(tmp_path) if d.startswith("network-"))
+    assert networks == ["network-e2e", "network-e2e-0"]
+    with open(tmp_path / "network-e2e-0" / "network.json") as f:
+        assert json.load(f)["master_ip"] == "10.0.0.1"
+
+
+def test_fingerprint_sources(tmp_path):
+    chart = tmp_path / "helm" / "nodegroup"
+    here = os.path.dirname(os.path.realpath(__file__))
+    shutil.copytree(os.path.join(here, "..", "helm", "nodegroup"), chart)
+    paths = g.sourceFiles(str(chart))
+    names = [os.path.basename(p) for p in paths]
+    for name in [
+        "gen_node_groups.py",
+        "tmkeys.py",
+        "topology.py",
+        "releases.py",
+        "bundle.py",
+        "nodeports.py",
+        "values.yaml",
+        "ndaunode-deployment.yaml",
+    ]:
+        assert name in names
+
+    before = g.hashFiles(paths, str(tmp_path))
+    assert g.hashFiles(g.sourceFiles(str(chart)), str(tmp_path)) == before
+    with open(chart / "values.yaml", "a") as f:
+        f.write("\n# changed\n")
+    assert g.hashFiles(paths, str(tmp_path)) != before
+
+
+def test_snapshot_latest(tmp_path):
+    env, cmd = generator(tmp_path)
+    bucket = tmp_path / "bucket"
+    for code in ["ndau-900", "ndau-1000"]:
+        for name in ["ndau-genesis.tgz", "ndau-tm.tgz", "ndau-noms.tgz", "ndau-redis.tgz"]:
+            (bucket / "e2e" / code).mkdir(parents=True, exist_ok=True)
+            (bucket / "e2e" / code / name).write_text("")
+    # higher, but not finished uploading
+    (bucket / "e2e" / "ndau-1100").mkdir()
+    (bucket / "e2e" / "ndau-1100" / "ndau-tm.tgz").write_text("")
+
+    ret = subprocess.run(
+        cmd
+        + ["1", "-o", str(tmp_path), "--values-files"]
+        + ["--snapshot", "latest", "--snapshot-source", str(bucket)],
+        env=env,
+        check=True,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert "Latest snapshot of e2e: ndau-1000" in ret.stderr
+    network_dir = tmp_path / "network-e2e"
+    values = (network_dir / "values-common.json").read_text()
+    values += (network_dir / "values-0.json").read_text()
+    assert '"snapshotCode": "ndau-1000"' in values
+
+
+def test_snapshot_latest_without_snapshots(tmp_path):
+    env, cmd = generator(tmp_path)
+    bucket = tmp_path / "bucket"
+    (bucket / "e2e" / "ndau-1100").mkdir(parents=True)
+    (bucket / "e2e" / "ndau-1100" / "ndau-tm.tgz").write_text("")
+
+    ret = subprocess.run(
+        cmd
+        + ["1", "-o", str(tmp_path), "--values-files"]
+        + ["--snapshot", "latest", "--snapshot-source", str(bucket)],
+        env=env,
+        check=True,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert "No usable snapshot of e2e" in ret.stderr
+    network_dir = tmp_path / "network-e2e"
+    values = (network_dir / "values-common.json").read_text()
+    values += (network_dir / "values-0.json").read_text()
+    assert '"snapshotCode": "genesis"' in values
+
+
+def test_genesis_size_bench():
+    """The genesis size benchmark still runs against the generator."""
+    script = os.path.join(os.path.dirname(FAKEBIN), "..", "bench", "genesis_size.py")
+    ret = subprocess.run(
+        [sys.executable, script], check=True, stdout=subprocess.PIPE, universal_newlines=True
+    )
+    results = json.loads(ret.stdout)
+    assert [(r["quantity"], r["mode"]) for r in results[:2]] == [
+        (4, "embedded"),
+        (4, "shared"),
+    ]
+    assert all(r["bytes"] > 0 for r in results)
@@ -0,0 +1,81 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import keypool
+import tmkeys
+
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / "keys.pool")
+    keypool.generate(path, 12, jobs=2)
+    return path
+
+
+def test_generate(pool):
+    assert keypool.status(pool) == (12, 0)
+    assert os.path.getsize(pool) == keypool.HEADER.size + 12 * keypool.RECORD.size
+    assert os.stat(pool).st_mode & 0o777 == 0o600
+    with pytest.raises(FileExistsError):
+        keypool.generate(pool, 1)
+
+
+def test_keys_match_their_seeds(pool):
+    keys = keypool.draw(pool, 2)
+    for k in keys:
+        assert k.priv_validator_key() == tmkeys.priv_validator_key(k.validator_seed)
+        assert k.node_key() == tmkeys.node_key(k.node_seed)
+    assert len({k.validator_pub for k in keys} | {k.node_pub for k in keys}) == 4
+
+
+def test_draw_consumes(pool):
+    first = keypool.draw(pool, 5)
+    second = keypool.draw(pool, 5)
+    assert keypool.status(pool) == (12, 10)
+    assert not {k.validator_seed for k in first} & {k.validator_seed for k in second}
+
+    with pytest.raises(ValueError):
+        keypool.draw(pool, 3)
+    # a failed draw consumes nothing
+    assert len(keypool.draw(pool, 2)) == 2
+
+
+def test_concurrent_draws_are_disjoint(pool):
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        draws = list(executor.map(lambda _: keypool.draw(pool, 2), range(6)))
+    seeds = [k.validator_seed for d in draws for k in d]
+    assert len(set(seeds)) == 12
+
+
+def test_not_a_pool(tmp_path):
+    path = tmp_path / "bogus"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        keypool.draw(str(path), 1)
+
+
+def test_truncated(pool, tmp_path):
+    short = tmp_path / "short"
+    short.write_bytes(b"NDAUKEY1")
+    with open(pool, "rb") as f:
+        data = f.read()
+    for size in [len(data) - 1, keypool.HEADER.size + keypool.RECORD.size]:
+        with open(pool, "wb") as f:
+            f.write(data[:size])
+        with pytest.raises(ValueError):
+            keypool.draw(pool, 1)
+        with pytest.raises(ValueError):
+            keypool.status(pool)
+    with pytest.raises(ValueError):
+        keypool.draw(str(short), 1)
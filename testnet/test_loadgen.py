@@ -0,0 +1,97 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import asyncio
+import os
+import subprocess
+import sys
+
+import loadgen
+
+TESTNET_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+def endpoints(fakes):
+    return [(f.name, "127.0.0.1", f.port) for f in fakes]
+
+
+def test_rate_and_spread(fake_network):
+    _, fakes = fake_network(2)
+    stats = asyncio.run(loadgen.run(endpoints(fakes), 200, 0.5, concurrency=4, size=16))
+    assert (stats.sent, stats.accepted, stats.errors) == (100, 100, 0)
+    assert 0.45 <= stats.seconds < 2
+    for f in fakes:
+        assert f.requests == ["/broadcast_tx_sync"] * 50
+        assert len(set(f.mempool)) == 50
+        assert all(len(tx) == 2 + 2 * 16 for tx in f.mempool)
+        assert f.connections <= 4
+
+
+def test_concurrency_bounds_sends(fake_network):
+    _, (fake,) = fake_network(1)
+    fake.delay = 0.1
+    # 10 sends at 1000/s would take 10ms, but only 2 can be in flight
+    stats = asyncio.run(loadgen.run(endpoints([fake]), 1000, 0.01, concurrency=2))
+    assert stats.accepted == 10
+    assert stats.seconds >= 0.45
+    assert fake.connections == 2
+    assert stats.percentile(50) >= 0.1
+    # the 8 that waited for a slot are late and count the wait as latency
+    assert stats.late >= 8
+    assert stats.percentile(100) >= 0.45
+
+
+def test_rejections(fake_network):
+    _, fakes = fake_network(2)
+    fakes[0].mempool_limit = 3
+    fakes[1].check_tx_code = 1
+    stats = asyncio.run(loadgen.run(endpoints(fakes), 500, 0.04, mode="commit"))
+    assert stats.sent == 20
+    assert stats.accepted == 3
+    assert stats.mempool_rejected == 7
+    assert stats.check_tx_rejected == 10
+    assert stats.deliver_tx_failed == 0
+    assert len(stats.latencies) == 3
+
+
+def test_deliver_tx_failures(fake_network):
+    _, (fake,) = fake_network(1)
+    fake.deliver_tx_code = 2
+    stats = asyncio.run(loadgen.run(endpoints([fake]), 500, 0.02, mode="commit"))
+    assert stats.sent == 10
+    assert stats.deliver_tx_failed == 10
+    assert stats.accepted == stats.check_tx_rejected == 0
+    # only commit mode sees DeliverTx
+    assert loadgen.outcome("sync", {"code": 0, "deliver_tx": {"code": 2}}) == "accepted"
+
+
+def test_percentile():
+    stats = loadgen.Stats()
+    assert stats.percentile(50) is None
+    stats.latencies = [0.1 * i for i in range(10, 0, -1)]
+    assert stats.percentile(50) == 0.5
+    assert stats.percentile(90) == 0.9
+    assert stats.percentile(100) == 1.0
+
+
+def test_cli_replays_txs(fake_network, tmp_path):
+    network_dir, fakes = fake_network(2)
+    txs = tmp_path / "txs"
+    txs.write_text("0xaa\nbb\n\n")
+    ret = subprocess.run(
+        [sys.executable, os.path.join(TESTNET_DIR, "loadgen.py"), str(network_dir)]
+        + ["--rate", "40", "--duration", "0.1", "--txs", str(txs)],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        timeout=10,
+    )
+    assert ret.returncode == 0, ret.stderr
+    assert "load summary (commit)" in ret.stderr
+    assert [f.mempool for f in fakes] == [["0xaa", "0xaa"], ["0xbb", "0xbb"]]
+    assert fakes[0].requests == ["/broadcast_tx_commit"] * 2
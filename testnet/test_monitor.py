@@ -0,0 +1,121 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import asyncio
+import os
+
+import manifest
+import monitor
+
+
+def metrics(text):
+    """Returns the samples of a metrics page as a dict of line prefix to value."""
+    samples = {}
+    for line in text.splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def label(node):
+    return f'{{release="fake",node="{node}"}}'
+
+
+def test_polls_and_renders(fake_network):
+    network_dir, fakes = fake_network(3)
+    for f, height in zip(fakes, [10, 7, 10]):
+        f.height = height
+        f.catching_up = False
+        f.peers = 2
+    fakes[1].mempool = ["0x01", "0x02"]
+    fakes[2].down = True
+
+    async def polls():
+        m = monitor.Monitor([str(network_dir)])
+        try:
+            for _ in range(3):
+                await m.poll()
+            return m.render()
+        finally:
+            await asyncio.gather(*(n.pool.close() for n in m.nodes()))
+
+    text = asyncio.run(polls())
+    samples = metrics(text)
+    assert "# TYPE ndau_node_rpc_errors_total counter" in text
+    assert samples["ndau_node_up" + label("fake-0")] == 1
+    assert samples["ndau_node_height" + label("fake-1")] == 7
+    # the tip is the highest node that answered
+    assert samples["ndau_node_lag_blocks" + label("fake-0")] == 0
+    assert samples["ndau_node_lag_blocks" + label("fake-1")] == 3
+    assert samples["ndau_node_peers" + label("fake-0")] == 2
+    assert samples["ndau_node_mempool_txs" + label("fake-1")] == 2
+    assert samples["ndau_node_catching_up" + label("fake-1")] == 0
+    assert 0 < samples["ndau_node_rpc_latency_seconds" + label("fake-0")] < 1
+    # a node that's down only has up and errors
+    assert samples["ndau_node_up" + label("fake-2")] == 0
+    assert samples["ndau_node_rpc_errors_total" + label("fake-2")] == 3
+    assert "ndau_node_height" + label("fake-2") not in samples
+    # connections are reused between polls
+    assert fakes[0].connections <= monitor.POOL_SIZE
+    assert len(fakes[0].requests) == 9
+
+
+def test_reloads_changed_manifests(fake_network):
+    network_dir, fakes = fake_network(2)
+    m = manifest.load(network_dir)
+
+    async def polls():
+        mon = monitor.Monitor([str(network_dir)])
+        try:
+            await mon.poll()
+            first = mon.nodes()
+            m["nodes"] = m["nodes"][:1]
+            (network_dir / manifest.FILE).write_text(manifest.dumps(m))
+            os.utime(network_dir / manifest.FILE, ns=(0, 0))
+            await mon.poll()
+            return first, mon.nodes()
+        finally:
+            await asyncio.gather(*(n.pool.close() for n in mon.nodes()))
+
+    first, second = asyncio.run(polls())
+    assert [n.name for n in second] == ["fake-0"]
+    # the remaining node kept its state and connections
+    assert second[0] is first[0]
+
+
+def test_serves_metrics(fake_network):
+    network_dir, (fake,) = fake_network(1)
+    fake.height = 4
+
+    async def scrape():
+        m = monitor.Monitor([str(network_dir)])
+        server = await asyncio.start_server(m.serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        poller = asyncio.create_task(m.run(60))
+        pages = []
+        try:
+            await asyncio.sleep(0.3)
+            for path in ["/metrics", "/"]:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+                pages.append((await reader.read()).decode())
+                writer.close()
+        finally:
+            poller.cancel()
+            server.close()
+            await asyncio.gather(poller, return_exceptions=True)
+        return pages
+
+    page, missing = asyncio.run(scrape())
+    head, body = page.split("\r\n\r\n", 1)
+    assert head.startswith("HTTP/1.1 200 OK")
+    assert "text/plain; version=0.0.4" in head
+    assert metrics(body)["ndau_node_height" + label("fake-0")] == 4
+    assert missing.startswith("HTTP/1.1 404")
@@ -0,0 +1,77 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import json
+import os
+
+import pytest
+
+import manifest
+import nodeports
+
+SERVICES = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "testdata", "services.json"
+)
+
+
+def load_services():
+    with open(SERVICES) as f:
+        return json.load(f)
+
+
+def test_service_ports():
+    assert nodeports.service_ports(load_services()) == [30001, 30002, 30005]
+    assert nodeports.service_ports({"items": []}) == []
+
+
+def test_alloc_skips_used_ports():
+    ports = nodeports.Allocator.from_services(load_services(), start=30000)
+    assert [ports.alloc_pair() for _ in range(3)] == [
+        (30003, 30004),
+        (30006, 30007),
+        (30008, 30009),
+    ]
+    assert not ports.is_free(30003)
+    assert ports.is_free(30010)
+
+
+def test_seek_never_reuses_ports():
+    ports = nodeports.Allocator(30000)
+    assert ports.alloc_pair() == (30001, 30002)
+    ports.seek(30000)
+    assert ports.alloc_pair() == (30003, 30004)
+
+
+def test_exhausted():
+    ports = nodeports.Allocator(nodeports.RANGE_END - 2)
+    assert ports.alloc_pair() == (nodeports.RANGE_END - 1, nodeports.RANGE_END)
+    with pytest.raises(ValueError, match="30000-32767"):
+        ports.alloc()
+
+
+def test_only_node_ports():
+    ports = nodeports.Allocator(80, [30000])
+    assert ports.alloc() == 30001
+    # a copy allocates on its own
+    other = ports.copy()
+    assert other.alloc() == 30002
+    assert ports.is_free(30002)
+    assert ports.alloc() == 30002
+
+
+def test_manifest_ports(tmp_path):
+    for name, port in [("network-a", 30001), ("network-b", 30011)]:
+        os.mkdir(tmp_path / name)
+        m = {"nodes": [{"name": name, "ports": {"p2p": port, "rpc": port + 1}}]}
+        (tmp_path / name / manifest.FILE).write_text(manifest.dumps(m))
+    # not a manifest this version understands
+    os.mkdir(tmp_path / "network-c")
+    (tmp_path / "network-c" / manifest.FILE).write_text("{}")
+
+    assert sorted(nodeports.manifest_ports(tmp_path)) == [30001, 30002, 30011, 30012]
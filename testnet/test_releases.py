@@ -0,0 +1,82 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import json
+import os
+import time
+
+import pytest
+
+import releases
+
+FAKEBIN = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "testdata", "fakebin"
+)
+
+
+@pytest.fixture
+def network(tmp_path, monkeypatch):
+    """Writes a network directory of 6 releases with fake tools on PATH."""
+    monkeypatch.setenv("PATH", f"{FAKEBIN}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_ROOT", str(tmp_path))
+    monkeypatch.setenv("FAKE_LATENCY", "0.2")
+    monkeypatch.setattr(releases, "WAIT_POLL", 0.05)
+    rels = []
+    for i in range(6):
+        script = tmp_path / f"node-{i}.sh"
+        script.write_text(f"#!/bin/bash\nhelm install --name test-{i} chart\n")
+        script.chmod(0o755)
+        rels.append({"name": f"test-{i}", "script": script.name})
+    (tmp_path / releases.RELEASES_FILE).write_text(
+        json.dumps({"tls": False, "releases": rels})
+    )
+    return tmp_path
+
+
+def calls(root, prefix):
+    with open(root / "calls.log") as f:
+        return [l for l in f.read().splitlines() if l.startswith(prefix)]
+
+
+def test_up_is_parallel(network):
+    rels = releases.load(network)["releases"]
+    start = time.monotonic()
+    results = releases.run_all(
+        lambda r: releases.install(network, r, wait=True, timeout=5), rels, 6
+    )
+    elapsed = time.monotonic() - start
+
+    assert [r.name for r in results] == [f"test-{i}" for i in range(6)]
+    assert all(r.ok for r in results)
+    assert len(calls(network, "helm install")) == 6
+    # each release's deployments only show up after the first wait
+    waits = calls(network, "kubectl wait")
+    assert len(waits) == 12
+    assert all("--for=condition=Available deployment" in w for w in waits)
+    # 6 releases at 0.6s each (install + 2 waits), all at once
+    assert elapsed < 1.5
+
+
+def test_down_reports_failures(network, monkeypatch):
+    monkeypatch.setenv("FAKE_FAIL", "test-2,test-4")
+    rels = releases.load(network)["releases"]
+    results = releases.run_all(lambda r: releases.delete(r), rels, 2)
+
+    assert releases.summarize("down", results) == ["test-2", "test-4"]
+    assert [r.returncode != 0 for r in results] == [
+        False, False, True, False, True, False
+    ]
+
+
+def test_select():
+    rels = [{"name": f"test-{i}", "script": f"node-{i}.sh"} for i in range(3)]
+    assert releases.select(rels, None) == rels
+    assert releases.select(rels, "test-2,test-0") == [rels[0], rels[2]]
+    with pytest.raises(ValueError):
+        releases.select(rels, "test-0,test-9")
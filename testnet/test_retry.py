@@ -0,0 +1,93 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import asyncio
+import time
+
+import pytest
+
+import retry
+
+
+def flaky(tmp_path, fail_times, slow_first=0):
+    """Returns a command that fails fail_times times, then prints ok."""
+    count = tmp_path / "count"
+    return (
+        f"n=$(cat {count} 2>/dev/null || echo 0); echo $((n+1)) > {count}; "
+        f"if [ $n -eq 0 ]; then sleep {slow_first}; fi; "
+        f"[ $n -ge {fail_times} ] && echo ok"
+    )
+
+
+def run(command, policy):
+    counters = retry.Counters()
+    result = asyncio.run(retry.run(command, policy, counters, "registry"))
+    return result, counters.snapshot()["registry"]
+
+
+def test_classify():
+    assert retry.classify("aws ecr list-images --repository-name x | jq .") == "registry"
+    assert retry.classify("        git ls-remote https://x |  grep m") == "registry"
+    assert retry.classify("kubectl get nodes -o json | jq") == "cluster"
+    assert retry.classify("kubectl config current-context") == "cluster"
+    assert retry.classify("minikube ip") == "cluster"
+    assert retry.classify("kubectl apply -f x") == "default"
+    assert retry.classify("docker volume create x") == "default"
+
+
+def test_retries_until_success(tmp_path):
+    policy = retry.RetryPolicy(attempts=4, base_delay=0.01)
+    result, counts = run(flaky(tmp_path, 2), policy)
+    assert result.returncode == 0 and result.stdout == "ok\n"
+    assert counts["attempts"] == 3
+    assert counts["retries"] == 2
+    assert counts["failures"] == 0
+
+
+def test_gives_up(tmp_path):
+    policy = retry.RetryPolicy(attempts=2, base_delay=0.01)
+    result, counts = run(flaky(tmp_path, 5), policy)
+    assert result.returncode != 0
+    assert counts["attempts"] == 2
+    assert counts["failures"] == 1
+
+
+def test_require_output():
+    policy = retry.RetryPolicy(attempts=2, base_delay=0.01, require_output=True)
+    result, counts = run("true", policy)
+    assert result.returncode != 0
+    assert counts["failures"] == 1
+
+
+def test_hedge_wins(tmp_path):
+    policy = retry.RetryPolicy(attempts=1, hedge_after=0.2)
+    start = time.monotonic()
+    result, counts = run(flaky(tmp_path, 0, slow_first=5), policy)
+    assert time.monotonic() - start < 2
+    assert result.stdout == "ok\n"
+    assert counts["hedges"] == 1
+    assert counts["hedge_wins"] == 1
+
+
+def test_delay_backs_off_with_jitter():
+    policy = retry.RetryPolicy(base_delay=1, max_delay=5, jitter=0.5)
+    for retry_number, top in [(0, 1), (1, 2), (2, 4), (5, 5)]:
+        d = policy.delay(retry_number)
+        assert top / 2 <= d <= top
+
+
+def test_parse_policy():
+    policies = retry.parse_policy("registry:6:0")
+    assert policies["registry"].attempts == 6
+    assert policies["registry"].hedge_after is None
+    assert policies["registry"].require_output
+    assert retry.DEFAULT_POLICIES["registry"].attempts == 4
+    for spec in ["nope:3", "registry", "registry:0", "cluster:1:2:3"]:
+        with pytest.raises(ValueError):
+            retry.parse_policy(spec)
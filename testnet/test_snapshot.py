@@ -0,0 +1,83 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import snapshot
+
+TESTNET_DIR = os.path.dirname(os.path.realpath(__file__))
+FAKEBIN = os.path.join(TESTNET_DIR, "testdata", "fakebin")
+
+
+@pytest.fixture
+def cluster(tmp_path, monkeypatch):
+    """Fakes a snapshot-redis pod for releases test-0 to test-3."""
+    monkeypatch.setenv("PATH", f"{FAKEBIN}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_ROOT", str(tmp_path))
+    pods = [
+        {
+            "metadata": {
+                "name": f"test-{i}-snap",
+                "labels": {"app": snapshot.APP, "release": f"test-{i}"},
+            },
+            "status": {"phase": "Running"},
+        }
+        for i in range(4)
+    ]
+    (tmp_path / "pods.json").write_text(json.dumps({"items": pods}))
+    monkeypatch.setenv("FAKE_PODS", str(tmp_path / "pods.json"))
+    return tmp_path
+
+
+def take_all(*args, **kwargs):
+    lines = []
+    kwargs["on_line"] = lambda name, line: lines.append((name, line))
+    return asyncio.run(snapshot.take_all(*args, **kwargs)), lines
+
+
+def test_parallel(cluster, monkeypatch):
+    monkeypatch.setenv("FAKE_EXEC_SECONDS", "0.6")
+    names = [f"test-{i}" for i in range(4)]
+    start = time.monotonic()
+    results, lines = take_all(names, jobs=4)
+    assert time.monotonic() - start < 1.5
+
+    assert [r.name for r in results] == names
+    assert all(r.ok and r.seconds >= 0.5 for r in results)
+    assert sorted(lines)[:3] == [("test-0", f"{snapshot.SNAPSHOT_COMMAND}: step {i}") for i in range(3)]
+    assert len(lines) == 12
+
+
+def test_deadline_and_failures(cluster, monkeypatch):
+    monkeypatch.setenv("FAKE_EXEC_SECONDS", "3")
+    monkeypatch.setenv("FAKE_FAIL", "test-1-snap")
+    results, _ = take_all(["test-0", "test-1", "test-9"], jobs=2, timeout=0.5)
+    assert [r.returncode for r in results] == [124, 1, 1]
+    assert "timed out" in results[0].output
+    assert "no running snapshot-redis pod" in results[2].output
+    assert results[0].seconds < 1.5
+
+
+def test_cli_prefixes_output(cluster):
+    ret = subprocess.run(
+        [sys.executable, os.path.join(TESTNET_DIR, "snapshot.py"), "test-0", "test-10"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert ret.returncode == 1
+    assert "test-0  | /bin/bash /root/start.sh: step 0" in ret.stdout.splitlines()
+    assert "Failed releases: test-10" in ret.stderr
@@ -0,0 +1,91 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import pytest
+
+import snapshot_codes
+
+COMPLETE = list(snapshot_codes.REQUIRED_FILES) + ["ndau-manifest.json"]
+
+
+def make_bucket(root, network, snapshots):
+    """Lays out snapshots, a dict of code to file names, like the bucket."""
+    for code, names in snapshots.items():
+        for name in names:
+            path = root / network / code / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("")
+    (root / network / "latest.txt").parent.mkdir(parents=True, exist_ok=True)
+    (root / network / "latest.txt").write_text("")
+
+
+def test_latest():
+    # heights are compared as numbers, not strings
+    keys = [f"ndau-900/{n}" for n in COMPLETE] + [f"ndau-1000/{n}" for n in COMPLETE]
+    assert snapshot_codes.latest(keys) == "ndau-1000"
+    assert snapshot_codes.latest([]) is None
+    assert snapshot_codes.parse_code("ndau-1234") == 1234
+    assert snapshot_codes.parse_code("genesis") is None
+    assert snapshot_codes.parse_code("ndau-12a") is None
+
+
+def test_latest_requires_every_file():
+    for missing in snapshot_codes.REQUIRED_FILES:
+        keys = [f"ndau-10/{n}" for n in COMPLETE if n != missing]
+        keys += [f"ndau-5/{n}" for n in COMPLETE]
+        assert snapshot_codes.latest(keys) == "ndau-5"
+
+
+def test_dir_source_skips_incomplete_and_other_directories(tmp_path):
+    make_bucket(
+        tmp_path,
+        "devnet",
+        {
+            "ndau-100": COMPLETE,
+            "ndau-300": ["ndau-noms.tgz"],
+            "genesis": COMPLETE,
+            "ndaunode-500": COMPLETE,
+        },
+    )
+    make_bucket(tmp_path, "testnet", {"ndau-900": COMPLETE})
+    source = snapshot_codes.DirSource(str(tmp_path))
+    assert "latest.txt" in source.keys("devnet")
+    assert snapshot_codes.latest(source.keys("devnet")) == "ndau-100"
+    assert source.keys("mainnet") == []
+
+
+def test_find_latest_is_cached(tmp_path):
+    make_bucket(tmp_path, "cached", {"ndau-100": COMPLETE})
+    assert snapshot_codes.find_latest(str(tmp_path), "cached") == "ndau-100"
+    make_bucket(tmp_path, "cached", {"ndau-200": COMPLETE})
+    assert snapshot_codes.find_latest(str(tmp_path), "cached") == "ndau-100"
+
+
+LISTING = """<?xml version="1.0" encoding="UTF-8"?>
+<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">
+  <Name>ndau-snapshots</Name>
+  <IsTruncated>{truncated}</IsTruncated>
+  <NextContinuationToken>abc</NextContinuationToken>
+  <Contents><Key>devnet/ndau-100/ndau-tm.tgz</Key></Contents>
+  <Contents><Key>devnet/latest.txt</Key></Contents>
+</ListBucketResult>
+"""
+
+
+@pytest.mark.parametrize("truncated, token", [("true", "abc"), ("false", None)])
+def test_parse_listing(truncated, token):
+    keys, next_token = snapshot_codes.parse_listing(LISTING.format(truncated=truncated))
+    assert keys == ["devnet/ndau-100/ndau-tm.tgz", "devnet/latest.txt"]
+    assert next_token == token
+
+
+def test_source():
+    s3 = snapshot_codes.source("s3://ndau-snapshots/")
+    assert isinstance(s3, snapshot_codes.S3Source) and s3.bucket == "ndau-snapshots"
+    assert isinstance(snapshot_codes.source("/tmp"), snapshot_codes.DirSource)
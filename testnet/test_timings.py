@@ -0,0 +1,41 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import json
+import time
+
+import timings
+
+
+def test_recorder(tmp_path):
+    r = timings.Recorder()
+    r.enter("one")
+    start = r.now()
+    time.sleep(0.01)
+    r.command("docker run busybox cat x", start, 0, 12)
+    r.enter("two")
+    r.command("kubectl get nodes", r.now(), 1, 0)
+    r.finish()
+
+    path = tmp_path / "trace.json"
+    r.write_chrome_trace(path)
+    events = json.loads(path.read_text())["traceEvents"]
+    assert [(e["name"], e["cat"]) for e in events] == [
+        ("docker run busybox cat x", "command"),
+        ("one", "phase"),
+        ("kubectl get nodes", "command"),
+        ("two", "phase"),
+    ]
+    assert all(e["ph"] == "X" for e in events)
+    assert events[0]["dur"] >= 10000
+    assert events[0]["args"] == {"returncode": 0, "output_bytes": 12}
+    assert events[1]["ts"] <= events[0]["ts"]
+
+    summary = r.summary()
+    assert "docker" in summary and "kubectl" in summary and "two" in summary
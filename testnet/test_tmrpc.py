@@ -0,0 +1,98 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import tmrpc
+
+
+def test_parse_time():
+    assert tmrpc.parse_time("2020-01-02T03:04:05.123456789Z") == datetime(
+        2020, 1, 2, 3, 4, 5, 123456, timezone.utc
+    )
+    assert tmrpc.parse_time("2020-01-02T03:04:05Z") == datetime(
+        2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc
+    )
+    assert tmrpc.parse_time("2020-01-02T05:04:05.5+02:00") == datetime(
+        2020, 1, 2, 3, 4, 5, 500000, timezone.utc
+    )
+    with pytest.raises(ValueError):
+        tmrpc.parse_time("yesterday")
+
+
+def test_endpoints():
+    network = {"master_ip": "10.0.0.1", "nodes": [{"name": "a-0", "ports": {"p2p": 1, "rpc": 2}}]}
+    assert tmrpc.endpoints(network) == [("a-0", "10.0.0.1", 2)]
+    assert tmrpc.endpoints(network, "127.0.0.1") == [("a-0", "127.0.0.1", 2)]
+    with pytest.raises(ValueError):
+        tmrpc.endpoints({"release": "a", "master_ip": "", "nodes": []})
+
+
+def test_keep_alive_and_errors(fake_network):
+    _, (node,) = fake_network(1)
+
+    async def calls():
+        client = tmrpc.Client("127.0.0.1", node.port)
+        try:
+            first = await client.call("status")
+            await client.call("broadcast_tx_sync", tx="0x01")
+            with pytest.raises(tmrpc.RPCError, match="Method not found"):
+                await client.call("nope")
+            return first
+        finally:
+            await client.close()
+
+    status = asyncio.run(calls())
+    assert status["node_info"]["moniker"] == "fake-0"
+    assert node.requests == ["/status", "/broadcast_tx_sync", "/nope"]
+    assert node.connections == 1
+    assert node.mempool == ["0x01"]
+
+
+def test_reconnects_after_the_node_closes_the_connection():
+    """Answers chunked, then hangs up without saying so."""
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b'5\r\n{"res\r\n15\r\nult": {"n_peers": 3}}\r\n0\r\n\r\n'
+        )
+        await writer.drain()
+        writer.close()
+
+    async def calls():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        client = tmrpc.Client("127.0.0.1", server.sockets[0].getsockname()[1])
+        try:
+            results = [await client.call("net_info") for _ in range(2)]
+        finally:
+            await client.close()
+            server.close()
+        return results
+
+    assert asyncio.run(calls()) == [{"n_peers": 3}] * 2
+    assert len(connections) == 2
+
+
+def test_unreachable():
+    async def call():
+        server = await asyncio.start_server(lambda r, w: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        await tmrpc.Client("127.0.0.1", port).call("status")
+
+    with pytest.raises(OSError, match="status"):
+        asyncio.run(call())
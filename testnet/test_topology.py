@@ -0,0 +1,50 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import pytest
+
+import topology
+
+SPECS = ["full", "random:4", "random:8", "chords", "seeds:1", "seeds:3"]
+SIZES = [1, 2, 3, 5, 16, 17, 64, 200]
+
+
+@pytest.mark.parametrize("spec", SPECS)
+@pytest.mark.parametrize("n", SIZES)
+def test_topology_is_connected_and_symmetric(spec, n):
+    if spec == "full" and n > 64:
+        pytest.skip("full mesh is only for small networks")
+    peers = topology.parse(spec)(n)
+    assert len(peers) == n
+    assert topology.is_connected(peers)
+    for i, p in enumerate(peers):
+        assert i not in p
+        assert p == sorted(set(p))
+        for j in p:
+            assert i in peers[j]
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_topology_is_deterministic(spec):
+    assert topology.parse(spec)(40) == topology.parse(spec)(40)
+
+
+def test_sparse_topologies_are_subquadratic():
+    n = 200
+    assert topology.connections(topology.full(n)) == n * (n - 1) // 2
+    assert max(len(p) for p in topology.parse("random:6")(n)) <= 6
+    assert topology.connections(topology.parse("random:6")(n)) <= 3 * n
+    # ring plus chords at 2, 4, ... 64 places ahead
+    assert topology.connections(topology.chords(n)) <= n * 7
+
+
+def test_parse_errors():
+    for spec in ["mesh", "random", "random:x", "random:1", "seeds:0", "full:2"]:
+        with pytest.raises(ValueError):
+            topology.parse(spec)
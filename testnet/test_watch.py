@@ -0,0 +1,76 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+
+import watch
+
+TESTNET_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+def produce(node, after, height=1):
+    """Has a fake node catch up to height after some seconds."""
+
+    def catch_up():
+        node.height = height
+        node.catching_up = False
+
+    threading.Timer(after, catch_up).start()
+
+
+def test_all_nodes_catch_up(fake_network):
+    _, fakes = fake_network(3)
+    genesis_time = datetime.now(timezone.utc)
+    made = genesis_time + timedelta(seconds=1.5)
+    for i, fake in enumerate(fakes):
+        fake.block_times[1] = made.strftime("%Y-%m-%dT%H:%M:%S.%f123Z")
+        produce(fake, 0.2 * (i + 1), height=i + 1)
+    # a node that's synced blocks but is still catching up isn't ready
+    fakes[2].height = 1
+
+    nodes = [watch.Node(f.name, "127.0.0.1", f.port) for f in fakes]
+    ready = []
+    first_block = asyncio.run(
+        watch.watch(nodes, genesis_time, 5, 0.05, lambda n: ready.append(n.name))
+    )
+
+    assert ready == ["fake-0", "fake-1", "fake-2"]
+    assert [n.height for n in nodes] == [1, 2, 3]
+    assert nodes[0].ready_at < nodes[1].ready_at < nodes[2].ready_at
+    # the first block's time comes from its header, through /block past height 1
+    assert first_block == made
+    assert all(n.first_block_at == made for n in nodes)
+    assert [f.requests.count("/block") for f in fakes] == [0, 1, 0]
+    # each node was polled over one connection
+    assert [f.connections for f in fakes] == [1, 1, 1]
+    assert watch.report(nodes, genesis_time, first_block) == []
+
+
+def test_deadline(fake_network):
+    network_dir, fakes = fake_network(3)
+    produce(fakes[0], 0)
+    fakes[2].down = True
+    ret = subprocess.run(
+        [sys.executable, os.path.join(TESTNET_DIR, "watch.py"), str(network_dir)]
+        + ["--deadline", "0.5", "--interval", "0.1"],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        timeout=10,
+    )
+    assert ret.returncode == 1
+    assert "fake-0: caught up at height 1" in ret.stderr
+    assert "Stragglers: fake-1, fake-2" in ret.stderr
+    assert "unreachable" in ret.stderr
+    # genesis was long ago, so polling stopped at the deadline
+    assert 2 <= len(fakes[1].requests) <= 7
@@ -0,0 +1,136 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Records how long the phases of a run and the commands it runs take.
+
+Events can be written in Chrome's trace event format, which chrome://tracing
+and https://ui.perfetto.dev open, or summarized as a table.
+"""
+
+import json  # for writing traces
+import threading  # events come from worker threads too
+import time  # for timestamps
+
+
+class Recorder:
+    """Collects phase and command events."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.events = []
+        self.threads = {}
+        self.current = None  # (name, start) of the phase in progress
+
+    def now(self):
+        """Returns the time since the recorder was created in seconds."""
+        return time.perf_counter() - self.origin
+
+    def _add(self, name, cat, start, seconds, args):
+        with self.lock:
+            tid = self.threads.setdefault(threading.get_ident(), len(self.threads))
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": cat,
+                    "start": start,
+                    "seconds": seconds,
+                    "tid": tid,
+                    "args": args,
+                }
+            )
+
+    def enter(self, name):
+        """
+        Starts the phase called name, ending the current phase if any.
+        Phases are sequential, so entering one marks the end of the last.
+        """
+        self.finish()
+        self.current = (name, self.now())
+
+    def finish(self):
+        """Ends the current phase."""
+        if self.current is not None:
+            name, start = self.current
+            self._add(name, "phase", start, self.now() - start, {})
+            self.current = None
+
+    def command(self, command, start, returncode, output_bytes):
+        """Records a finished command that started at start."""
+        self._add(
+            command,
+            "command",
+            start,
+            self.now() - start,
+            {"returncode": returncode, "output_bytes": output_bytes},
+        )
+
+    def chrome_trace(self):
+        """Returns the events in Chrome's trace event format."""
+        with self.lock:
+            events = list(self.events)
+        return {
+            "displayTimeUnit": "ms",
+            "traceEvents": [
+                {
+                    "name": e["name"],
+                    "cat": e["cat"],
+                    "ph": "X",
+                    "ts": round(e["start"] * 1e6),
+                    "dur": round(e["seconds"] * 1e6),
+                    "pid": 1,
+                    "tid": e["tid"],
+                    "args": e["args"],
+                }
+                for e in events
+            ],
+        }
+
+    def write_chrome_trace(self, path):
+        """Writes a Chrome trace to path."""
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self, slowest=5):
+        """Returns a table of phases, commands by program and slowest commands."""
+        with self.lock:
+            events = list(self.events)
+        phases = [e for e in events if e["cat"] == "phase"]
+        commands = [e for e in events if e["cat"] == "command"]
+
+        lines = ["phase                          seconds"]
+        for e in phases:
+            lines.append(f"  {e['name']:<28} {e['seconds']:8.2f}")
+
+        programs = {}
+        for e in commands:
+            words = e["name"].split()
+            program = words[0] if words else ""
+            count, total, top = programs.get(program, (0, 0.0, 0.0))
+            programs[program] = (count + 1, total + e["seconds"], max(top, e["seconds"]))
+        lines.append("")
+        lines.append("program              count    total      max")
+        for program, (count, total, top) in sorted(
+            programs.items(), key=lambda p: -p[1][1]
+        ):
+            lines.append(f"  {program:<18} {count:5d} {total:8.2f} {top:8.2f}")
+
+        lines.append("")
+        lines.append("slowest commands")
+        lines.append("   seconds  exit    bytes  command")
+        for e in sorted(commands, key=lambda e: -e["seconds"])[:slowest]:
+            name = " ".join(e["name"].split())
+            if len(name) > 60:
+                name = name[:57] + "..."
+            lines.append(
+                f"  {e['seconds']:8.2f} {e['args']['returncode']:5d} "
+                f"{e['args']['output_bytes']:8d}  {name}"
+            )
+        return "\n".join(lines)
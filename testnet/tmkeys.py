@@ -0,0 +1,176 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Generates tendermint keys in-process.
+
+Produces the same priv_validator_key.json, node_key.json and node ID that
+`tendermint init` and `tendermint show_node_id` would, without starting any
+containers. Only the python standard library is used; the ed25519 math is a
+straightforward transcription of RFC 8032.
+
+Keys are random unless derived from a seed string with derive_seed, which
+makes a whole network's keys reproducible from the seed.
+"""
+
+import hashlib  # sha512 for ed25519, sha256 for addresses
+import hmac  # for deriving seeds
+import json  # for serializing key files
+import os  # for random seeds
+from base64 import b64decode, b64encode
+
+# ed25519 curve parameters (RFC 8032 section 5.1)
+_P = 2 ** 255 - 19
+_D = -121665 * pow(121666, _P - 2, _P) % _P
+_SQRT_M1 = pow(2, (_P - 1) // 4, _P)
+
+PUB_KEY_TYPE = "tendermint/PubKeyEd25519"
+PRIV_KEY_TYPE = "tendermint/PrivKeyEd25519"
+
+SEED_SIZE = 32
+
+
+def _recover_x(y, sign):
+    """Recovers the x coordinate of a curve point from y and the sign of x."""
+    x2 = (y * y - 1) * pow(_D * y * y + 1, _P - 2, _P)
+    x = pow(x2, (_P + 3) // 8, _P)
+    if (x * x - x2) % _P != 0:
+        x = x * _SQRT_M1 % _P
+    if x & 1 != sign:
+        x = _P - x
+    return x
+
+
+_GY = 4 * pow(5, _P - 2, _P) % _P
+_GX = _recover_x(_GY, 0)
+# base point in extended homogeneous coordinates (X, Y, Z, T)
+_G = (_GX, _GY, 1, _GX * _GY % _P)
+
+
+def _point_add(p, q):
+    """Adds two points in extended homogeneous coordinates."""
+    a = (p[1] - p[0]) * (q[1] - q[0]) % _P
+    b = (p[1] + p[0]) * (q[1] + q[0]) % _P
+    c = 2 * p[3] * q[3] * _D % _P
+    d = 2 * p[2] * q[2] % _P
+    e, f, g, h = b - a, d - c, d + c, b + a
+    return (e * f % _P, g * h % _P, f * g % _P, e * h % _P)
+
+
+def _point_mul(s, p):
+    """Multiplies a point by a scalar using double-and-add."""
+    q = (0, 1, 1, 0)  # neutral element
+    while s > 0:
+        if s & 1:
+            q = _point_add(q, p)
+        p = _point_add(p, p)
+        s >>= 1
+    return q
+
+
+def _point_compress(p):
+    """Encodes a point as 32 bytes."""
+    zinv = pow(p[2], _P - 2, _P)
+    x = p[0] * zinv % _P
+    y = p[1] * zinv % _P
+    return int.to_bytes(y | ((x & 1) << 255), 32, "little")
+
+
+def public_key(seed):
+    """Returns the 32 byte ed25519 public key for a 32 byte seed."""
+    if len(seed) != SEED_SIZE:
+        raise ValueError(f"expecting {SEED_SIZE} byte seed. Got {len(seed)}")
+    h = hashlib.sha512(seed).digest()
+    a = int.from_bytes(h[:32], "little")
+    a &= (1 << 254) - 8
+    a |= 1 << 254
+    return _point_compress(_point_mul(a, _G))
+
+
+def address(pub):
+    """Returns tendermint's address for a public key: truncated sha256."""
+    return hashlib.sha256(pub).digest()[:20]
+
+
+def node_id(pub):
+    """Returns the node ID, as printed by `tendermint show_node_id`."""
+    return address(pub).hex()
+
+
+def new_seed():
+    """Returns a fresh random seed."""
+    return os.urandom(SEED_SIZE)
+
+
+def derive_seed(seed, purpose, index, network=None):
+    """
+    Returns the key seed for purpose ("validator" or "node") of the node at
+    index, derived from the string seed. network, e.g. a release name, gives
+    each network generated from one seed its own keys. The same arguments
+    always give the same key seed, and different ones give unrelated key
+    seeds.
+    """
+    master = hashlib.sha256(seed.encode()).digest()
+    label = f"{purpose}:{index}" if network is None else f"{network}/{purpose}:{index}"
+    return hmac.new(master, label.encode(), hashlib.sha256).digest()
+
+
+def priv_validator_key(seed, pub=None):
+    """
+    Returns the contents of priv_validator_key.json as a dict.
+    pub is the seed's public key, if it was already computed.
+    """
+    if pub is None:
+        pub = public_key(seed)
+    return {
+        "address": address(pub).hex().upper(),
+        "pub_key": {"type": PUB_KEY_TYPE, "value": b64encode(pub).decode()},
+        "priv_key": {
+            "type": PRIV_KEY_TYPE,
+            "value": b64encode(seed + pub).decode(),
+        },
+    }
+
+
+def node_key(seed, pub=None):
+    """
+    Returns the contents of node_key.json as a dict.
+    pub is the seed's public key, if it was already computed.
+    """
+    if pub is None:
+        pub = public_key(seed)
+    return {
+        "priv_key": {
+            "type": PRIV_KEY_TYPE,
+            "value": b64encode(seed + pub).decode(),
+        }
+    }
+
+
+def node_key_id(nk):
+    """Returns the node ID for a node_key.json dict."""
+    return node_id(_pub_from_priv_value(nk["priv_key"]["value"]))
+
+
+def _pub_from_priv_value(value):
+    """Extracts the public key half of a base64 encoded 64 byte private key."""
+    raw = b64decode(value)
+    if len(raw) != 64:
+        raise ValueError(f"expecting 64 bytes. Got {len(raw)}")
+    return raw[32:]
+
+
+def dumps_priv_validator_key(pvk):
+    """Serializes priv_validator_key.json the way tendermint writes it."""
+    return json.dumps(pvk, indent=2)
+
+
+def dumps_node_key(nk):
+    """Serializes node_key.json the way tendermint writes it."""
+    return json.dumps(nk, separators=(",", ":"))
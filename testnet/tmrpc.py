@@ -0,0 +1,200 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Talks to tendermint's RPC with asyncio.
+
+A Client keeps one HTTP/1.1 connection to a node open between calls, so
+polling many nodes costs one socket each rather than one per request. A
+Pool holds several for concurrent calls to the same node.
+Calls use tendermint's URI form, GET /METHOD?ARG=VALUE.
+"""
+
+import asyncio  # for the connections
+import json  # for responses
+import re  # for parsing tendermint's times
+import urllib.parse  # for query strings
+from datetime import datetime, timezone
+
+
+class RPCError(Exception):
+    """An error returned by tendermint, as opposed to one reaching it."""
+
+    def __init__(self, method, error):
+        self.method = method
+        self.code = error.get("code")
+        self.data = error.get("data", "")
+        super().__init__(f"{method}: {error.get('message', '')} {self.data}".strip())
+
+
+class Client:
+    """A kept-alive connection to one node's RPC port."""
+
+    def __init__(self, host, port, timeout=5):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+
+    async def call(self, method, **params):
+        """
+        Calls an RPC method and returns its result. Raises RPCError when the
+        node returns an error and OSError when it can't be reached or
+        doesn't answer within timeout.
+        """
+        query = urllib.parse.urlencode(params)
+        path = f"/{method}?{query}" if query else f"/{method}"
+        # a kept-alive connection may have been closed by the node since
+        # the last call, so a failure on one is retried on a new one
+        reused = self._writer is not None
+        try:
+            body = await asyncio.wait_for(self._get(path), self.timeout)
+        except asyncio.CancelledError:
+            # the response may be half read, so the connection can't be reused
+            self._drop()
+            raise
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            await self.close()
+            if not reused or isinstance(e, asyncio.TimeoutError):
+                raise _oserror(e, self, method)
+            try:
+                body = await asyncio.wait_for(self._get(path), self.timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                await self.close()
+                raise _oserror(e, self, method)
+        response = json.loads(body)
+        if response.get("error"):
+            raise RPCError(method, response["error"])
+        return response["result"]
+
+    async def _get(self, path):
+        """Sends a GET over the connection, opening it if needed, and returns the body."""
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        self._writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n\r\n".encode()
+        )
+        await self._writer.drain()
+
+        status = await self._reader.readuntil(b"\r\n")
+        headers = {}
+        while True:
+            line = await self._reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await self._reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                body += chunk[:-2]
+        elif "content-length" in headers:
+            body = await self._reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await self._reader.read()
+            headers["connection"] = "close"
+
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        code = int(status.split()[1])
+        # tendermint answers errors with json bodies too, but not every proxy does
+        if code >= 400 and not body.startswith(b"{"):
+            raise OSError(f"HTTP {code} from {self.host}:{self.port}")
+        return body
+
+    def _drop(self):
+        """Closes the connection without waiting and returns its writer."""
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+        return writer
+
+    async def close(self):
+        """Closes the connection. The next call opens a new one."""
+        writer = self._drop()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class Pool:
+    """
+    Up to size kept-alive connections to one node, for callers that have
+    several calls in flight at once. Idle connections are reused newest
+    first, so a burst doesn't leave many half-used sockets behind.
+    """
+
+    def __init__(self, host, port, size, timeout=5):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(size)
+        self._idle = []
+
+    async def call(self, method, **params):
+        """Calls an RPC method over an idle connection, waiting for one if all are busy."""
+        async with self._slots:
+            client = self._idle.pop() if self._idle else Client(self.host, self.port, self.timeout)
+            try:
+                return await client.call(method, **params)
+            finally:
+                self._idle.append(client)
+
+    async def close(self):
+        """Closes every idle connection."""
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(c.close() for c in idle))
+
+
+def _oserror(e, client, method):
+    """Returns e as an OSError naming the node and method."""
+    if isinstance(e, asyncio.TimeoutError):
+        reason = f"no answer in {client.timeout}s"
+    elif isinstance(e, asyncio.IncompleteReadError):
+        reason = "connection closed"
+    else:
+        reason = str(e) or type(e).__name__
+    return OSError(f"{client.host}:{client.port} {method}: {reason}")
+
+
+def parse_time(s):
+    """
+    Parses a tendermint or genesis timestamp, e.g. 2020-01-02T03:04:05.123456789Z.
+    Digits past microseconds are dropped. Returns an aware datetime in UTC.
+    """
+    m = re.fullmatch(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:\d\d)", s)
+    if m is None:
+        raise ValueError(f"not a timestamp: {s}")
+    whole, fraction, zone = m.groups()
+    t = datetime.strptime(whole, "%Y-%m-%dT%H:%M:%S")
+    t = t.replace(microsecond=int((fraction or "0")[:6].ljust(6, "0")))
+    if zone == "Z":
+        return t.replace(tzinfo=timezone.utc)
+    return datetime.fromisoformat(f"{t.isoformat()}{zone}").astimezone(timezone.utc)
+
+
+def endpoints(network, host=None):
+    """
+    Returns the name, host and RPC port of every node of a network manifest
+    as manifest.load returns it. host defaults to the manifest's master_ip.
+    """
+    host = host or network.get("master_ip")
+    if not host:
+        raise ValueError(f"{network.get('release')} has no master_ip, pass a host")
+    return [(n["name"], host, n["ports"]["rpc"]) for n in network["nodes"]]
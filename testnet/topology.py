@@ -0,0 +1,135 @@
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Chooses which nodes are each other's persistent peers.
+
+A topology is a function of the number of nodes that returns, for every node
+index, the sorted list of its peers' indexes. Peering is symmetric and the
+result only depends on the spec and the number of nodes.
+
+Specs accepted by parse:
+    full        every node peers with every other node. O(N^2) connections.
+    random:K    a ring plus random links until every node has about K peers.
+    chords      a ring plus links to the nodes 2, 4, 8, ... places ahead.
+    seeds:S     the first S nodes peer with each other and every other node
+                peers with them. Other peers are found with tendermint's PEX.
+"""
+
+import random  # for the random topology
+
+DEFAULT = "full"
+
+
+def full(n):
+    """Every node peers with every other node."""
+    return [[j for j in range(n) if j != i] for i in range(n)]
+
+
+def random_regular(n, k, seed=0):
+    """
+    A ring, so the network is always connected, plus random links until each
+    node has k peers, or as close to it as the remaining nodes allow.
+    """
+    if k < 2:
+        raise ValueError("random topology needs at least 2 peers per node")
+    peers = _ring(n)
+    rng = random.Random(seed)
+    order = list(range(n))
+    rng.shuffle(order)
+    for i in order:
+        candidates = [j for j in order if j != i and j not in peers[i]]
+        rng.shuffle(candidates)
+        for j in candidates:
+            if len(peers[i]) >= k:
+                break
+            if len(peers[j]) < k:
+                peers[i].add(j)
+                peers[j].add(i)
+    return [sorted(p) for p in peers]
+
+
+def chords(n):
+    """A ring plus links to the nodes 2, 4, 8, ... places ahead."""
+    peers = _ring(n)
+    step = 2
+    while step <= n // 2:
+        for i in range(n):
+            j = (i + step) % n
+            peers[i].add(j)
+            peers[j].add(i)
+        step *= 2
+    return [sorted(p) for p in peers]
+
+
+def seeds(n, s):
+    """The first s nodes peer with each other and everyone peers with them."""
+    if s < 1:
+        raise ValueError("seeds topology needs at least 1 seed")
+    s = min(s, n)
+    result = []
+    for i in range(n):
+        if i < s:
+            result.append([j for j in range(n) if j != i])
+        else:
+            result.append(list(range(s)))
+    return result
+
+
+def _ring(n):
+    """Returns peer sets linking each node to its neighbours in a ring."""
+    peers = [set() for _ in range(n)]
+    if n > 1:
+        for i in range(n):
+            j = (i + 1) % n
+            if j != i:
+                peers[i].add(j)
+                peers[j].add(i)
+    return peers
+
+
+def parse(spec, seed=0):
+    """Returns the topology function for a spec such as "random:8"."""
+    name, _, arg = spec.partition(":")
+    if name == "full" and arg == "":
+        return full
+    if name == "chords" and arg == "":
+        return chords
+    if name in ("random", "seeds"):
+        try:
+            count = int(arg)
+        except ValueError:
+            raise ValueError(f"topology {name} needs a number, e.g. {name}:4")
+        if name == "random":
+            if count < 2:
+                raise ValueError("random topology needs at least 2 peers per node")
+            return lambda n: random_regular(n, count, seed)
+        if count < 1:
+            raise ValueError("seeds topology needs at least 1 seed")
+        return lambda n: seeds(n, count)
+    raise ValueError(f"unknown topology: {spec}")
+
+
+def connections(peers):
+    """Returns the number of distinct peer links."""
+    return sum(len(p) for p in peers) // 2
+
+
+def is_connected(peers):
+    """Returns True when every node can reach every other node."""
+    if len(peers) == 0:
+        return True
+    seen = {0}
+    todo = [0]
+    while todo:
+        for j in peers[todo.pop()]:
+            if j not in seen:
+                seen.add(j)
+                todo.append(j)
+    return len(seen) == len(peers)
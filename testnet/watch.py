@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+#  ----- ---- --- -- -
+#  Copyright 2020 The Axiom Foundation. All Rights Reserved.
+#
+#  Licensed under the Apache License 2.0 (the "License").  You may not use
+#  this file except in compliance with the License.  You can obtain a copy
+#  in the file LICENSE in the source distribution or at
+#  https://www.apache.org/licenses/LICENSE-2.0.txt
+#  - -- --- ---- -----
+
+"""
+Watches a generated network come up.
+
+Every node's tendermint /status is polled at once, each over its own kept
+alive connection, until every node has a block and isn't catching up. The
+time each node caught up and the time of the chain's first block are
+reported relative to the genesis time. Nodes that haven't caught up by the deadline
+are stragglers.
+"""
+
+import asyncio  # for polling nodes concurrently
+import sys  # to print to stderr
+import time  # for the deadline
+from datetime import datetime, timezone
+
+import manifest
+import tmrpc
+
+
+class Node:
+    """What's been seen of one node."""
+
+    def __init__(self, name, host, port, timeout=5):
+        self.name = name
+        self.client = tmrpc.Client(host, port, timeout)
+        self.height = 0
+        self.catching_up = None
+        self.error = None
+        # the time in the header of the node's first block
+        self.first_block_at = None
+        # when the node was first seen caught up
+        self.ready_at = None
+
+    @property
+    def ready(self):
+        return self.ready_at is not None
+
+    async def poll(self, now):
+        """
+        Fetches the node's /status, noting the time of its first block and
+        when it caught up. Past height 1 the first block is fetched with /block.
+        """
+        try:
+            sync = (await self.client.call("status"))["sync_info"]
+            self.height = int(sync["latest_block_height"])
+            self.catching_up = sync["catching_up"]
+            if self.height == 1 and self.first_block_at is None:
+                self.first_block_at = tmrpc.parse_time(sync["latest_block_time"])
+            elif self.height > 1 and self.first_block_at is None:
+                block = await self.client.call("block", height=1)
+                self.first_block_at = tmrpc.parse_time(block["block"]["header"]["time"])
+        except (OSError, tmrpc.RPCError, ValueError, KeyError) as e:
+            self.error = str(e)
+            return
+        self.error = None
+        if self.height > 0 and not self.catching_up and self.ready_at is None:
+            self.ready_at = now()
+
+
+async def watch(nodes, genesis_time, deadline, interval=1, on_ready=None):
+    """
+    Polls nodes every interval seconds until all are ready or deadline
+    seconds have passed since the later of now and genesis_time. Returns
+    the time of the first block, or None when no node has one.
+    on_ready(node) is called as each node catches up.
+    """
+    def now():
+        return datetime.now(timezone.utc)
+
+    wait = max(0, (genesis_time - now()).total_seconds())
+    stop = time.monotonic() + wait + deadline
+    try:
+        while True:
+            pending = [n for n in nodes if not n.ready]
+            await asyncio.gather(*(n.poll(now) for n in pending))
+            for n in pending:
+                if n.ready and on_ready is not None:
+                    on_ready(n)
+            if all(n.ready for n in nodes) or time.monotonic() >= stop:
+                break
+            await asyncio.sleep(min(interval, max(0, stop - time.monotonic())))
+    finally:
+        await asyncio.gather(*(n.client.close() for n in nodes))
+    seen = [n.first_block_at for n in nodes if n.first_block_at is not None]
+    return min(seen) if seen else None
+
+
+def since(t, genesis_time):
+    """Formats t as seconds after genesis_time."""
+    return f"{(t - genesis_time).total_seconds():+.1f}s"
+
+
+def report(nodes, genesis_time, first_block):
+    """Prints a table of every node and returns the stragglers."""
+    steprint("\nreadiness summary")
+    for n in nodes:
+        if n.ready:
+            state = f"caught up {since(n.ready_at, genesis_time)}"
+        elif n.error is not None:
+            state = f"unreachable: {n.error}"
+        else:
+            state = "catching up" if n.catching_up else "no blocks"
+        steprint(f"  {n.name:<24} height {n.height:<8} {state}")
+    if first_block is None:
+        steprint("\nNo node produced a block.")
+    else:
+        steprint(f"\nFirst block made {since(first_block, genesis_time)} after genesis.")
+    stragglers = [n.name for n in nodes if not n.ready]
+    if stragglers:
+        steprint(f"Stragglers: {', '.join(stragglers)}")
+    else:
+        steprint(f"All {len(nodes)} nodes caught up.")
+    return stragglers
+
+
+def steprint(*args, **kwargs):
+    """Prints to stderr."""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Waits for a generated network's nodes to produce blocks."
+    )
+    parser.add_argument("network_dir", help="Network directory made by gen_node_groups.py.")
+    parser.add_argument(
+        "--host", help="Address of the nodes' RPC NodePorts. (default: the manifest's master_ip)"
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=600,
+        help=(
+            "Seconds to wait after the genesis time, or after starting when "
+            "that's passed, before giving up. (default: 600)"
+        ),
+    )
+    parser.add_argument(
+        "--interval", type=float, default=1, help="Seconds between polls. (default: 1)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=5,
+        help="Seconds before a /status call is abandoned. (default: 5)",
+    )
+    args = parser.parse_args()
+
+    try:
+        network = manifest.load(args.network_dir)
+        genesis_time = tmrpc.parse_time(network["genesis"]["genesis_time"])
+        nodes = [
+            Node(name, host, port, args.timeout)
+            for name, host, port in tmrpc.endpoints(network, args.host)
+        ]
+    except (OSError, ValueError, KeyError) as e:
+        exit(f"Couldn't read the network: {e}")
+
+    def on_ready(n):
+        steprint(f"{n.name}: caught up at height {n.height}, {since(n.ready_at, genesis_time)}")
+
+    first_block = asyncio.run(
+        watch(nodes, genesis_time, args.deadline, args.interval, on_ready)
+    )
+    if report(nodes, genesis_time, first_block):
+        exit(1)
+
+
+# kick it off
+if __name__ == "__main__":
+    main()